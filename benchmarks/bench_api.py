@@ -0,0 +1,201 @@
+"""Throughput benchmark of the crawl API.
+
+Drives the FastAPI app in process, with a fake shepherd, against the
+redis server at REDIS_URL or, with --fake-redis, the fake redis of the
+tests. For each combination of number of crawls, seed urls per crawl
+and browsers per crawl, the crawls are created and each endpoint is
+called --requests times:
+
+    POST /crawls, GET /crawls, GET /crawl/{id}, PUT /crawl/{id}/urls
+
+Only the crawls created by the benchmark are deleted afterwards, the
+other crawls of the redis server are left as they are.
+
+The requests per second and p50/p99 latency of each endpoint are
+printed and written to a json file, which can be compared with the
+results of another commit:
+
+    python -m benchmarks.bench_api --fake-redis --output after.json --compare before.json
+"""
+import argparse
+import itertools
+import os
+import platform
+import subprocess
+import time
+from contextlib import ExitStack
+from typing import Callable, Dict, List
+
+import ujson as json
+from mock import patch
+from starlette.testclient import TestClient
+
+from tests.utils import fake_shepherd_api, fake_shepherd_urls, init_fake_redis
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    ordered = sorted(latencies)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(name: str, num_requests: int, request: Callable[[int], object]) -> Dict:
+    latencies = []
+    start = time.perf_counter()
+    for i in range(num_requests):
+        req_start = time.perf_counter()
+        res = request(i)
+        latencies.append(time.perf_counter() - req_start)
+        if res.status_code != 200:
+            raise RuntimeError(f'{name}: {res.status_code} {res.text}')
+
+    elapsed = time.perf_counter() - start
+    return {
+        'endpoint': name,
+        'requests': num_requests,
+        'rps': num_requests / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def bench_combination(
+    client: TestClient, num_crawls: int, num_urls: int, num_browsers: int, args
+) -> List[Dict]:
+    crawl_ids = []
+
+    def create_crawl(i: int):
+        seed_urls = [f'https://example.com/{i}/{j}' for j in range(num_urls)]
+        res = client.post(
+            '/crawls', json={'seed_urls': seed_urls, 'num_browsers': num_browsers}
+        )
+        if res.status_code == 200:
+            crawl_ids.append(res.json()['id'])
+        return res
+
+    def queue_urls(i: int):
+        urls = [f'https://example.com/new/{i}/{j}' for j in range(args.batch)]
+        return client.put(
+            f'/crawl/{crawl_ids[i % num_crawls]}/urls', json={'urls': urls}
+        )
+
+    # only the crawls created here are deleted, the redis at REDIS_URL
+    # may hold other crawls
+    try:
+        results = [measure('POST /crawls', num_crawls, create_crawl)]
+        results.append(
+            measure('GET /crawls', args.requests, lambda i: client.get('/crawls'))
+        )
+        results.append(
+            measure(
+                'GET /crawl/{id}',
+                args.requests,
+                lambda i: client.get(f'/crawl/{crawl_ids[i % num_crawls]}'),
+            )
+        )
+        results.append(measure('PUT /crawl/{id}/urls', args.requests, queue_urls))
+    finally:
+        for crawl_id in crawl_ids:
+            client.delete(f'/crawl/{crawl_id}')
+        fake_shepherd_urls.clear()
+
+    params = {'crawls': num_crawls, 'urls': num_urls, 'browsers': num_browsers}
+    return [dict(result, **params) for result in results]
+
+
+def git_commit() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+            )
+            .decode('utf-8')
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main(args: argparse.Namespace) -> Dict:
+    with ExitStack() as stack:
+        if args.fake_redis:
+            stack.enter_context(patch('browsertrix.utils.init_redis', init_fake_redis))
+        stack.enter_context(
+            patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+        )
+
+        from browsertrix.api import app
+
+        client = stack.enter_context(TestClient(app))
+
+        results = []
+        for num_crawls, num_urls, num_browsers in itertools.product(
+            args.crawls, args.urls, args.browsers
+        ):
+            results.extend(
+                bench_combination(client, num_crawls, num_urls, num_browsers, args)
+            )
+
+    return {
+        'commit': git_commit(),
+        'time': int(time.time()),
+        'python': platform.python_version(),
+        'redis': 'fake' if args.fake_redis else os.environ.get('REDIS_URL', ''),
+        'results': results,
+    }
+
+
+def result_key(result: Dict) -> tuple:
+    return (result['endpoint'], result['crawls'], result['urls'], result['browsers'])
+
+
+def print_report(report: Dict, baseline: Dict = None) -> None:
+    previous = {}
+    if baseline:
+        previous = {result_key(result): result for result in baseline['results']}
+        print(f'compared with {baseline.get("commit") or "baseline"}')
+
+    header = f'{"endpoint":<20} {"crawls":>6} {"urls":>6} {"br":>3} {"req/s":>9}'
+    print(header + f' {"p50 ms":>8} {"p99 ms":>8}' + ('  change' if previous else ''))
+    for result in report['results']:
+        line = (
+            f'{result["endpoint"]:<20} {result["crawls"]:>6} {result["urls"]:>6} '
+            f'{result["browsers"]:>3} {result["rps"]:>9.1f} '
+            f'{result["p50_ms"]:>8.2f} {result["p99_ms"]:>8.2f}'
+        )
+        before = previous.get(result_key(result))
+        if before:
+            line += f'  {(result["rps"] / before["rps"] - 1) * 100:+.1f}%'
+        print(line)
+
+
+def int_list(value: str) -> List[int]:
+    return [int(elem) for elem in value.split(',')]
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Crawl API throughput benchmark')
+    parser.add_argument('--crawls', type=int_list, default=[10, 100])
+    parser.add_argument('--urls', type=int_list, default=[10, 1000])
+    parser.add_argument('--browsers', type=int_list, default=[1, 4])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=10, help='urls per PUT request')
+    parser.add_argument('--fake-redis', action='store_true')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', help='json results to compare with')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = main(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.loads(fh.read())
+
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(json.dumps(report, indent=2))
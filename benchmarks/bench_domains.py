@@ -0,0 +1,100 @@
+"""Microbenchmark of the registered domain extraction.
+
+Times loading the bundled public suffix list into the suffix trie,
+then the lookups per second of:
+
+    trie     SuffixTrie.registered_domain, uncached
+    cached   registered_domain, memoized (--hosts distinct host names)
+    url      extract_domain of full urls
+
+    python -m benchmarks.bench_domains --lookups 1000000 --hosts 10000
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+import ujson as json
+
+from browsertrix.domains import PUBLIC_SUFFIX_LIST_PATH, SuffixTrie, registered_domain
+from browsertrix.utils import extract_domain
+
+SUFFIXES = ['com', 'org', 'co.uk', 'de', 'github.io', 'kawasaki.jp', 'com.au']
+
+
+def make_hosts(num_hosts: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    hosts = []
+    for i in range(num_hosts):
+        labels = [f'site{i}', rng.choice(SUFFIXES)]
+        for _ in range(rng.randrange(3)):
+            labels.insert(0, rng.choice(['www', 'blog', 'cdn', 'm']))
+        hosts.append('.'.join(labels))
+    return hosts
+
+
+def timed(num_lookups: int, func: Callable[[str], str], values: List[str]) -> Dict:
+    repeats, rest = divmod(num_lookups, len(values))
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for value in values:
+            func(value)
+    for value in values[:rest]:
+        func(value)
+    elapsed = time.perf_counter() - start
+    return {
+        'lookups': num_lookups,
+        'seconds': elapsed,
+        'lookups_per_sec': num_lookups / elapsed,
+    }
+
+
+def main(args: argparse.Namespace) -> Dict:
+    start = time.perf_counter()
+    trie = SuffixTrie.load(PUBLIC_SUFFIX_LIST_PATH)
+    load_time = time.perf_counter() - start
+
+    hosts = make_hosts(args.hosts, args.seed)
+    urls = [f'https://user@{host}:8080/page?q=1' for host in hosts]
+
+    # warm the cache, the cached lookups then all hit
+    registered_domain.cache_clear()
+    for host in hosts:
+        registered_domain(host)
+
+    return {
+        'load_seconds': load_time,
+        'results': {
+            'trie': timed(args.lookups, trie.registered_domain, hosts),
+            'cached': timed(args.lookups, registered_domain, hosts),
+            'url': timed(args.lookups, extract_domain, urls),
+        },
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f'suffix list loaded in {report["load_seconds"] * 1000:.1f} ms')
+    print(f'{"lookup":<8} {"lookups":>10} {"seconds":>9} {"lookups/sec":>12}')
+    for name, result in report['results'].items():
+        print(
+            f'{name:<8} {result["lookups"]:>10} {result["seconds"]:>9.3f} '
+            f'{result["lookups_per_sec"]:>12.0f}'
+        )
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Registered domain benchmark')
+    parser.add_argument('--lookups', type=int, default=1000000)
+    parser.add_argument('--hosts', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this json file')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = main(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(json.dumps(report, indent=2))
@@ -0,0 +1,450 @@
+"""End to end crawl simulator.
+
+Creates crawls through the API, running in process with a fake
+shepherd, then stands in for their browsers: each crawl gets
+num_browsers * num_tabs synthetic tab workers that, like the tabs of
+a real browser,
+
+* take a url from the frontier (a:{id}:q) into the pending set (a:{id}:qp)
+* "load" it from a synthetic web graph (--hosts hosts of --pages pages,
+  each linking to --links pages, --external of them on other hosts)
+* add the outlinks in the crawls scope (see browsertrix.scope) to the
+  seen set and the unseen ones to the frontier (honouring the crawls
+  frontier and seen modes)
+* remove the url from the pending set
+
+and push an entry to a:{id}:br:done once the frontier and pending set
+stay empty for --idle seconds. The crawls then show as done in the API.
+
+Reports the pages crawled per second, the redis round trips per second
+of the workers and the memory growth while crawling: the used_memory
+of the redis server at REDIS_URL or, with --fake-redis, the python
+memory allocated by the (in process) fake redis and simulator.
+
+    python -m benchmarks.simulate --crawls 4 --browsers 2 --tabs 4 --output sim.json
+"""
+import argparse
+import asyncio
+import os
+import platform
+import random
+import re
+import time
+import tracemalloc
+from contextlib import ExitStack
+from typing import Dict, List, Optional
+
+import ujson as json
+from mock import patch
+from starlette.testclient import TestClient
+
+from benchmarks.bench_api import git_commit
+from browsertrix.schema import CrawlType, FrontierMode
+from browsertrix.scope import ScopeEngine
+from browsertrix.scripts import QUEUE_URLS
+from tests.utils import fake_shepherd_api, fake_shepherd_urls, init_fake_redis
+
+PAGE_URL_RX = re.compile(r'^http://host(\d+)\.example/page/(\d+)$')
+
+
+# ============================================================================
+class SiteGraph:
+    """A synthetic web graph: num_hosts hosts of num_pages pages each.
+
+    The outlinks of each page are fixed by the graph seed, a share of
+    them (external) pointing to a page of another host
+    """
+
+    def __init__(
+        self,
+        num_hosts: int,
+        num_pages: int,
+        num_links: int,
+        external: float,
+        seed: int = 0,
+    ) -> None:
+        self.num_hosts = num_hosts
+        self.num_pages = num_pages
+        self.num_links = num_links
+        self.external = external
+        self.seed = seed
+
+    @staticmethod
+    def page_url(host: int, page: int) -> str:
+        return f'http://host{host}.example/page/{page}'
+
+    def outlinks(self, url: str) -> List[str]:
+        """Returns the outlinks of the supplied page url, none for urls
+        outside of the graph
+
+        :param url: The page url
+        :return: The list of outlinks
+        """
+        m = PAGE_URL_RX.match(url)
+        if not m:
+            return []
+
+        host, page = int(m.group(1)), int(m.group(2))
+        rng = random.Random(hash((self.seed, host, page)))
+        links = []
+        for _ in range(self.num_links):
+            link_host = host
+            if self.num_hosts > 1 and rng.random() < self.external:
+                link_host = (host + rng.randrange(1, self.num_hosts)) % self.num_hosts
+            links.append(self.page_url(link_host, rng.randrange(self.num_pages)))
+
+        return links
+
+
+# ============================================================================
+class SimulatedCrawl:
+    """The state shared by the tab workers of one crawl"""
+
+    def __init__(self, crawl, scope: ScopeEngine) -> None:
+        self.crawl = crawl
+        self.scope = scope
+        self.pages = 0
+        self.last_page = 0.0
+
+        crawl_type = crawl.model.crawl_type
+        if crawl_type == CrawlType.SINGLE_PAGE:
+            self.max_depth: Optional[int] = 0
+        elif crawl_type == CrawlType.ALL_LINKS:
+            self.max_depth = 1
+        else:
+            self.max_depth = crawl.model.crawl_depth
+
+    def in_scope(self, url: str, depth: int) -> bool:
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        return self.scope.check(url, depth) is None
+
+
+# ============================================================================
+class CountingRedis:
+    """Redis client wrapper counting the round trips of the tab workers:
+    each command, pipeline or transaction counts as one
+    """
+
+    def __init__(self, redis) -> None:
+        self.redis = redis
+        self.ops = 0
+        self.marked_ops = 0
+
+    def mark(self) -> None:
+        """Remembers the current count, when a page has been crawled"""
+        self.marked_ops = self.ops
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.redis, name)
+        if name in ('multi_exec', 'pipeline'):
+
+            def create(*args, **kwargs):
+                tr = attr(*args, **kwargs)
+                tr.execute = self.counted(tr.execute)
+                return tr
+
+            return create
+
+        return self.counted(attr)
+
+    def counted(self, func):
+        def call(*args, **kwargs):
+            self.ops += 1
+            return func(*args, **kwargs)
+
+        return call
+
+
+async def load_simulated(crawl_man, crawl_id: str) -> SimulatedCrawl:
+    crawl = await crawl_man.load_crawl(crawl_id)
+    return SimulatedCrawl(crawl, await crawl.scope_engine())
+
+
+async def pop_url(redis, sim: SimulatedCrawl) -> Optional[str]:
+    """Takes the next url request from the frontier of the crawl"""
+    frontier = sim.crawl.frontier
+    if sim.crawl.model.frontier_mode != FrontierMode.PRIORITY:
+        return await redis.lpop(frontier.key)
+
+    tr = redis.multi_exec()
+    fut = tr.zrange(frontier.key, 0, 0)
+    tr.zremrangebyrank(frontier.key, 0, 0)
+    await tr.execute()
+    entries = fut.result()
+    return entries[0] if entries else None
+
+
+async def tab_worker(
+    redis, sim: SimulatedCrawl, graph: SiteGraph, tab: str, args
+) -> None:
+    """Crawls urls of the crawl until its frontier and pending set
+    stay empty for args.idle seconds, then marks the tab as done
+    """
+    crawl = sim.crawl
+    idle_since = None
+
+    while True:
+        url_req = await pop_url(redis, sim)
+        if not url_req:
+            if not await redis.scard(crawl.pending_q_key):
+                now = time.monotonic()
+                idle_since = idle_since or now
+                if now - idle_since >= args.idle:
+                    break
+            else:
+                idle_since = None
+
+            await asyncio.sleep(args.poll)
+            continue
+
+        idle_since = None
+        await redis.sadd(crawl.pending_q_key, url_req)
+
+        req = json.loads(url_req)
+        depth = req.get('depth', 0) + 1
+        if args.load_time:
+            await asyncio.sleep(args.load_time)
+
+        outlinks = [
+            (url, depth, 0)
+            for url in graph.outlinks(req['url'])
+            if sim.in_scope(url, depth)
+        ]
+        if outlinks:
+            # queued like the api queues urls, in a single script call
+            keys, script_args = crawl.queue_script_args(outlinks)
+            await redis.eval(QUEUE_URLS, keys=keys, args=script_args)
+
+        await redis.srem(crawl.pending_q_key, url_req)
+        sim.pages += 1
+        sim.last_page = time.perf_counter()
+        redis.mark()
+
+    await redis.rpush(
+        crawl.tabs_done_key, json.dumps({'tab': tab, 'time': int(time.time())})
+    )
+
+
+async def used_memory(redis, fake: bool) -> int:
+    if fake:
+        return tracemalloc.get_traced_memory()[0]
+
+    info = await redis.info('memory')
+    return int(info['memory']['used_memory'])
+
+
+async def run_workers(crawl_man, crawl_ids: List[str], graph: SiteGraph, args) -> Dict:
+    from browsertrix import utils
+
+    redis = await utils.init_redis(
+        os.environ.get('REDIS_URL', 'redis://localhost'),
+        asyncio.get_event_loop(),
+        args.browsers * args.tabs * len(crawl_ids),
+    )
+    sims = [await load_simulated(crawl_man, crawl_id) for crawl_id in crawl_ids]
+    counter = CountingRedis(redis)
+
+    if args.fake_redis:
+        tracemalloc.start()
+
+    samples = []
+
+    async def sample() -> None:
+        samples.append(
+            {
+                'seconds': time.perf_counter() - start,
+                'pages': sum(sim.pages for sim in sims),
+                'memory': await used_memory(redis, args.fake_redis),
+            }
+        )
+
+    async def sample_loop() -> None:
+        while True:
+            await asyncio.sleep(args.sample_interval)
+            await sample()
+
+    start = time.perf_counter()
+    await sample()
+    sampler = asyncio.ensure_future(sample_loop())
+    try:
+        await asyncio.gather(
+            *(
+                tab_worker(counter, sim, graph, f'{sim.crawl.crawl_id}:{i}', args)
+                for sim in sims
+                for i in range(args.browsers * args.tabs)
+            )
+        )
+    finally:
+        sampler.cancel()
+
+    await sample()
+    if args.fake_redis:
+        tracemalloc.stop()
+    redis.close()
+    await redis.wait_closed()
+
+    # the rates are measured up to the last crawled page, excluding
+    # the idle wait of the tabs
+    pages = samples[-1]['pages']
+    elapsed = max(max(sim.last_page for sim in sims) - start, 0)
+    num_ops = counter.marked_ops
+    growth = samples[-1]['memory'] - samples[0]['memory']
+    return {
+        'results': {
+            'pages': pages,
+            'seconds': elapsed,
+            'pages_per_sec': pages / elapsed if elapsed else 0,
+            'redis_ops': num_ops,
+            'redis_ops_per_sec': num_ops / elapsed if elapsed else 0,
+            'memory_growth': growth,
+            'memory_per_page': growth / pages if pages else 0,
+        },
+        'samples': samples,
+    }
+
+
+def create_crawl(client: TestClient, graph: SiteGraph, num: int, args) -> str:
+    seed_urls = [
+        graph.page_url((num * args.seeds + j) % args.hosts, 0)
+        for j in range(args.seeds)
+    ]
+    res = client.post(
+        '/crawls',
+        json={
+            'seed_urls': seed_urls,
+            'crawl_type': args.crawl_type,
+            'crawl_depth': args.depth,
+            'num_browsers': args.browsers,
+            'num_tabs': args.tabs,
+            'frontier_mode': args.frontier_mode,
+            'seen_mode': args.seen_mode,
+        },
+    )
+    if res.status_code != 200:
+        raise RuntimeError(f'POST /crawls: {res.status_code} {res.text}')
+    return res.json()['id']
+
+
+def main(args: argparse.Namespace) -> Dict:
+    graph = SiteGraph(args.hosts, args.pages, args.links, args.external, args.seed)
+    loop = asyncio.get_event_loop()
+
+    with ExitStack() as stack:
+        if args.fake_redis:
+            stack.enter_context(patch('browsertrix.utils.init_redis', init_fake_redis))
+        stack.enter_context(
+            patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+        )
+
+        from browsertrix.api import app, crawl_man
+
+        client = stack.enter_context(TestClient(app))
+
+        # only the simulated crawls are deleted, the redis at REDIS_URL
+        # may hold other crawls
+        crawl_ids = []
+        try:
+            for i in range(args.crawls):
+                crawl_ids.append(create_crawl(client, graph, i, args))
+
+            report = loop.run_until_complete(
+                run_workers(crawl_man, crawl_ids, graph, args)
+            )
+
+            statuses = [
+                client.get(f'/crawl/{crawl_id}').json() for crawl_id in crawl_ids
+            ]
+            report['results']['crawls_done'] = sum(
+                1 for info in statuses if info.get('status') == 'done'
+            )
+            report['results']['num_seen'] = sum(
+                info.get('num_seen', 0) for info in statuses
+            )
+        finally:
+            for crawl_id in crawl_ids:
+                client.delete(f'/crawl/{crawl_id}')
+            fake_shepherd_urls.clear()
+
+    params = {
+        name: getattr(args, name)
+        for name in (
+            'crawls',
+            'seeds',
+            'browsers',
+            'tabs',
+            'crawl_type',
+            'depth',
+            'frontier_mode',
+            'seen_mode',
+            'hosts',
+            'pages',
+            'links',
+            'external',
+        )
+    }
+    return dict(
+        {
+            'commit': git_commit(),
+            'time': int(time.time()),
+            'python': platform.python_version(),
+            'redis': 'fake' if args.fake_redis else os.environ.get('REDIS_URL', ''),
+            'params': params,
+        },
+        **report,
+    )
+
+
+def print_report(report: Dict) -> None:
+    results = report['results']
+    print(
+        f'{report["params"]["crawls"]} crawls, {results["crawls_done"]} done: '
+        f'{results["pages"]} pages in {results["seconds"]:.2f}s'
+    )
+    print(f'pages/sec        {results["pages_per_sec"]:>12.1f}')
+    print(f'redis ops/sec    {results["redis_ops_per_sec"]:>12.1f}')
+    print(f'memory growth    {results["memory_growth"]:>12} bytes')
+    print(f'memory per page  {results["memory_per_page"]:>12.1f} bytes')
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='End to end crawl simulator')
+    parser.add_argument('--crawls', type=int, default=4)
+    parser.add_argument('--seeds', type=int, default=1, help='seed urls per crawl')
+    parser.add_argument('--browsers', type=int, default=2)
+    parser.add_argument('--tabs', type=int, default=2)
+    parser.add_argument(
+        '--crawl-type', default='same-domain', choices=[t.value for t in CrawlType]
+    )
+    parser.add_argument('--depth', type=int, default=None)
+    parser.add_argument('--frontier-mode', default='fifo')
+    parser.add_argument('--seen-mode', default='url')
+
+    parser.add_argument('--hosts', type=int, default=10)
+    parser.add_argument('--pages', type=int, default=200, help='pages per host')
+    parser.add_argument('--links', type=int, default=10, help='outlinks per page')
+    parser.add_argument(
+        '--external', type=float, default=0.1, help='share of links to other hosts'
+    )
+    parser.add_argument('--seed', type=int, default=0, help='graph random seed')
+
+    parser.add_argument(
+        '--load-time', type=float, default=0, help='seconds to load each page'
+    )
+    parser.add_argument(
+        '--idle', type=float, default=0.5, help='seconds idle before a tab is done'
+    )
+    parser.add_argument('--poll', type=float, default=0.05)
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--fake-redis', action='store_true')
+    parser.add_argument('--output', help='write the results to this json file')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report = main(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(json.dumps(report, indent=2))
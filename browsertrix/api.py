@@ -1,9 +1,18 @@
-from fastapi import APIRouter, FastAPI
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Query
 from starlette.middleware.cors import ALL_METHODS, CORSMiddleware
-from starlette.responses import FileResponse, UJSONResponse
+from starlette.requests import Request
+from starlette.responses import (
+    FileResponse,
+    PlainTextResponse,
+    StreamingResponse,
+    UJSONResponse,
+)
 from starlette.staticfiles import StaticFiles
 
-from .crawl import CrawlManager
+from .crawl import CrawlManager, FlockOpError
+from .metrics import CONTENT_TYPE, MetricsMiddleware
 from .schema import *
 
 app = FastAPI(debug=True)
@@ -11,9 +20,26 @@ app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=ALL_METHODS, allow_headers=["*"]
 )
 crawl_man = CrawlManager()
+app.add_middleware(MetricsMiddleware, metrics=crawl_man.metrics, routes=app.routes)
 crawl_router = APIRouter()
 
 
+@app.exception_handler(FlockOpError)
+async def flock_op_error(request: Request, exc: FlockOpError) -> UJSONResponse:
+    return UJSONResponse({'detail': exc.detail}, status_code=400)
+
+
+def urls_query(
+    url_set: Optional[UrlSet], cursor: str, limit: int, prefix: str, regex: str
+) -> Optional[UrlsQuery]:
+    if url_set is None:
+        return None
+
+    return UrlsQuery(
+        url_set=url_set, cursor=cursor, limit=limit, prefix=prefix, regex=regex
+    )
+
+
 # ============================================================================
 @app.post('/crawls', response_model=CreateStartResponse, response_class=UJSONResponse)
 async def create_crawl(new_crawl: CreateCrawlRequest):
@@ -21,19 +47,55 @@ async def create_crawl(new_crawl: CreateCrawlRequest):
 
 
 @app.get('/crawls', response_model=CrawlInfosResponse, response_class=UJSONResponse)
-async def get_all_crawls():
-    return await crawl_man.get_all_crawls()
+async def get_all_crawls(
+    status: CrawlStatus = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+):
+    return await crawl_man.get_all_crawls(status, offset, limit)
+
+
+@app.delete(
+    '/crawls', response_model=DeleteCrawlsResponse, response_class=UJSONResponse
+)
+async def delete_crawls(status: CrawlStatus = None):
+    return await crawl_man.delete_crawls(status)
+
+
+@app.post(
+    '/crawls/restore', response_model=CreateStartResponse, response_class=UJSONResponse
+)
+async def restore_crawl(restore: RestoreCrawlRequest):
+    return await crawl_man.restore_crawl(restore.checkpoint)
+
+
+@app.post(
+    '/crawls/migrate-keys',
+    response_model=MigrateKeysResponse,
+    response_class=UJSONResponse,
+)
+async def migrate_crawl_keys():
+    return await crawl_man.migrate_crawl_keys()
 
 
 @crawl_router.put(
     '/{crawl_id}/urls',
-    response_model=OperationSuccessResponse,
+    response_model=QueueUrlsResponse,
     response_class=UJSONResponse,
 )
 async def queue_urls(crawl_id: str, url_list: QueueUrlsRequest):
     return await crawl_man.queue_crawl_urls(crawl_id, url_list.urls)
 
 
+@crawl_router.post(
+    '/{crawl_id}/scope/test',
+    response_model=ScopeTestResponse,
+    response_class=UJSONResponse,
+)
+async def test_scope(crawl_id: str, url_list: ScopeTestRequest):
+    return await crawl_man.test_crawl_scope(crawl_id, url_list.urls)
+
+
 @crawl_router.get(
     '/{crawl_id}', response_model=CrawlInfoResponse, response_class=UJSONResponse
 )
@@ -46,8 +108,42 @@ async def get_crawl(crawl_id: str):
     response_model=CrawlInfoUrlsResponse,
     response_class=UJSONResponse,
 )
-async def get_crawl_urls(crawl_id: str):
-    return await crawl_man.get_crawl_urls(crawl_id)
+async def get_crawl_urls(
+    crawl_id: str,
+    url_set: UrlSet = None,
+    cursor: str = '0',
+    limit: int = Query(1000, ge=1, le=10000),
+    prefix: str = '',
+    regex: str = '',
+):
+    query = urls_query(url_set, cursor, limit, prefix, regex)
+    return await crawl_man.get_crawl_urls(crawl_id, query)
+
+
+@crawl_router.get('/{crawl_id}/urls/export')
+async def export_crawl_urls(
+    crawl_id: str,
+    url_set: UrlSet = UrlSet.SEEN,
+    prefix: str = '',
+    regex: str = '',
+    gzip: bool = False,
+):
+    stream = await crawl_man.export_crawl_urls(crawl_id, url_set, prefix, regex, gzip)
+    filename = f'{crawl_id}-{url_set.value}.ndjson'
+    media_type = 'application/x-ndjson'
+    if gzip:
+        filename += '.gz'
+        media_type = 'application/gzip'
+
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return StreamingResponse(stream, media_type=media_type, headers=headers)
+
+
+@crawl_router.get('/{crawl_id}/events')
+async def stream_crawl_events(crawl_id: str, request: Request):
+    stream = await crawl_man.stream_crawl_events(crawl_id, request.is_disconnected)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(stream, media_type='text/event-stream', headers=headers)
 
 
 @crawl_router.get(
@@ -55,8 +151,16 @@ async def get_crawl_urls(crawl_id: str):
     response_model=FullCrawlInfoResponse,
     response_class=UJSONResponse,
 )
-async def get_full_crawl_info(crawl_id: str):
-    return await crawl_man.get_full_crawl_info(crawl_id)
+async def get_full_crawl_info(
+    crawl_id: str,
+    url_set: UrlSet = None,
+    cursor: str = '0',
+    limit: int = Query(1000, ge=1, le=10000),
+    prefix: str = '',
+    regex: str = '',
+):
+    query = urls_query(url_set, cursor, limit, prefix, regex)
+    return await crawl_man.get_full_crawl_info(crawl_id, query)
 
 
 @crawl_router.post(
@@ -77,6 +181,15 @@ async def stop_crawl(crawl_id: str):
     return await crawl_man.stop_crawl(crawl_id)
 
 
+@crawl_router.post(
+    '/{crawl_id}/checkpoint',
+    response_model=CheckpointResponse,
+    response_class=UJSONResponse,
+)
+async def checkpoint_crawl(crawl_id: str):
+    return await crawl_man.checkpoint_crawl(crawl_id)
+
+
 @crawl_router.get(
     '/{crawl_id}/done', response_model=CrawlDoneResponse, response_class=UJSONResponse
 )
@@ -91,6 +204,11 @@ async def delete_crawl(crawl_id: str):
     return await crawl_man.delete_crawl(crawl_id)
 
 
+@app.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(crawl_man.render_metrics(), media_type=CONTENT_TYPE)
+
+
 @app.route('/')
 def ui(*args, **kwargs):
     return FileResponse('static/index.html')
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+__all__ = ['desired_browsers', 'idle_browsers']
+
+
+def desired_browsers(
+    num_browsers: int,
+    num_tabs: int,
+    min_browsers: int,
+    max_browsers: int,
+    num_queue: int,
+    num_pending: int,
+    rate: Optional[float],
+    urls_per_tab: int,
+    drain_time: float,
+    step: int,
+) -> int:
+    """Returns the number of browsers an autoscaled crawl should have.
+
+    The crawl should have enough tabs for each to have at most
+    urls_per_tab queued or pending urls. It is not grown while the
+    current page completion rate drains the queue within drain_time
+    seconds, and changes by at most step browsers at a time
+
+    :param num_browsers: The current number of browsers
+    :param num_tabs: The number of tabs per browser
+    :param min_browsers: The minimum number of browsers
+    :param max_browsers: The maximum number of browsers
+    :param num_queue: The number of queued urls
+    :param num_pending: The number of pending urls
+    :param rate: The number of pages completed per second, if known
+    :param urls_per_tab: The target number of urls per tab
+    :param drain_time: The number of seconds within which the queue should be crawled
+    :param step: The maximum number of browsers added or removed at once
+    :return: The desired number of browsers
+    """
+    backlog = num_queue + num_pending
+    desired = math.ceil(backlog / (max(num_tabs, 1) * max(urls_per_tab, 1)))
+
+    if (
+        rate is not None
+        and rate > 0
+        and desired > num_browsers
+        and num_queue / rate <= drain_time
+    ):
+        desired = num_browsers
+
+    desired = min(max(desired, min_browsers), max_browsers)
+    return min(max(desired, num_browsers - step), num_browsers + step)
+
+
+def idle_browsers(
+    browsers: Iterable[str], tabs_done: List[Dict], num_tabs: int
+) -> List[str]:
+    """Returns the browsers whose tabs are all done
+
+    :param browsers: The request ids of the browsers of the crawl
+    :param tabs_done: The done tabs of the crawl
+    :param num_tabs: The number of tabs per browser
+    :return: The request ids of the idle browsers
+    """
+    done_count = Counter(tab.get('id') for tab in tabs_done)
+    return [reqid for reqid in browsers if done_count[reqid] >= num_tabs]
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .schema import CrawlInfo
+
+__all__ = ['CrawlInfoCache']
+
+
+def copy_model(model: CrawlInfo) -> CrawlInfo:
+    """Returns a copy of the supplied model, with its own field values
+    (a plain copy() shares them with the original)
+
+    :param model: The crawl info model
+    :return: The copy of the model
+    """
+    return model.copy(update={})
+
+
+# ============================================================================
+class CrawlInfoCache:
+    """Bounded LRU cache of parsed crawl info models, by crawl id.
+
+    Entries expire ttl seconds after they were added. Models are copied
+    in and out of the cache, so that changes made to a loaded crawl do
+    not leak into the cache.
+
+    Each invalidation increments a generation counter: a model read from
+    redis is only added if no crawl was invalidated since the read began
+    (see generation), so a concurrent write can not be shadowed by the
+    older value
+    """
+
+    __slots__ = ['max_size', 'ttl', 'entries', 'generation', 'hits', 'misses']
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.entries: OrderedDict[str, Tuple[float, CrawlInfo]] = OrderedDict()
+        self.generation: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, crawl_id: str) -> Optional[CrawlInfo]:
+        """Returns a copy of the cached model of the supplied crawl, if any
+
+        :param crawl_id: The id of the crawl
+        :return: The crawl info model or None
+        """
+        entry = self.entries.get(crawl_id)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[crawl_id]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(crawl_id)
+        self.hits += 1
+        return copy_model(entry[1])
+
+    def put(self, crawl_id: str, model: CrawlInfo, generation: int) -> None:
+        """Adds a copy of the supplied model to the cache, unless a crawl
+        was invalidated since the supplied generation
+
+        :param crawl_id: The id of the crawl
+        :param model: The crawl info model
+        :param generation: The generation of the cache when the model was read
+        """
+        if generation != self.generation:
+            return
+
+        self.entries[crawl_id] = (time.monotonic() + self.ttl, copy_model(model))
+        self.entries.move_to_end(crawl_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, crawl_id: str) -> None:
+        """Removes the supplied crawl from the cache
+
+        :param crawl_id: The id of the crawl
+        """
+        self.generation += 1
+        self.entries.pop(crawl_id, None)
+
+    def clear(self) -> None:
+        """Removes all crawls from the cache"""
+        self.generation += 1
+        self.entries.clear()
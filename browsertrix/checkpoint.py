@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import os
+from asyncio import AbstractEventLoop
+from typing import AsyncGenerator, AsyncIterable, AsyncIterator, Dict, List
+
+import ujson as json
+from aioredis import Redis
+
+__all__ = [
+    'CHECKPOINT_VERSION',
+    'dump_key',
+    'read_checkpoint',
+    'restore_record',
+    'write_checkpoint',
+]
+
+# version of the checkpoint file format
+CHECKPOINT_VERSION = 1
+
+# number of bytes of a string key (eg. a bloom filter bitmap) read at a time
+STRING_CHUNK_SIZE = 1 << 20
+
+
+async def dump_key(
+    redis: Redis, key: str, name: str, chunk_size: int
+) -> AsyncIterator[Dict]:
+    """Reads the supplied key in chunks, using only commands bounded by
+    the chunk size (LRANGE windows, SSCAN, ZSCAN, GETRANGE), so that
+    large sets or queues never block redis.
+
+    Each chunk is returned as a checkpoint record:
+    {'key': name, 'type': <redis type>, 'data': <items>}
+
+    :param redis: The redis instance
+    :param key: The key to be read
+    :param name: The name of the key in the checkpoint
+    :param chunk_size: The number of items to read at a time
+    :return: An async iterator over the records of the key
+    """
+    key_type = await redis.type(key)
+
+    if key_type == 'list':
+        start = 0
+        while True:
+            items = await redis.lrange(key, start, start + chunk_size - 1)
+            if items:
+                yield {'key': name, 'type': key_type, 'data': items}
+            if len(items) < chunk_size:
+                return
+            start += len(items)
+
+    elif key_type in ('set', 'zset'):
+        scan = redis.sscan if key_type == 'set' else redis.zscan
+        cursor = 0
+        while True:
+            cursor, items = await scan(key, cursor, count=chunk_size)
+            if items:
+                yield {'key': name, 'type': key_type, 'data': list(items)}
+            if not int(cursor):
+                return
+
+    elif key_type == 'hash':
+        # only small hashes are stored per crawl
+        yield {'key': name, 'type': key_type, 'data': await redis.hgetall(key)}
+
+    elif key_type == 'string':
+        offset = 0
+        while True:
+            data = await redis.getrange(
+                key, offset, offset + STRING_CHUNK_SIZE - 1, encoding=None
+            )
+            if data or not offset:
+                yield {
+                    'key': name,
+                    'type': key_type,
+                    'offset': offset,
+                    'data': base64.b64encode(data).decode('ascii'),
+                }
+            if len(data) < STRING_CHUNK_SIZE:
+                return
+            offset += len(data)
+
+
+def restore_record(tr, key: str, record: Dict) -> None:
+    """Queues the commands writing one checkpoint record to the supplied
+    key on the supplied pipeline or transaction
+
+    :param tr: The redis pipeline or transaction
+    :param key: The key to be written
+    :param record: The checkpoint record, as returned by dump_key
+    """
+    key_type = record['type']
+    data = record['data']
+
+    if key_type == 'list':
+        tr.rpush(key, *data)
+    elif key_type == 'set':
+        tr.sadd(key, *data)
+    elif key_type == 'zset':
+        pairs: List = []
+        for member, score in data:
+            pairs.extend((score, member))
+        tr.zadd(key, *pairs)
+    elif key_type == 'hash':
+        tr.hmset_dict(key, data)
+    elif key_type == 'string':
+        tr.setrange(key, record['offset'], base64.b64decode(data))
+
+
+async def write_checkpoint(
+    path: str, records: AsyncIterable[Dict], loop: AbstractEventLoop
+) -> int:
+    """Writes the supplied records to a gzip compressed, newline delimited
+    json checkpoint file, one record per line.
+
+    The file is written in the default executor, one record at a time,
+    to a temporary file that is renamed once complete
+
+    :param path: The path of the checkpoint file
+    :param records: The records to be written
+    :param loop: The event loop
+    :return: The size of the checkpoint file in bytes
+    """
+    tmp_path = path + '.tmp'
+    fh = await loop.run_in_executor(None, gzip.open, tmp_path, 'wb')
+    try:
+        async for record in records:
+            line = (json.dumps(record) + '\n').encode('utf-8')
+            await loop.run_in_executor(None, fh.write, line)
+    except BaseException:
+        await loop.run_in_executor(None, fh.close)
+        os.remove(tmp_path)
+        raise
+
+    await loop.run_in_executor(None, fh.close)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+async def read_checkpoint(
+    path: str, loop: AbstractEventLoop
+) -> AsyncGenerator[Dict, None]:
+    """Reads the records of a checkpoint file, one line at a time,
+    in the default executor. The file is closed once all the records
+    are read or the generator is closed (aclose)
+
+    :param path: The path of the checkpoint file
+    :param loop: The event loop
+    :return: An async generator over the records
+    """
+    fh = await loop.run_in_executor(None, gzip.open, path, 'rb')
+    try:
+        while True:
+            line = await loop.run_in_executor(None, fh.readline)
+            if not line:
+                return
+            yield json.loads(line)
+    finally:
+        fh.close()
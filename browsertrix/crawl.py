@@ -2,21 +2,82 @@ from __future__ import annotations
 
 import logging
 import os
+import re
 import time
 import uuid
-from asyncio import AbstractEventLoop, gather as aio_gather, get_event_loop
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Task,
+    gather as aio_gather,
+    get_event_loop,
+    sleep as aio_sleep,
+)
 from functools import partial
-from typing import Dict, List, Optional, Union
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import ujson as json
-from aiohttp import AsyncResolver, ClientSession, TCPConnector
-from aioredis import Redis
+from aioredis import Redis, ReplyError
 from starlette.exceptions import HTTPException
 
-from .schema import CacheMode, CaptureMode, CrawlInfo, CrawlType, CreateCrawlRequest
-from .utils import env, extract_domain, init_redis
-
-__all__ = ['Crawl', 'CrawlManager']
+from .schema import (
+    CacheMode,
+    CaptureMode,
+    CrawlInfo,
+    CrawlInfoResponse,
+    CrawlStatus,
+    CrawlType,
+    CreateCrawlRequest,
+    FrontierMode,
+    QueueUrl,
+    SeenMode,
+    UrlSet,
+    UrlsQuery,
+)
+from .autoscale import desired_browsers, idle_browsers
+from .cache import CrawlInfoCache
+from .checkpoint import (
+    CHECKPOINT_VERSION,
+    dump_key,
+    read_checkpoint,
+    restore_record,
+    write_checkpoint,
+)
+from .events import CrawlEvents
+from .frontier import Frontier, FrontierEntry, frontier_for, priority_score
+from .metrics import Metrics, format_gauge, format_histogram, instrument_redis
+from .politeness import HostScheduler
+from .pool import FlockPool
+from .scope import ScopeEngine, compile_scopes
+from .scripts import QUEUE_URLS, RELEASE_LOCK
+from .seen import UrlSeenSet, seen_set_for
+from .shepherd import ShepherdClient
+from .utils import (
+    chunked,
+    env,
+    extract_domain,
+    gather_limited,
+    glob_escape,
+    init_redis,
+    ndjson_stream,
+    request_url,
+    url_matcher,
+    url_request,
+)
+
+__all__ = ['Crawl', 'CrawlManager', 'FlockOpError']
 
 
 DEFAULT_REDIS_URL = 'redis://localhost'
@@ -24,13 +85,32 @@ DEFAULT_REDIS_URL = 'redis://localhost'
 logger = logging.getLogger('browsertrix')
 
 
+# ============================================================================
+class FlockOpError(Exception):
+    """A shepherd operation failed for some of the flocks of a crawl.
+
+    The api responds with a 400 error whose detail lists the error of
+    each failed flock and the flocks the operation succeeded for
+    """
+
+    def __init__(self, errors: List[Dict], browsers: List[str]) -> None:
+        super().__init__(f'flock operation failed: {errors}')
+        self.errors: List[Dict] = errors
+        self.browsers: List[str] = browsers
+
+    @property
+    def detail(self) -> Dict:
+        """The detail of the api error response"""
+        return {'errors': self.errors, 'browsers': self.browsers}
+
+
 # ============================================================================
 class CrawlManager:
     """A simple class for managing crawls"""
 
     def __init__(self) -> None:
         self.redis: Redis = None
-        self.session: ClientSession = None
+        self.shepherd: ShepherdClient = None
         self.loop: AbstractEventLoop = None
         self.depth: int = env('DEFAULT_DEPTH', type_=int, default=1)
         self.same_domain_depth: int = env(
@@ -39,6 +119,9 @@ class CrawlManager:
 
         self.num_browsers: int = env('DEFAULT_NUM_BROWSERS', type_=int, default=2)
 
+        self.queue_chunk_size: int = env('QUEUE_CHUNK_SIZE', type_=int, default=1000)
+        self.scope_filter: bool = env('SCOPE_FILTER', type_=bool, default=True)
+
         self.flock: str = env('DEFAULT_FLOCK', default='browsers')
 
         self.shepherd_host: str = env(
@@ -46,9 +129,54 @@ class CrawlManager:
         )
 
         self.browser_api_url: str = f'{self.shepherd_host}/api'
+        self.shepherd_pool_size: int = env('SHEPHERD_POOL_SIZE', type_=int, default=100)
+        self.shepherd_timeout: float = env(
+            'SHEPHERD_TIMEOUT', type_=float, default=30.0
+        )
+        self.shepherd_retries: int = env('SHEPHERD_RETRIES', type_=int, default=2)
+        self.shepherd_retry_backoff: float = env(
+            'SHEPHERD_RETRY_BACKOFF', type_=float, default=0.2
+        )
+        self.shepherd_failure_threshold: int = env(
+            'SHEPHERD_FAILURE_THRESHOLD', type_=int, default=5
+        )
+        self.shepherd_reset_timeout: float = env(
+            'SHEPHERD_RESET_TIMEOUT', type_=float, default=30.0
+        )
         self.pool: str = env('DEFAULT_POOL', default='')
 
+        self.redis_pool_size: int = env('REDIS_POOL_SIZE', type_=int, default=10)
+        # use the cluster compatible key layout, a:{<crawl_id>}:...
+        self.key_hash_tags: bool = env('REDIS_KEY_HASH_TAGS', type_=bool, default=False)
+
         self.scan_key: str = 'a:*:info'
+        self.crawls_index_key: str = 'crawls:index'
+        self.host_scheduled_key: str = 'crawls:host_scheduled'
+        self.autoscaled_key: str = 'crawls:autoscaled'
+        self.admission_key: str = 'crawls:admission'
+        self.invalidation_channel: str = 'crawls:invalidate'
+        self.admission_lock_key: str = 'crawls:admission:lock'
+        self.admission_retry_key: str = 'crawls:admission:retry'
+
+        self.host_schedule_interval: float = env(
+            'HOST_SCHEDULER_INTERVAL', type_=float, default=1.0
+        )
+        self.host_schedule_task: Optional[Task] = None
+
+        self.shepherd_concurrency: int = env(
+            'SHEPHERD_CONCURRENCY', type_=int, default=10
+        )
+
+        self.completion_watch_interval: float = env(
+            'COMPLETION_WATCH_INTERVAL', type_=float, default=1.0
+        )
+        self.completion_watch_task: Optional[Task] = None
+
+        self.events_interval: float = env('EVENTS_INTERVAL', type_=float, default=1.0)
+        self.events_keep_alive: float = env(
+            'EVENTS_KEEP_ALIVE', type_=float, default=15.0
+        )
+        self.crawl_events: Dict[str, CrawlEvents] = {}
 
         self.container_environ: Dict[str, str] = {
             'URL': 'about:blank',
@@ -65,6 +193,84 @@ class CrawlManager:
 
         self.default_browser = None
 
+        self.flock_pool_size: int = env('FLOCK_POOL_SIZE', type_=int, default=0)
+        self.flock_pool_browser: str = env('FLOCK_POOL_BROWSER', default='chrome:73')
+        self.flock_pool_max_idle: float = env(
+            'FLOCK_POOL_MAX_IDLE', type_=float, default=600.0
+        )
+        self.flock_pool_interval: float = env(
+            'FLOCK_POOL_INTERVAL', type_=float, default=5.0
+        )
+        self.flock_pool_lock_key: str = 'flockpool:lock'
+        self.flock_pool_lock_timeout: int = env(
+            'FLOCK_POOL_LOCK_TIMEOUT', type_=int, default=120
+        )
+        # shepherd sets the user params (read by pywb) when a flock is
+        # requested, so the pool flocks are requested for one collection
+        self.flock_pool_user_params: Dict[str, str] = {
+            'coll': env('FLOCK_POOL_COLL', default='live'),
+            'mode': env('FLOCK_POOL_MODE', default=CaptureMode.RECORD.value),
+            'cache': CacheMode.ALWAYS.value,
+        }
+        self.flock_pools: Dict[bool, FlockPool] = {}
+        self.flock_pool_task: Optional[Task] = None
+        self.init_flock_pools()
+
+        self.autoscale_interval: float = env(
+            'AUTOSCALE_INTERVAL', type_=float, default=30.0
+        )
+        self.autoscale_urls_per_tab: int = env(
+            'AUTOSCALE_URLS_PER_TAB', type_=int, default=50
+        )
+        self.autoscale_drain_time: float = env(
+            'AUTOSCALE_DRAIN_TIME', type_=float, default=600.0
+        )
+        self.autoscale_step: int = env('AUTOSCALE_STEP', type_=int, default=2)
+        # last (time, number of completed pages) of each autoscaled crawl
+        self.autoscale_samples: Dict[str, Tuple[float, int]] = {}
+        self.autoscale_task: Optional[Task] = None
+
+        self.checkpoint_dir: str = env('CHECKPOINT_DIR', default='checkpoints')
+
+        self.browser_budget: int = env('BROWSER_BUDGET', type_=int, default=0)
+        self.admission_interval: float = env(
+            'ADMISSION_INTERVAL', type_=float, default=5.0
+        )
+        self.admission_lock_timeout: int = env(
+            'ADMISSION_LOCK_TIMEOUT', type_=int, default=120
+        )
+        self.admission_retries: int = env('ADMISSION_RETRIES', type_=int, default=3)
+        self.admission_task: Optional[Task] = None
+
+        self.crawl_cache_size: int = env('CRAWL_CACHE_SIZE', type_=int, default=1000)
+        self.crawl_cache_ttl: float = env('CRAWL_CACHE_TTL', type_=float, default=5.0)
+        self.crawl_cache: Optional[CrawlInfoCache] = None
+        if self.crawl_cache_size > 0:
+            self.crawl_cache = CrawlInfoCache(
+                self.crawl_cache_size, self.crawl_cache_ttl
+            )
+        # the cache is only used while subscribed to the invalidation channel
+        self.invalidation_subscribed: bool = False
+        self.invalidation_task: Optional[Task] = None
+
+        # cleared if redis does not support UNLINK (before 4.0)
+        self.use_unlink: bool = True
+
+        self.pending_lease_timeout: float = env(
+            'PENDING_LEASE_TIMEOUT', type_=float, default=600.0
+        )
+        self.pending_max_retries: int = env('PENDING_MAX_RETRIES', type_=int, default=2)
+        self.pending_reap_interval: float = env(
+            'PENDING_REAP_INTERVAL', type_=float, default=30.0
+        )
+        self.pending_reap_task: Optional[Task] = None
+
+        self.metrics: Metrics = Metrics()
+        self.metrics_interval: float = env(
+            'METRICS_INTERVAL', type_=float, default=15.0
+        )
+        self.metrics_task: Optional[Task] = None
+
         if os.environ.get('DEBUG'):
             logger.setLevel(logging.DEBUG)
         else:
@@ -72,22 +278,93 @@ class CrawlManager:
 
     async def startup(self) -> None:
         """Initialize the crawler manager's redis connection and
-        http session used to make requests to shepherd
+        client used to make requests to shepherd
         """
         self.loop = get_event_loop()
-        self.redis = await init_redis(
-            env('REDIS_URL', default=DEFAULT_REDIS_URL), self.loop
-        )
-        self.session = ClientSession(
-            connector=TCPConnector(
-                resolver=AsyncResolver(loop=self.loop), loop=self.loop
+        self.redis = instrument_redis(
+            await init_redis(
+                env('REDIS_URL', default=DEFAULT_REDIS_URL),
+                self.loop,
+                self.redis_pool_size,
             ),
-            json_serialize=partial(json.dumps, ensure_ascii=False),
-            loop=self.loop,
+            self.metrics.record_redis,
         )
+        await self.index_crawls()
+        self.shepherd = ShepherdClient(
+            self.browser_api_url,
+            self.loop,
+            pool_size=self.shepherd_pool_size,
+            timeout=self.shepherd_timeout,
+            retries=self.shepherd_retries,
+            retry_backoff=self.shepherd_retry_backoff,
+            failure_threshold=self.shepherd_failure_threshold,
+            reset_timeout=self.shepherd_reset_timeout,
+        )
+
+        if self.host_schedule_interval > 0:
+            self.host_schedule_task = self.loop.create_task(self.host_schedule_loop())
+
+        if self.completion_watch_interval > 0:
+            self.completion_watch_task = self.loop.create_task(
+                self.completion_watch_loop()
+            )
+
+        if self.flock_pools and self.flock_pool_interval > 0:
+            self.flock_pool_task = self.loop.create_task(self.flock_pool_loop())
+
+        if self.autoscale_interval > 0:
+            self.autoscale_task = self.loop.create_task(self.autoscale_loop())
+
+        if self.pending_reap_interval > 0:
+            self.pending_reap_task = self.loop.create_task(self.pending_reap_loop())
+
+        if self.browser_budget > 0 and self.admission_interval > 0:
+            self.admission_task = self.loop.create_task(self.admission_loop())
+
+        if self.crawl_cache:
+            self.invalidation_task = self.loop.create_task(self.invalidation_loop())
+
+        if self.metrics_interval > 0:
+            self.metrics_task = self.loop.create_task(self.metrics_loop())
 
     async def shutdown(self) -> None:
-        """Closes the redis connection and http session"""
+        """Closes the redis connection and shepherd client"""
+        if self.host_schedule_task:
+            self.host_schedule_task.cancel()
+            self.host_schedule_task = None
+
+        if self.completion_watch_task:
+            self.completion_watch_task.cancel()
+            self.completion_watch_task = None
+
+        if self.flock_pool_task:
+            self.flock_pool_task.cancel()
+            self.flock_pool_task = None
+
+        if self.autoscale_task:
+            self.autoscale_task.cancel()
+            self.autoscale_task = None
+
+        if self.pending_reap_task:
+            self.pending_reap_task.cancel()
+            self.pending_reap_task = None
+
+        if self.admission_task:
+            self.admission_task.cancel()
+            self.admission_task = None
+
+        if self.invalidation_task:
+            self.invalidation_task.cancel()
+            self.invalidation_task = None
+
+        if self.metrics_task:
+            self.metrics_task.cancel()
+            self.metrics_task = None
+
+        for events in self.crawl_events.values():
+            events.close()
+        self.crawl_events.clear()
+
         try:
             self.redis.close()
             await self.redis.wait_closed()
@@ -95,10 +372,87 @@ class CrawlManager:
             pass
 
         try:
-            await self.session.close()
+            await self.shepherd.close()
         except Exception:
             pass
 
+    def status_key(self, status: str) -> str:
+        """Returns the key of the registry index of crawls with the supplied status
+
+        :param status: The crawl status
+        :return: The redis key of the index
+        """
+        return f'crawls:status:{status}'
+
+    def crawl_key_id(self, crawl_id: str, hash_tag: Optional[bool] = None) -> str:
+        """Returns the id used in the redis keys of the supplied crawl
+        (a:<key id>:...): with hash tags, the crawl id in braces, so that
+        all keys of a crawl are in the same Redis Cluster hash slot
+
+        :param crawl_id: The id of the crawl
+        :param hash_tag: Use hash tags, defaults to key_hash_tags
+        :return: The key id of the crawl
+        """
+        if hash_tag is None:
+            hash_tag = self.key_hash_tags
+        return '{' + crawl_id + '}' if hash_tag else crawl_id
+
+    async def index_crawls(self) -> int:
+        """Builds the crawl registry from the crawl info keys, if it does
+        not exist yet (eg. for crawls created by an older version)
+
+        :return: The number of crawls added to the registry
+        """
+        if await self.redis.exists(self.crawls_index_key):
+            return 0
+
+        count = 0
+        async for key in self.redis.iscan(match=self.scan_key):
+            crawl_id = key[len('a:') : -len(':info')].strip('{}')
+            crawl = await Crawl.load(crawl_id, self)
+            if crawl.model:
+                await crawl.register(crawl.model.start_time or time.time())
+                count += 1
+
+        return count
+
+    async def migrate_crawl_keys(self) -> Dict:
+        """Moves the keys of the crawls using the plain key layout
+        (a:<crawl_id>:...) to the hash tagged layout (a:{<crawl_id>}:...),
+        with RENAME on the current redis server, eg. before moving the
+        data to a Redis Cluster.
+
+        Running crawls are stopped first, as their browsers use the plain
+        keys, and need to be started again
+
+        :return: A dictionary containing the results of this operation
+        """
+        if not self.key_hash_tags:
+            raise HTTPException(400, detail='key hash tags are not enabled')
+
+        crawl_ids = []
+        async for key in self.redis.iscan(match=self.scan_key):
+            key_id = key[len('a:') : -len(':info')]
+            if not key_id.startswith('{'):
+                crawl_ids.append(key_id)
+
+        num_migrated = 0
+        stopped = []
+        for crawl_id in crawl_ids:
+            crawl = Crawl(crawl_id, self, hash_tag=False)
+            crawl.load_model(await self.redis.hgetall(crawl.info_key))
+            if not crawl.model:
+                continue
+
+            if crawl.model.status == CrawlStatus.RUNNING:
+                await crawl.stop()
+                stopped.append(crawl_id)
+
+            await crawl.migrate_keys()
+            num_migrated += 1
+
+        return {'success': True, 'num_migrated': num_migrated, 'stopped': stopped}
+
     def new_crawl_id(self) -> str:
         """Creates an id for a new crawl
 
@@ -118,16 +472,70 @@ class CrawlManager:
         return await Crawl.create(self, crawl_request)
 
     async def load_crawl(self, crawl_id: str) -> Crawl:
-        """Returns the crawl information for the supplied crawl id
+        """Returns the crawl information for the supplied crawl id.
+
+        The crawl info model is read from the crawl info cache, if
+        enabled and up to date
 
         :param crawl_id: The id of the crawl to load
         :return: The loaded crawl
         """
+        cache = self.crawl_cache if self.invalidation_subscribed else None
+        if cache:
+            model = cache.get(crawl_id)
+            if model:
+                return Crawl(crawl_id, self, model)
+            generation = cache.generation
+
         crawl = await Crawl.load(crawl_id, self)
         if not crawl.model:
             raise HTTPException(404, detail='crawl not found')
+
+        if cache:
+            cache.put(crawl_id, crawl.model, generation)
         return crawl
 
+    async def invalidate_crawl(self, crawl_id: str) -> None:
+        """Removes the supplied crawl from the crawl info cache of this
+        and, through the invalidation channel, every other api worker.
+        Called after each change of a crawls info key
+
+        :param crawl_id: The id of the changed crawl
+        """
+        if self.crawl_cache:
+            self.crawl_cache.invalidate(crawl_id)
+            await self.redis.publish(self.invalidation_channel, crawl_id)
+
+    async def invalidation_loop(self) -> None:
+        """Subscribes to the invalidation channel, with a dedicated
+        connection, and removes each published crawl from the crawl info
+        cache. While not subscribed (eg. after losing the connection),
+        the cache is emptied and not used
+        """
+        while True:
+            conn = None
+            try:
+                conn = await init_redis(
+                    env('REDIS_URL', default=DEFAULT_REDIS_URL), self.loop
+                )
+                (channel,) = await conn.subscribe(self.invalidation_channel)
+                self.invalidation_subscribed = True
+
+                while await channel.wait_message():
+                    self.crawl_cache.invalidate(await channel.get(encoding='utf-8'))
+
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+            finally:
+                self.invalidation_subscribed = False
+                self.crawl_cache.clear()
+                if conn:
+                    conn.close()
+
+            await aio_sleep(1.0)
+
     async def get_crawl_info(self, crawl_id: str) -> Dict:
         """Retrieves and returns a crawls info
 
@@ -137,28 +545,38 @@ class CrawlManager:
         crawl = await self.load_crawl(crawl_id)
         return await crawl.get_info()
 
-    async def get_full_crawl_info(self, crawl_id: str) -> Dict:
+    async def get_full_crawl_info(
+        self, crawl_id: str, query: Optional[UrlsQuery] = None
+    ) -> Dict:
         """Retrieves and returns a crawls full details
 
         :param crawl_id: The id of the crawl to retrieve full details for
+        :param query: Optional selection of one page of one set of URLs
         :return: A dictionary containing the crawls full details
         """
         crawl = await self.load_crawl(crawl_id)
         info, urls = await aio_gather(
-            crawl.get_info(count_urls=False), crawl.get_info_urls(), loop=self.loop
+            crawl.get_info(count_urls=False),
+            crawl.get_info_urls(query),
+            loop=self.loop,
         )
         return dict(**info, **urls, success=True)
 
-    async def get_crawl_urls(self, crawl_id: str) -> Dict:
+    async def get_crawl_urls(
+        self, crawl_id: str, query: Optional[UrlsQuery] = None
+    ) -> Dict:
         """Retrieves and returns a crawls URLs
 
         :param crawl_id: The id of the crawl to retrieve URLs for
+        :param query: Optional selection of one page of one set of URLs
         :return: A dictionary containing the crawls URL info
         """
         crawl = await self.load_crawl(crawl_id)
-        return await crawl.get_info_urls()
+        return await crawl.get_info_urls(query)
 
-    async def queue_crawl_urls(self, crawl_id: str, url_list: List[str]) -> Dict:
+    async def queue_crawl_urls(
+        self, crawl_id: str, url_list: List[Union[QueueUrl, str]]
+    ) -> Dict:
         """Queues the supplied list of URLs for the crawl associated with the supplied id
 
         :param crawl_id: The id of the crawl the URLs will be queued for
@@ -168,6 +586,19 @@ class CrawlManager:
         crawl = await self.load_crawl(crawl_id)
         return await crawl.queue_urls(url_list)
 
+    async def test_crawl_scope(
+        self, crawl_id: str, url_list: List[Union[QueueUrl, str]]
+    ) -> Dict:
+        """Checks the supplied list of URLs against the scope of the crawl
+        associated with the supplied id, without queuing them
+
+        :param crawl_id: The id of the crawl
+        :param url_list: The list of URLs to be checked
+        :return: The scope check result of each URL
+        """
+        crawl = await self.load_crawl(crawl_id)
+        return await crawl.test_scope(url_list)
+
     async def start_crawl(self, crawl_id: str) -> Dict:
         """Starts the crawl associated with the supplied id
 
@@ -195,6 +626,149 @@ class CrawlManager:
         crawl = await self.load_crawl(crawl_id)
         return await crawl.delete()
 
+    async def delete_crawls(self, status: Optional[CrawlStatus] = None) -> Dict:
+        """Stops and deletes all crawls, or the crawls with the supplied status.
+
+        The crawls are deleted in batches of queue_chunk_size, at most
+        shepherd_concurrency crawls at a time
+
+        :param status: Optional status of the crawls to delete
+        :return: A dictionary containing the number of deleted crawls
+        and the error of each crawl that could not be deleted
+        """
+        key = self.status_key(status.value) if status else self.crawls_index_key
+        crawl_ids = await self.redis.zrange(key, 0, -1)
+
+        num_deleted = 0
+        errors = []
+        for chunk in chunked(crawl_ids, self.queue_chunk_size):
+            crawls = []
+            for crawl in await Crawl.load_many(chunk, self):
+                if crawl.model:
+                    crawls.append(crawl)
+                else:
+                    await crawl.unregister()
+
+            results = await gather_limited(
+                lambda crawl: crawl.delete(), crawls, self.shepherd_concurrency
+            )
+            for crawl, res in zip(crawls, results):
+                if isinstance(res, Exception):
+                    error = getattr(res, 'detail', None) or str(res)
+                    errors.append({'id': crawl.crawl_id, 'error': error})
+                else:
+                    num_deleted += 1
+
+        return {'success': not errors, 'num_deleted': num_deleted, 'errors': errors}
+
+    async def delete_keys(self, keys: List[str]) -> None:
+        """Deletes the supplied keys without blocking redis: with UNLINK,
+        which frees the memory of large keys in the background, or,
+        if redis does not support it, by emptying large keys in chunks
+
+        :param keys: The keys to be deleted
+        """
+        if self.use_unlink:
+            try:
+                await self.redis.unlink(*keys)
+                return
+            except ReplyError as e:
+                if 'unknown command' not in str(e).lower():
+                    raise
+
+                logger.warning('UNLINK not supported, deleting keys in chunks')
+                self.use_unlink = False
+
+        for key in keys:
+            await self.delete_key_chunked(key)
+
+    async def delete_key_chunked(self, key: str) -> None:
+        """Deletes the supplied key, removing at most queue_chunk_size
+        members of a set, list or sorted set at a time
+
+        :param key: The key to be deleted
+        """
+        chunk_size = self.queue_chunk_size
+        key_type = await self.redis.type(key)
+
+        if key_type == 'set':
+            while await self.redis.spop(key, chunk_size):
+                pass
+        elif key_type == 'list':
+            while await self.redis.llen(key):
+                await self.redis.ltrim(key, 0, -chunk_size - 1)
+        elif key_type == 'zset':
+            while await self.redis.zremrangebyrank(key, 0, chunk_size - 1):
+                pass
+
+        await self.redis.delete(key)
+
+    def checkpoint_path(self, name: str) -> str:
+        """Returns the path of the checkpoint file with the supplied name
+
+        :param name: The name of the checkpoint file
+        :return: The path of the checkpoint file
+        """
+        if not name or os.path.basename(name) != name:
+            raise HTTPException(400, detail='invalid checkpoint name')
+        return os.path.join(self.checkpoint_dir, name)
+
+    async def checkpoint_crawl(self, crawl_id: str) -> Dict:
+        """Writes a checkpoint of the crawl associated with the supplied id
+
+        :param crawl_id: The id of the crawl to checkpoint
+        :return: A dictionary containing the name and size of the checkpoint
+        """
+        crawl = await self.load_crawl(crawl_id)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        name = f'{crawl_id}-{int(time.time())}.ckpt.gz'
+        size = await crawl.checkpoint(self.checkpoint_path(name))
+        return {'success': True, 'id': crawl_id, 'checkpoint': name, 'size': size}
+
+    async def restore_crawl(self, name: str) -> Dict:
+        """Restores a crawl from the checkpoint with the supplied name
+
+        :param name: The name of the checkpoint file
+        :return: A dictionary containing the results of this operation
+        """
+        path = self.checkpoint_path(name)
+        if not os.path.isfile(path):
+            raise HTTPException(404, detail='checkpoint not found')
+        return await Crawl.restore(self, path)
+
+    async def export_crawl_urls(
+        self,
+        crawl_id: str,
+        url_set: UrlSet,
+        prefix: str = '',
+        regex: str = '',
+        compress: bool = False,
+    ) -> AsyncIterator[bytes]:
+        """Returns a stream of all URLs of one set of the crawl associated
+        with the supplied id, as NDJSON
+
+        :param crawl_id: The id of the crawl to export URLs from
+        :param url_set: The set of URLs to export
+        :param prefix: Export only URLs with this prefix
+        :param regex: Export only URLs matching this regex
+        :param compress: T/F indicating if the stream should be gzip compressed
+        :return: An async iterator over the chunks of the stream
+        """
+        crawl = await self.load_crawl(crawl_id)
+        if url_set == UrlSet.SEEN and not crawl.seen.listable:
+            raise HTTPException(
+                400,
+                detail=(
+                    f'seen urls can not be exported, the {crawl.model.seen_mode} '
+                    'seen mode does not store them'
+                ),
+            )
+
+        batches = crawl.iter_urls(
+            url_set, prefix, regex, batch_size=self.queue_chunk_size
+        )
+        return ndjson_stream(batches, compress)
+
     async def is_crawl_done(self, crawl_id: str) -> Dict:
         """Checks to see if the crawl associated with the supplied id
         is done
@@ -206,42 +780,678 @@ class CrawlManager:
         return await crawl.is_done()
 
     async def do_request(self, url_path: str, post_data: Optional[Dict] = None) -> Dict:
-        """Makes an HTTP post request to the supplied URL/path
+        """Makes an HTTP post request to the supplied shepherd api path
 
-        :param url_path: The URL or path for the post request
+        :param url_path: The path for the post request
         :param post_data: Optional post request body
         :return: The response body
         """
+        return await self.shepherd.post(url_path, post_data)
+
+    async def get_all_crawls(
+        self,
+        status: Optional[CrawlStatus] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Union[int, List[Dict]]]:
+        """Returns crawl info for all crawls, or for the crawls with the
+        supplied status, most recent first.
+
+        The crawls are listed from the crawl registry and their infos
+        are fetched with one pipeline
+
+        :param status: Optional status of the crawls to return
+        :param offset: The number of crawls to skip
+        :param limit: The maximum number of crawls to return
+        :return: The list of crawl info and the total number of crawls
+        """
+        key = self.status_key(status.value) if status else self.crawls_index_key
+        stop = offset + limit - 1 if limit else -1
+
+        tr = self.redis.pipeline()
+        ids_fut = tr.zrevrange(key, offset, stop)
+        total_fut = tr.zcard(key)
+        await tr.execute()
+
+        crawls = await Crawl.load_many(ids_fut.result(), self)
+
+        tr = self.redis.pipeline()
+        results = []
+        for crawl in crawls:
+            if crawl.model:
+                results.append((crawl, crawl.queue_info(tr)))
+            else:
+                await crawl.unregister()
+
+        await tr.execute()
+
+        all_infos = []
+        for crawl, result in results:
+            all_infos.append(await crawl.update_done(result()))
+
+        return {'crawls': all_infos, 'total': total_fut.result()}
+
+    async def stream_crawl_events(
+        self, crawl_id: str, is_disconnected: Callable[[], Awaitable[bool]]
+    ) -> AsyncIterator[str]:
+        """Returns a stream of the live progress events of the crawl
+        associated with the supplied id, as server-sent events.
+
+        All viewers of a crawl share one feed (see CrawlEvents), which
+        reads the crawl information once per events_interval seconds
+
+        :param crawl_id: The id of the crawl to stream events for
+        :param is_disconnected: Returns true once the viewer has disconnected
+        :return: An async iterator over the server-sent events messages
+        """
+        await self.load_crawl(crawl_id)
+
+        events = self.crawl_events.get(crawl_id)
+        if events is None:
+            events = CrawlEvents(
+                crawl_id, partial(self.get_events_info, crawl_id), self.events_interval
+            )
+            self.crawl_events[crawl_id] = events
+
+        return self._stream_crawl_events(events, is_disconnected)
+
+    async def _stream_crawl_events(
+        self, events: CrawlEvents, is_disconnected: Callable[[], Awaitable[bool]]
+    ) -> AsyncIterator[str]:
+        """Streams the supplied feed, removing it once it has no viewers
+
+        :param events: The feed of a crawl
+        :param is_disconnected: Returns true once the viewer has disconnected
+        :return: An async iterator over the server-sent events messages
+        """
         try:
-            url = self.browser_api_url + url_path
-            async with self.session.post(url, json=post_data) as res:
-                res = await res.json()
-                logger.debug(str(res))
-                return res
-        except Exception as e:
-            text = str(e)
-            logger.debug(text)
-            raise HTTPException(400, text)
+            async for message in events.stream(is_disconnected, self.events_keep_alive):
+                yield message
+        finally:
+            if not events.subscribers:
+                self.crawl_events.pop(events.crawl_id, None)
 
-    async def get_all_crawls(self) -> Dict[str, List[Dict]]:
-        """Returns crawl info for all crawls
+    async def get_events_info(self, crawl_id: str) -> Optional[Dict]:
+        """Returns the crawl information of the supplied crawl id used
+        for its live progress events
 
-        :return: The list of all crawl info
+        :param crawl_id: The id of the crawl
+        :return: The crawl information or None if the crawl does not exist
         """
-        all_infos = []
+        crawl = await Crawl.load(crawl_id, self)
+        if not crawl.model:
+            return None
 
-        async for key in self.redis.iscan(match=self.scan_key):
-            _, crawl_id, _2 = key.split(':', 2)
+        info = await crawl.get_info()
+        return CrawlInfoResponse.parse_obj(info).dict()
+
+    async def schedule_hosts(self) -> int:
+        """Moves urls from the per-host sub-queues to the frontier of
+        each running crawl that uses per-host scheduling
+
+        :return: The total number of urls moved to the frontiers
+        """
+        total = 0
+        for crawl_id in await self.redis.smembers(self.host_scheduled_key):
+            crawl = await Crawl.load(crawl_id, self)
+            scheduler = crawl.host_scheduler if crawl.model else None
+            if not scheduler or crawl.model.status != 'running':
+                await self.redis.srem(self.host_scheduled_key, crawl_id)
+                continue
+
+            total += await scheduler.schedule(self.redis)
+
+        return total
 
+    async def host_schedule_loop(self) -> None:
+        """Runs schedule_hosts every host_schedule_interval seconds"""
+        while True:
             try:
-                # crawl = Crawl(crawl_id, self)
-                crawl = await self.load_crawl(crawl_id)
-                info = await crawl.get_info()
-                all_infos.append(info)
-            except HTTPException:
+                await self.schedule_hosts()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.host_schedule_interval)
+
+    async def watch_completion(self) -> int:
+        """Marks each running crawl whose tabs are all done as done and
+        releases its flocks.
+
+        Only the number of done tabs of each running crawl (from the
+        crawl registry) is checked, with one pipeline
+
+        :return: The number of crawls marked as done
+        """
+        running = await self.redis.zrange(
+            self.status_key(CrawlStatus.RUNNING.value), 0, -1
+        )
+        crawls = await Crawl.load_many(running, self)
+
+        tr = self.redis.pipeline()
+        results = []
+        for crawl in crawls:
+            if crawl.model:
+                results.append((crawl, crawl.queue_done_update(tr)))
+            else:
+                await crawl.unregister()
+
+        await tr.execute()
+
+        finished = 0
+        for crawl, result in results:
+            update = result()
+            if update:
+                await crawl.finish(update['finish_time'])
+                finished += 1
+
+        return finished
+
+    async def completion_watch_loop(self) -> None:
+        """Runs watch_completion every completion_watch_interval seconds"""
+        while True:
+            try:
+                await self.watch_completion()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.completion_watch_interval)
+
+    async def browsers_in_use(self) -> int:
+        """Returns the number of browsers of the running crawls and of
+        the warm flock pools, whose flocks are started
+
+        :return: The number of browsers in use
+        """
+        running = await self.redis.zrange(
+            self.status_key(CrawlStatus.RUNNING.value), 0, -1
+        )
+        crawls = await Crawl.load_many(running, self)
+        in_use = sum(crawl.model.num_browsers for crawl in crawls if crawl.model)
+        for pool in self.flock_pools.values():
+            in_use += await pool.count(self.redis)
+        return in_use
+
+    async def acquire_lock(self, key: str, timeout: int) -> Optional[str]:
+        """Takes the supplied lock key, shared by all api workers, unless
+        it is already held
+
+        :param key: The lock key
+        :param timeout: The number of seconds after which the lock expires
+        :return: The token of the lock, None if it is already held
+        """
+        token = uuid.uuid4().hex
+        locked = await self.redis.set(
+            key, token, expire=timeout, exist=Redis.SET_IF_NOT_EXIST
+        )
+        return token if locked else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Releases the supplied lock key, unless it expired and was
+        taken by another holder since
+
+        :param key: The lock key
+        :param token: The token returned by acquire_lock
+        """
+        await self.redis.eval(RELEASE_LOCK, keys=[key], args=[token])
+
+    async def admit_crawls(self) -> int:
+        """Starts the queued crawls, highest priority first, while the
+        browser budget has room for their browsers.
+
+        Crawls are admitted strictly in queue order: a crawl that does
+        not fit holds back the crawls after it, so that large crawls
+        are not starved by smaller ones. A crawl that fails to start is
+        retried with an exponential backoff, without holding back the
+        others, and stopped after admission_retries attempts. A lock key
+        makes sure that only one api worker admits crawls at a time
+
+        :return: The number of crawls started
+        """
+        token = await self.acquire_lock(
+            self.admission_lock_key, self.admission_lock_timeout
+        )
+        if not token:
+            return 0
+
+        try:
+            return await self._admit_crawls()
+        finally:
+            await self.release_lock(self.admission_lock_key, token)
+
+    async def _admit_crawls(self) -> int:
+        """Starts the queued crawls that fit in the browser budget,
+        see admit_crawls
+
+        :return: The number of crawls started
+        """
+        queued = await self.redis.zrange(self.admission_key, 0, -1, withscores=True)
+        if not queued:
+            return 0
+
+        free = self.browser_budget - await self.browsers_in_use()
+        crawls = await Crawl.load_many([crawl_id for crawl_id, _ in queued], self)
+        retries = await self.redis.hgetall(self.admission_retry_key)
+        now = time.time()
+
+        admitted = 0
+        for crawl, (_, score) in zip(crawls, queued):
+            if not crawl.model or crawl.model.status != CrawlStatus.QUEUED:
+                await self.redis.zrem(self.admission_key, crawl.crawl_id)
+                await self.redis.hdel(self.admission_retry_key, crawl.crawl_id)
+                continue
+
+            retry = json.loads(retries.get(crawl.crawl_id) or '{}')
+            if retry.get('retry_at', 0) > now:
                 continue
 
-        return {'crawls': all_infos}
+            if crawl.model.num_browsers > free:
+                # the warm flocks give way to the queued crawls
+                free += await self.shrink_flock_pools(crawl.model.num_browsers - free)
+            if crawl.model.num_browsers > free:
+                break
+
+            try:
+                if await crawl.admit(score):
+                    free -= crawl.model.num_browsers
+                    admitted += 1
+                    if retry:
+                        await self.redis.hdel(self.admission_retry_key, crawl.crawl_id)
+            except Exception as e:
+                await self.admission_failed(crawl, retry.get('attempts', 0) + 1, e)
+
+        return admitted
+
+    async def admission_failed(
+        self, crawl: Crawl, attempts: int, error: Exception
+    ) -> None:
+        """Schedules the next attempt to start a queued crawl that failed
+        to start, or stops it after admission_retries attempts
+
+        :param crawl: The crawl that failed to start
+        :param attempts: The number of failed attempts
+        :param error: The error of the last attempt
+        """
+        if attempts >= self.admission_retries:
+            logger.warning(
+                f'Crawl {crawl.crawl_id}: stopped, not started after '
+                f'{attempts} attempts: {error}'
+            )
+            await self.redis.zrem(self.admission_key, crawl.crawl_id)
+            await self.redis.hdel(self.admission_retry_key, crawl.crawl_id)
+            await crawl.set_status(CrawlStatus.STOPPED.value)
+            return
+
+        backoff = self.admission_interval * 2 ** (attempts - 1)
+        logger.warning(
+            f'Crawl {crawl.crawl_id}: not started, retrying in {backoff:.0f}s: {error}'
+        )
+        retry = {'attempts': attempts, 'retry_at': time.time() + backoff}
+        await self.redis.hset(
+            self.admission_retry_key, crawl.crawl_id, json.dumps(retry)
+        )
+
+    async def admission_loop(self) -> None:
+        """Runs admit_crawls every admission_interval seconds"""
+        while True:
+            try:
+                await self.admit_crawls()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.admission_interval)
+
+    async def reap_pending(self, now: Optional[float] = None) -> int:
+        """Renews the leases of the pending urls of each running crawl
+        and queues again the urls whose lease expired.
+
+        The pending sets and leases of all running crawls are read
+        with one pipeline
+
+        :param now: The current time, defaults to time.time()
+        :return: The number of urls queued again or given up
+        """
+        if now is None:
+            now = time.time()
+
+        running = await self.redis.zrange(
+            self.status_key(CrawlStatus.RUNNING.value), 0, -1
+        )
+        crawls = await Crawl.load_many(running, self)
+
+        tr = self.redis.pipeline()
+        results = [(crawl, crawl.queue_leases(tr)) for crawl in crawls if crawl.model]
+        await tr.execute()
+
+        reaped = 0
+        for crawl, result in results:
+            reaped += await crawl.reap_pending(*result(), now)
+
+        return reaped
+
+    async def pending_reap_loop(self) -> None:
+        """Runs reap_pending every pending_reap_interval seconds"""
+        while True:
+            try:
+                await self.reap_pending()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.pending_reap_interval)
+
+    async def sample_metrics(self) -> None:
+        """Samples the number of crawls by status and the url counts
+        of each running crawl for the metrics endpoint, with one pipeline
+        per sample (after loading the running crawls)
+        """
+        running = await self.redis.zrange(
+            self.status_key(CrawlStatus.RUNNING.value), 0, -1
+        )
+        crawls = await Crawl.load_many(running, self)
+
+        tr = self.redis.pipeline()
+        statuses = [
+            (status.value, tr.zcard(self.status_key(status.value)))
+            for status in CrawlStatus
+        ]
+        results = [
+            (crawl.crawl_id, crawl.queue_counts(tr)) for crawl in crawls if crawl.model
+        ]
+        await tr.execute()
+
+        self.metrics.crawl_counts = {
+            status: count.result() for status, count in statuses
+        }
+        self.metrics.crawl_sizes = {crawl_id: result() for crawl_id, result in results}
+        self.metrics.sample_time = time.time()
+
+    async def metrics_loop(self) -> None:
+        """Runs sample_metrics every metrics_interval seconds"""
+        while True:
+            try:
+                await self.sample_metrics()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.metrics_interval)
+
+    def render_metrics(self) -> str:
+        """Returns the api metrics in the prometheus text format: the
+        latency of api requests, redis commands and shepherd requests,
+        the state of the crawl info cache and the last sampled crawl gauges
+
+        :return: The metrics
+        """
+        metrics = self.metrics
+        lines = format_histogram(
+            'browsertrix_http_request_duration_seconds',
+            'Latency of api requests, until the response starts',
+            sorted(metrics.request_latency.items()),
+        )
+        lines += format_histogram(
+            'browsertrix_redis_command_duration_seconds',
+            'Latency of redis commands, pipelines and transactions',
+            sorted(metrics.redis_latency.items()),
+        )
+
+        if self.shepherd:
+            lines += format_histogram(
+                'browsertrix_shepherd_request_duration_seconds',
+                'Latency of shepherd api requests, including failed attempts',
+                [
+                    ((('endpoint', endpoint),), histogram)
+                    for endpoint, histogram in sorted(self.shepherd.latencies.items())
+                ],
+            )
+            state = self.shepherd.breaker.state
+            lines += format_gauge(
+                'browsertrix_shepherd_circuit_state',
+                'State of the shepherd circuit breaker',
+                [
+                    ((('state', name),), int(name == state))
+                    for name in ('closed', 'open', 'half-open')
+                ],
+            )
+
+        if self.crawl_cache:
+            lines += format_gauge(
+                'browsertrix_crawl_cache_hits_total',
+                'Crawl info cache hits',
+                [((), self.crawl_cache.hits)],
+                'counter',
+            )
+            lines += format_gauge(
+                'browsertrix_crawl_cache_misses_total',
+                'Crawl info cache misses',
+                [((), self.crawl_cache.misses)],
+                'counter',
+            )
+
+        lines += format_gauge(
+            'browsertrix_metrics_sample_timestamp_seconds',
+            'Time of the last sample of the crawl gauges',
+            [((), metrics.sample_time)],
+        )
+        lines += format_gauge(
+            'browsertrix_crawls',
+            'Number of crawls by status',
+            [
+                ((('status', status),), count)
+                for status, count in sorted(metrics.crawl_counts.items())
+            ],
+        )
+
+        for field, help_ in (
+            ('num_queue', 'Number of queued urls of each running crawl'),
+            ('num_pending', 'Number of pending urls of each running crawl'),
+            ('num_seen', 'Number of seen urls of each running crawl'),
+            ('num_failed', 'Number of failed urls of each running crawl'),
+        ):
+            lines += format_gauge(
+                f'browsertrix_crawl_{field[4:]}_urls',
+                help_,
+                [
+                    ((('crawl_id', crawl_id),), sizes[field])
+                    for crawl_id, sizes in sorted(metrics.crawl_sizes.items())
+                ],
+            )
+
+        return '\n'.join(lines) + '\n'
+
+    def init_flock_pools(self) -> None:
+        """Creates the headful and headless warm flock pools for the
+        pool browser, if flock_pool_size is set
+        """
+        self.flock_pools = {}
+        if self.flock_pool_size <= 0:
+            return
+
+        environ = self.container_environ.copy()
+        # set per crawl, when a flock is claimed
+        environ.pop('SCREENSHOT_API_URL', '')
+        environ.pop('EXTRACTED_RAW_DOM_API_URL', '')
+
+        for headless in (False, True):
+            opts = self.flock_opts(
+                self.flock_pool_browser,
+                headless,
+                self.flock_pool_user_params.copy(),
+                environ.copy(),
+            )
+            # started with the crawl environ once the flock is claimed
+            opts['deferred']['autobrowser'] = True
+            name = self.flock_pool_browser + (':headless' if headless else '')
+            self.flock_pools[headless] = FlockPool(
+                name, opts, self.flock_pool_size, self.flock_pool_max_idle
+            )
+
+    def flock_pool_for(
+        self, browser: str, headless: bool, user_params: Dict
+    ) -> Optional[FlockPool]:
+        """Returns the warm flock pool matching the supplied browser,
+        display mode and user params, if any
+
+        :param browser: The browser image of the crawl
+        :param headless: T/F indicating if the crawl is headless
+        :param user_params: The collection, mode and cache user params
+        of the crawl
+        :return: The flock pool or None
+        """
+        if browser != self.flock_pool_browser:
+            return None
+        if user_params != self.flock_pool_user_params:
+            return None
+        return self.flock_pools.get(headless)
+
+    def flock_opts(
+        self, browser: str, headless: bool, user_params: Dict, environ: Dict
+    ) -> Dict:
+        """Returns the options used to request a flock
+
+        :param browser: The browser image
+        :param headless: T/F indicating if the browser should be headless
+        :param user_params: The user params of the flock
+        :param environ: The environ of the flock containers
+        :return: The flock request options
+        """
+        deferred = {'autobrowser': False}
+        if headless:
+            environ['DISPLAY'] = ''
+            deferred['xserver'] = True
+
+        return dict(
+            overrides={
+                'browser': 'oldwebtoday/' + browser,
+                'xserver': 'oldwebtoday/vnc-webrtc-audio',
+            },
+            deferred=deferred,
+            user_params=user_params,
+            environ=environ,
+        )
+
+    async def refill_flock_pools(self) -> int:
+        """Removes the idle flocks from, and then refills, each warm flock
+        pool. The pools are only refilled within the browser budget, if
+        any, and not while crawls are queued for it. A lock key makes
+        sure that only one api worker refills the pools at a time
+
+        :return: The number of flocks added
+        """
+        token = await self.acquire_lock(
+            self.flock_pool_lock_key, self.flock_pool_lock_timeout
+        )
+        if not token:
+            return 0
+
+        try:
+            added = 0
+            for pool in self.flock_pools.values():
+                await pool.expire(
+                    self.redis, self.remove_flock, self.shepherd_concurrency
+                )
+                added += await pool.refill(
+                    self.redis,
+                    self.request_flock,
+                    self.start_flock,
+                    self.remove_flock,
+                    self.shepherd_concurrency,
+                    await self.flock_pool_room(),
+                )
+            return added
+        finally:
+            await self.release_lock(self.flock_pool_lock_key, token)
+
+    async def flock_pool_room(self) -> Optional[int]:
+        """Returns the number of flocks that may be added to the warm
+        flock pools within the browser budget
+
+        :return: The number of flocks or None if there is no budget
+        """
+        if self.browser_budget <= 0:
+            return None
+
+        if await self.redis.zcard(self.admission_key):
+            return 0
+
+        return self.browser_budget - await self.browsers_in_use()
+
+    async def shrink_flock_pools(self, num: int) -> int:
+        """Removes up to num flocks from the warm flock pools
+
+        :param num: The number of flocks to remove
+        :return: The number of flocks removed
+        """
+        removed = 0
+        for pool in self.flock_pools.values():
+            if removed >= num:
+                break
+            removed += await pool.shrink(
+                self.redis, self.remove_flock, self.shepherd_concurrency, num - removed
+            )
+        return removed
+
+    async def flock_pool_loop(self) -> None:
+        """Runs refill_flock_pools every flock_pool_interval seconds"""
+        while True:
+            try:
+                await self.refill_flock_pools()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.flock_pool_interval)
+
+    async def autoscale_crawls(self) -> int:
+        """Adds or removes browsers of each running autoscaled crawl,
+        based on its queue and page completion rate (see Crawl.autoscale)
+
+        :return: The total number of browsers added (or removed, if negative)
+        """
+        total = 0
+        crawl_ids = await self.redis.smembers(self.autoscaled_key)
+
+        free = None
+        if crawl_ids and self.browser_budget > 0:
+            free = self.browser_budget - await self.browsers_in_use()
+
+        for crawl_id in crawl_ids:
+            crawl = await Crawl.load(crawl_id, self)
+            if not crawl.model or crawl.model.status != 'running':
+                await self.redis.srem(self.autoscaled_key, crawl_id)
+                self.autoscale_samples.pop(crawl_id, None)
+                continue
+
+            added = await crawl.autoscale(free)
+            if free is not None:
+                free -= added
+            total += added
+
+        for crawl_id in set(self.autoscale_samples) - set(crawl_ids):
+            self.autoscale_samples.pop(crawl_id)
+
+        return total
+
+    async def autoscale_loop(self) -> None:
+        """Runs autoscale_crawls every autoscale_interval seconds"""
+        while True:
+            try:
+                await self.autoscale_crawls()
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.autoscale_interval)
 
     async def request_flock(self, opts: Dict) -> Dict:
         """Requests a flock from shepherd using the supplied options
@@ -256,14 +1466,32 @@ class CrawlManager:
 
     async def start_flock(self, reqid: str) -> Dict:
         """Requests that shepherd start the flock identified by the
-        supplied request id
+        supplied request id. The user params are those the flock was
+        requested with
 
         :param reqid: The request id of the flock to be started
         :return: The response from shepherd
         """
-        response = await self.do_request(
-            f'/flock/start/{reqid}', {'environ': {'REQ_ID': reqid}}
-        )
+        data = {'environ': {'REQ_ID': reqid}}
+
+        response = await self.do_request(f'/flock/start/{reqid}', data)
+        return response
+
+    async def start_deferred(
+        self, reqid: str, name: str, environ: Optional[Dict] = None
+    ) -> Dict:
+        """Requests that shepherd start the supplied deferred container
+        of the running flock identified by the supplied request id
+
+        :param reqid: The request id of the flock
+        :param name: The name of the deferred container (eg. autobrowser)
+        :param environ: Optional environ added to the container (eg. the
+        crawl environ of a flock claimed from a warm pool)
+        :return: The response from shepherd
+        """
+        data = {'environ': dict(environ or {}, REQ_ID=reqid)}
+
+        response = await self.do_request(f'/flock/start_deferred/{reqid}/{name}', data)
         return response
 
     async def stop_flock(self, reqid: str) -> Dict:
@@ -295,6 +1523,7 @@ class Crawl:
 
     __slots__ = [
         'crawl_id',
+        'key_id',
         'manager',
         'model',
         'browser_key',
@@ -304,6 +1533,9 @@ class Crawl:
         'scopes_key',
         'seen_key',
         'tabs_done_key',
+        'flock_opts_key',
+        'pending_lease_key',
+        'failed_key',
     ]
 
     @classmethod
@@ -316,169 +1548,868 @@ class Crawl:
         :param crawl_request: The crawl creation request
         :return: A dictionary containing information about the results of this operation
         """
-        crawl_id = manager.new_crawl_id()
-        crawl = cls(crawl_id, manager)
-        return await crawl.init_crawl(crawl_request)
+        crawl_id = manager.new_crawl_id()
+        crawl = cls(crawl_id, manager)
+        return await crawl.init_crawl(crawl_request)
+
+    @classmethod
+    async def load(cls, crawl_id: str, manager: CrawlManager) -> Crawl:
+        """Loads the supplied crawl_id's info, if it exists, and
+        returns an instance of Crawl
+
+        :param crawl_id: The id of the crawl to be loaded
+        :param manager: The CrawlManager instance to be used
+        :return: The created instance of Crawl
+        """
+        crawl = cls(crawl_id, manager)
+        crawl.load_model(await manager.redis.hgetall(crawl.info_key))
+        return crawl
+
+    @classmethod
+    async def load_many(
+        cls, crawl_ids: List[str], manager: CrawlManager
+    ) -> List[Crawl]:
+        """Loads the info of the supplied crawl ids, with one pipeline,
+        and returns a Crawl for each (without a model if it does not exist)
+
+        :param crawl_ids: The ids of the crawls to be loaded
+        :param manager: The CrawlManager instance to be used
+        :return: The list of created Crawl instances
+        """
+        crawls = [cls(crawl_id, manager) for crawl_id in crawl_ids]
+
+        tr = manager.redis.pipeline()
+        infos = [tr.hgetall(crawl.info_key) for crawl in crawls]
+        await tr.execute()
+
+        for crawl, info in zip(crawls, infos):
+            crawl.load_model(info.result())
+        return crawls
+
+    def __init__(
+        self,
+        crawl_id: str,
+        manager: CrawlManager,
+        model: Optional[CrawlInfo] = None,
+        hash_tag: Optional[bool] = None,
+    ) -> None:
+        """Create a new crawl object
+
+        :param crawl_id: The id of the crawl
+        :param manager: The crawl manager instance
+        :param model: The crawl info model, if already loaded
+        :param hash_tag: Use the hash tagged key layout, defaults to
+        the key layout of the crawl manager
+        """
+        self.manager: CrawlManager = manager
+        self.crawl_id: str = crawl_id
+        self.key_id: str = manager.crawl_key_id(crawl_id, hash_tag)
+
+        key_prefix = self.key_prefix
+        self.info_key: str = f'{key_prefix}info'
+
+        self.frontier_q_key: str = f'{key_prefix}q'
+        self.pending_q_key: str = f'{key_prefix}qp'
+        self.pending_lease_key: str = f'{key_prefix}qp:lease'
+        self.failed_key: str = f'{key_prefix}failed'
+
+        self.seen_key: str = f'{key_prefix}seen'
+        self.scopes_key: str = f'{key_prefix}scope'
+
+        self.browser_key: str = f'{key_prefix}br'
+        self.tabs_done_key: str = f'{key_prefix}br:done'
+        self.flock_opts_key: str = f'{key_prefix}flock_opts'
+
+        self.model: Optional[CrawlInfo] = model
+
+    def load_model(self, info: Dict) -> None:
+        """Sets this crawls model from the contents of its info key, if any
+
+        :param info: The contents of the info key
+        """
+        if info:
+            if 'browser_overrides' in info:
+                info['browser_overrides'] = json.loads(info['browser_overrides'])
+            self.model = CrawlInfo.parse_obj(info)
+
+    @property
+    def key_prefix(self) -> str:
+        """The prefix of the redis keys of this crawl, a:<key id>:"""
+        return f'a:{self.key_id}:'
+
+    @property
+    def frontier(self) -> Frontier:
+        """Retrieve the frontier implementation for this crawls frontier mode
+
+        :return: The frontier of this crawl
+        """
+        return frontier_for(self.frontier_q_key, self.model)
+
+    @property
+    def host_scheduler(self) -> Optional[HostScheduler]:
+        """Retrieve the per-host scheduler of this crawl, if it uses one
+
+        :return: The host scheduler or None
+        """
+        if not self.model or self.model.host_concurrency <= 0:
+            return None
+
+        return HostScheduler(
+            self.key_prefix,
+            self.frontier,
+            self.pending_q_key,
+            self.model.host_concurrency,
+            self.model.host_delay,
+            self.model.num_browsers * self.model.num_tabs,
+        )
+
+    @property
+    def seen(self) -> UrlSeenSet:
+        """Retrieve the seen set implementation for this crawls seen mode
+
+        :return: The seen set of this crawl
+        """
+        return seen_set_for(self.seen_key, self.model)
+
+    @property
+    def redis(self) -> Redis:
+        """Retrieve the redis instance of the crawl manager
+
+        :return: The redis instance of the crawl manager
+        """
+        return self.manager.redis
+
+    @property
+    def loop(self) -> AbstractEventLoop:
+        """Retrieve the running event loop
+
+        :return: The running event loop
+        """
+        return self.manager.loop
+
+    async def delete(self) -> Dict[str, bool]:
+        """Delete this crawl
+
+        :return: An dictionary indicating if this operation
+        was successful
+        """
+        await self.stop(remove=True)
+        await self.unregister()
+
+        keys = await self.state_keys()
+        await self.manager.delete_keys([self.info_key, self.pending_lease_key] + keys)
+        await self.manager.invalidate_crawl(self.crawl_id)
+
+        return {'success': True}
+
+    async def migrate_keys(self) -> Crawl:
+        """Renames the keys of this crawl to the hash tagged key layout.
+        The info key is renamed last, so that an interrupted migration
+        is completed by migrating the crawl again
+
+        :return: The crawl, with the hash tagged key layout
+        """
+        migrated = Crawl(self.crawl_id, self.manager, self.model, hash_tag=True)
+        keys = await self.state_keys()
+        keys += [self.pending_lease_key, self.info_key]
+
+        tr = self.redis.pipeline()
+        exists = [tr.exists(key) for key in keys]
+        await tr.execute()
+
+        prefix_len = len(self.key_prefix)
+        tr = self.redis.pipeline()
+        for key, exist in zip(keys, exists):
+            if exist.result():
+                tr.rename(key, migrated.key_prefix + key[prefix_len:])
+        await tr.execute()
+
+        # crawls of the plain layout are not indexed with hash tags enabled
+        if (
+            await self.redis.zscore(self.manager.crawls_index_key, self.crawl_id)
+            is None
+        ):
+            await migrated.register(self.model.start_time or time.time())
+
+        await self.manager.invalidate_crawl(self.crawl_id)
+        return migrated
+
+    async def state_keys(self) -> List[str]:
+        """Returns the redis keys holding the state of this crawl,
+        other than its info key. The pending set comes last
+
+        :return: The list of keys
+        """
+        keys = list(self.frontier.keys)
+        if self.host_scheduler:
+            keys.extend(await self.host_scheduler.keys(self.redis))
+
+        keys.extend(self.seen.keys)
+        keys.extend(
+            [
+                self.scopes_key,
+                self.browser_key,
+                self.tabs_done_key,
+                self.flock_opts_key,
+                self.failed_key,
+                self.pending_q_key,
+            ]
+        )
+        return keys
+
+    async def checkpoint(self, path: str) -> int:
+        """Writes a checkpoint of this crawl to the supplied path.
+
+        The checkpoint is a gzip compressed NDJSON file: a header with
+        the crawl info, followed by the contents of each key of the
+        crawl, read in chunks of queue_chunk_size items. As the keys are
+        read one chunk at a time, the checkpoint of a running crawl is
+        not a point in time snapshot: stop the crawl first for that
+
+        :param path: The path of the checkpoint file
+        :return: The size of the checkpoint file in bytes
+        """
+        prefix = self.key_prefix
+        chunk_size = self.manager.queue_chunk_size
+
+        async def records() -> AsyncIterator[Dict]:
+            yield {
+                'version': CHECKPOINT_VERSION,
+                'id': self.crawl_id,
+                'time': int(time.time()),
+                'info': await self.redis.hgetall(self.info_key),
+            }
+            for key in await self.state_keys():
+                async for record in dump_key(
+                    self.redis, key, key[len(prefix) :], chunk_size
+                ):
+                    yield record
+
+        return await write_checkpoint(path, records(), self.loop)
+
+    @classmethod
+    async def restore(cls, manager: CrawlManager, path: str) -> Dict:
+        """Restores a crawl, under its original id, from the checkpoint
+        at the supplied path.
+
+        The keys are first written to temporary keys (a:{id}:restore:...)
+        and then renamed, with the crawl info, in a single transaction,
+        so that a failed restore leaves no partial crawl. The urls that
+        were pending when the checkpoint was made are queued again. The
+        browsers of the checkpoint no longer exist: new browsers are
+        requested when the crawl is started. A crawl that was running
+        is restored as stopped, until it is started again
+
+        :param manager: The CrawlManager instance to be used
+        :param path: The path of the checkpoint file
+        :return: A dictionary containing information about the results of this operation
+        """
+        records = read_checkpoint(path, manager.loop)
+        try:
+            header = await records.__anext__()
+        except (StopAsyncIteration, OSError, ValueError):
+            raise HTTPException(400, detail='invalid checkpoint')
+
+        if header.get('version') != CHECKPOINT_VERSION:
+            await records.aclose()
+            raise HTTPException(400, detail='unsupported checkpoint version')
+
+        crawl = cls(header['id'], manager)
+        if await manager.redis.exists(crawl.info_key):
+            await records.aclose()
+            raise HTTPException(400, detail='crawl already exists')
+
+        info = header['info']
+        if info.get('status') == CrawlStatus.RUNNING:
+            info['status'] = CrawlStatus.STOPPED.value
+        crawl.load_model(dict(info))
+
+        prefix = crawl.key_prefix
+        staging_prefix = f'{prefix}restore:'
+        dropped = (crawl.browser_key, crawl.tabs_done_key)
+
+        staged: List[str] = []
+        pending: List[str] = []
+        try:
+            async for record in records:
+                key = prefix + record['key']
+                if key in dropped:
+                    continue
+
+                if key == crawl.pending_q_key:
+                    pending.extend(record['data'])
+                    continue
+
+                staging_key = staging_prefix + record['key']
+                tr = manager.redis.multi_exec()
+                # remove the leftovers of an earlier failed restore
+                if not staged or staged[-1] != record['key']:
+                    staged.append(record['key'])
+                    tr.delete(staging_key)
+                restore_record(tr, staging_key, record)
+                await tr.execute()
+
+        except BaseException as e:
+            if staged:
+                await manager.redis.delete(*(staging_prefix + key for key in staged))
+            if isinstance(e, (EOFError, OSError, ValueError)):
+                raise HTTPException(400, detail='invalid checkpoint')
+            raise
+
+        tr = manager.redis.multi_exec()
+        for key in staged:
+            tr.rename(staging_prefix + key, prefix + key)
+
+        entries = []
+        for url_req in pending:
+            depth = url_request(url_req).get('depth', 0)
+            entries.append((url_req, depth, 0))
+        if entries:
+            (crawl.host_scheduler or crawl.frontier).push(tr, entries)
+
+        tr.hmset_dict(crawl.info_key, info)
+        await tr.execute()
+
+        await manager.invalidate_crawl(crawl.crawl_id)
+        await crawl.register(crawl.model.start_time or None)
+
+        return {
+            'success': True,
+            'id': crawl.crawl_id,
+            'status': crawl.model.status,
+            'browsers': [],
+        }
+
+    async def _init_domain_scopes(self, urls: List[str]) -> None:
+        """Initializes this crawls domain scopes
+
+        :param urls: A list of URLs that define this crawls domain scope
+        """
+        scopes = {json.dumps({'domain': extract_domain(url)}) for url in urls}
+        if scopes:
+            await self.redis.sadd(self.scopes_key, *scopes)
+
+    async def scope_engine(self) -> ScopeEngine:
+        """Returns this crawls compiled scope rules
+
+        :return: The scope engine
+        :raises ValueError: If a scope rule is invalid
+        """
+        scopes = await self.redis.smembers(self.scopes_key)
+        return compile_scopes(frozenset(scopes))
+
+    async def queue_urls(
+        self, urls: Sequence[Union[QueueUrl, str]], depth: int = 0
+    ) -> Dict[str, Union[bool, int]]:
+        """Adds the supplied list of URLs to this crawls queue, skipping
+        any URL that is out of scope or already in the seen set.
+
+        The seeds (URLs at depth 0) of a same-domain crawl add their
+        domains to its scope. The URLs are then checked against the
+        scope rules (see ScopeEngine) and processed in chunks: each chunk
+        is checked against (and added to) the seen set and its new URLs
+        pushed to the frontier by a single Lua script
+
+        :param urls: The list of URLs to be queued, either plain URLs
+        or QueueUrls with a per-URL depth and priority
+        :param depth: The depth of URLs supplied as plain strings
+        :return: An dictionary indicating if this operation
+        was successful and the number of new, duplicate and out of
+        scope URLs
+        """
+        num_added = 0
+        num_dupes = 0
+
+        entries = [
+            (url, depth, 0)
+            if isinstance(url, str)
+            else (url.url, url.depth, url.priority)
+            for url in urls
+        ]
+
+        if self.model.crawl_type == CrawlType.SAME_DOMAIN:
+            await self._init_domain_scopes(
+                [url for url, url_depth, _ in entries if url_depth == 0]
+            )
+
+        num_rejected = len(entries)
+        if self.manager.scope_filter:
+            try:
+                entries = (await self.scope_engine()).filter(entries)
+            except ValueError as e:
+                logger.warning(f'Crawl {self.crawl_id}: scope not checked, {e}')
+        num_rejected -= len(entries)
+
+        for chunk in chunked(entries, self.manager.queue_chunk_size):
+            added = await self._queue_chunk(chunk)
+            num_added += len(added)
+            num_dupes += len(chunk) - len(added)
+
+        return {
+            'success': True,
+            'num_added': num_added,
+            'num_dupes': num_dupes,
+            'num_rejected': num_rejected,
+        }
+
+    async def test_scope(self, urls: List[Union[QueueUrl, str]]) -> Dict:
+        """Checks the supplied list of URLs against this crawls scope
+
+        :param urls: The list of URLs to be checked, either plain URLs
+        (at depth 0) or QueueUrls
+        :return: A dictionary with the result of each URL: if it is in
+        scope and otherwise the reason it is not (depth, excluded or
+        not-included)
+        """
+        try:
+            engine = await self.scope_engine()
+        except ValueError as e:
+            raise HTTPException(400, detail=str(e))
+
+        results = []
+        for url in urls:
+            url, depth = (url, 0) if isinstance(url, str) else (url.url, url.depth)
+            reason = engine.check(url, depth)
+            results.append(
+                {'url': url, 'depth': depth, 'in_scope': not reason, 'reason': reason}
+            )
+
+        return {'results': results}
+
+    async def _queue_chunk(self, chunk: List[Tuple[str, int, int]]) -> List[str]:
+        """Adds one chunk of (url, depth, priority) entries to the seen set
+        and pushes those not seen before to the frontier (or the host
+        scheduler), atomically with a single Lua script (see
+        scripts.QUEUE_URLS)
+
+        :param chunk: The (url, depth, priority) entries to be queued
+        :return: The list of URLs that were queued
+        """
+        keys, args = self.queue_script_args(chunk)
+        is_new = await self.redis.eval(QUEUE_URLS, keys=keys, args=args)
+        return [url for (url, _, _), new in zip(chunk, is_new) if new]
+
+    def queue_script_args(
+        self, chunk: List[Tuple[str, int, int]]
+    ) -> Tuple[List[str], List]:
+        """Returns the queue urls script (see scripts.QUEUE_URLS) keys and
+        arguments queuing one chunk of (url, depth, priority) entries
+
+        :param chunk: The (url, depth, priority) entries to be queued
+        :return: The script keys and arguments
+        """
+        seen = self.seen
+        target = self.host_scheduler or self.frontier
+        now = time.time()
+
+        entries: List[FrontierEntry] = [
+            (json.dumps({'url': url, 'depth': depth}), depth, priority)
+            for url, depth, priority in chunk
+        ]
+        push_keys, push_args = target.script_push(entries, now)
+
+        seen_args = [seen.script_args(url) for url, _, _ in chunk]
+        args = [
+            seen.script_mode,
+            target.script_mode,
+            now,
+            len(seen_args[0]),
+            len(push_args[0]),
+        ]
+        for entry_seen_args, entry_push_args in zip(seen_args, push_args):
+            args.extend(entry_seen_args)
+            args.extend(entry_push_args)
+
+        return seen.script_keys + push_keys, args
 
-    @classmethod
-    async def load(cls, crawl_id: str, manager: CrawlManager) -> Crawl:
-        """Loads the supplied crawl_id's info, if it exists, and
-        returns an instance of Crawl
+    async def get_info(self, count_urls=True) -> Dict:
+        """Returns this crawls information
 
-        :param crawl_id: The id of the crawl to be loaded
-        :param manager: The CrawlManager instance to be used
-        :return: The created instance of Crawl
+        :param count_urls: If true, include count of frontier queue, pending set, seen set
+        :return: The crawl information
         """
-        crawl = cls(crawl_id, manager)
-        info = await manager.redis.hgetall(crawl.info_key)
-        if info:
-            if 'browser_overrides' in info:
-                info['browser_overrides'] = json.loads(info['browser_overrides'])
-            crawl.model = CrawlInfo.parse_obj(info)
-        return crawl
+        tr = self.redis.pipeline()
+        result = self.queue_info(tr, count_urls)
+        await tr.execute()
 
-    def __init__(
-        self, crawl_id: str, manager: CrawlManager, model: Optional[CrawlInfo] = None
-    ) -> None:
-        """Create a new crawl object
+        return await self.update_done(result())
 
-        :param crawl_id: The id of the crawl
-        :param manager: The crawl manager instance
+    def queue_info(self, tr, count_urls=True) -> Callable[[], Dict]:
+        """Queues the commands reading this crawls information on the
+        supplied pipeline
+
+        :param tr: The redis pipeline
+        :param count_urls: If true, include count of frontier queue, pending set, seen set
+        :return: A callable, valid once the pipeline has been executed,
+        that returns the crawl information
         """
-        self.manager: CrawlManager = manager
-        self.crawl_id: str = crawl_id
+        info = tr.hgetall(self.info_key)
+        browsers = tr.smembers(self.browser_key)
+        tabs_done = tr.lrange(self.tabs_done_key, 0, -1)
 
-        self.info_key: str = f'a:{crawl_id}:info'
+        # do a count of the url keys
+        if count_urls:
+            counts = self.queue_counts(tr)
 
-        self.frontier_q_key: str = f'a:{crawl_id}:q'
-        self.pending_q_key: str = f'a:{crawl_id}:qp'
+        def result() -> Dict:
+            data: Dict = info.result()
+            if 'browser_overrides' in data:
+                data['browser_overrides'] = json.loads(data['browser_overrides'])
 
-        self.seen_key: str = f'a:{crawl_id}:seen'
-        self.scopes_key: str = f'a:{crawl_id}:scope'
+            data['browsers'] = list(browsers.result())
+            data['tabs_done'] = [json.loads(elem) for elem in tabs_done.result()]
 
-        self.browser_key: str = f'a:{crawl_id}:br'
-        self.tabs_done_key: str = f'a:{crawl_id}:br:done'
+            if count_urls:
+                data.update(counts())
 
-        self.model: Optional[CrawlInfo] = model
+            return data
 
-    @property
-    def redis(self) -> Redis:
-        """Retrieve the redis instance of the crawl manager
+        return result
 
-        :return: The redis instance of the crawl manager
+    def queue_counts(self, tr) -> Callable[[], Dict[str, int]]:
+        """Queues the commands counting the urls of this crawls frontier
+        queue, pending set, seen set and failed set on the supplied pipeline
+
+        :param tr: The redis pipeline
+        :return: A callable, valid once the pipeline has been executed,
+        that returns num_queue, num_pending, num_seen and num_failed
         """
-        return self.manager.redis
+        counts = [
+            self.frontier.queue_count(tr),
+            tr.scard(self.pending_q_key).result,
+            self.seen.queue_count(tr),
+            tr.scard(self.failed_key).result,
+        ]
+        if self.host_scheduler:
+            counts.append(self.host_scheduler.queue_count(tr))
+
+        def result() -> Dict[str, int]:
+            num_queue, num_pending, num_seen, num_failed, *num_host_queue = (
+                count() for count in counts
+            )
+            return {
+                'num_queue': num_queue + sum(num_host_queue),
+                'num_pending': num_pending,
+                'num_seen': num_seen,
+                'num_failed': num_failed,
+            }
 
-    @property
-    def loop(self) -> AbstractEventLoop:
-        """Retrieve the running event loop
+        return result
 
-        :return: The running event loop
+    async def update_done(self, data: Dict) -> Dict:
+        """Marks this crawl as done if the supplied crawl information
+        shows that all of its tabs are done
+
+        :param data: The crawl information, as returned by get_info
+        :return: The, possibly updated, crawl information
         """
-        return self.manager.loop
+        tabs_done = data.get('tabs_done', [])
+        num_host_queue = 0
+        if self.host_scheduler:
+            num_host_queue = await self.host_scheduler.count(self.redis)
+
+        update = self._done_update(
+            data.get('status'),
+            len(tabs_done),
+            tabs_done[0] if tabs_done else None,
+            num_host_queue,
+        )
+        if update:
+            try:
+                await self.finish(update['finish_time'])
+                data.update(update)
+            except Exception as e:
+                logger.exception(str(e))
 
-    async def delete(self) -> Dict[str, bool]:
-        """Delete this crawl
+        return data
 
-        :return: An dictionary indicating if this operation
-        was successful
+    def queue_done_update(self, tr) -> Callable[[], Optional[Dict]]:
+        """Queues the commands checking if all of this crawls tabs are
+        done on the supplied pipeline
+
+        :param tr: The redis pipeline
+        :return: A callable, valid once the pipeline has been executed,
+        that returns the update marking this crawl as done or None
         """
-        await self.stop(remove=True)
+        status = self.model.status
+        num_done = tr.llen(self.tabs_done_key)
+        first_done = tr.lindex(self.tabs_done_key, 0)
+        num_host_queue = None
+        if self.host_scheduler:
+            num_host_queue = self.host_scheduler.queue_count(tr)
+
+        def result() -> Optional[Dict]:
+            first = first_done.result()
+            return self._done_update(
+                status,
+                num_done.result(),
+                json.loads(first) if first else None,
+                num_host_queue() if num_host_queue else 0,
+            )
 
-        await self.redis.delete(self.info_key)
+        return result
+
+    def _done_update(
+        self,
+        status: Optional[str],
+        num_done: int,
+        first_done: Optional[Dict],
+        num_host_queue: int = 0,
+    ) -> Optional[Dict]:
+        """Returns the update marking this crawl as done, if it is running,
+        all of its tabs are done and no urls wait in its host sub-queues
+
+        :param status: The current status of the crawl
+        :param num_done: The number of done tabs
+        :param first_done: The first done tab, if any
+        :param num_host_queue: The number of urls in the host sub-queues
+        :return: The update or None
+        """
+        # if not running, won't be done
+        if status != CrawlStatus.RUNNING:
+            return None
 
-        await self.redis.delete(self.frontier_q_key)
-        await self.redis.delete(self.pending_q_key)
+        # if not all browsers are done, not done
+        if self.model.num_tabs * self.model.num_browsers != num_done:
+            return None
 
-        await self.redis.delete(self.seen_key)
-        await self.redis.delete(self.scopes_key)
+        # urls still held back by the host scheduler, not done
+        if num_host_queue > 0:
+            return None
 
-        await self.redis.delete(self.browser_key)
-        await self.redis.delete(self.tabs_done_key)
+        finish_time = int(first_done['time']) if first_done else 0
+        return {'status': CrawlStatus.DONE.value, 'finish_time': finish_time}
 
-        return {'success': True}
+    async def finish(self, finish_time: int) -> None:
+        """Marks this crawl as done and stops its flocks, freeing
+        their browsers
 
-    async def _init_domain_scopes(self, urls: List[str]) -> None:
-        """Initializes this crawls domain scopes
+        :param finish_time: The time the last tab finished
+        """
+        await self.set_status(CrawlStatus.DONE.value, finish_time=finish_time)
 
-        :param urls: A list of URLs that define this crawls domain scope
+        browsers = list(await self.redis.smembers(self.browser_key))
+        _, errors = await self.flock_op(self.manager.stop_flock, browsers)
+        for error in errors:
+            logger.warning(f'Error stopping flock {error["reqid"]}: {error["error"]}')
+
+    async def autoscale(self, max_added: Optional[int] = None) -> int:
+        """Adds browsers to, or removes idle browsers from, this crawl,
+        between its min_browsers and max_browsers, based on the number
+        of queued and pending urls and the page completion rate since
+        the previous call (see desired_browsers).
+
+        Only browsers whose tabs are all done are removed, along with
+        their done tabs, so that the number of done tabs expected by
+        is_done stays num_tabs * num_browsers
+
+        :param max_added: The maximum number of browsers to add, if limited
+        (eg. by the browser budget)
+        :return: The number of browsers added (or removed, if negative)
         """
+        tr = self.redis.pipeline()
+        result = self.queue_info(tr)
+        await tr.execute()
+        data = result()
+
+        browsers = data['browsers']
+        num_browsers = len(browsers)
+
+        now = time.time()
+        completed = max(data['num_seen'] - data['num_queue'] - data['num_pending'], 0)
+        sample = self.manager.autoscale_samples.get(self.crawl_id)
+        self.manager.autoscale_samples[self.crawl_id] = (now, completed)
+        rate = None
+        if sample and now > sample[0]:
+            rate = (completed - sample[1]) / (now - sample[0])
+
+        desired = desired_browsers(
+            num_browsers,
+            self.model.num_tabs,
+            self.model.min_browsers,
+            self.model.max_browsers,
+            data['num_queue'],
+            data['num_pending'],
+            rate,
+            self.manager.autoscale_urls_per_tab,
+            self.manager.autoscale_drain_time,
+            self.manager.autoscale_step,
+        )
 
-        for url in urls:
-            await self.redis.sadd(
-                self.scopes_key, json.dumps({'domain': extract_domain(url)})
-            )
+        if desired > num_browsers:
+            num = desired - num_browsers
+            if max_added is not None:
+                num = min(num, max_added)
+            return await self._add_browsers(num) if num > 0 else 0
 
-    async def queue_urls(self, urls: List[str]) -> Dict[str, bool]:
-        """Adds the supplied list of URLs to this crawls queue
+        if desired < num_browsers:
+            idle = idle_browsers(browsers, data['tabs_done'], self.model.num_tabs)
+            return -await self._remove_browsers(idle[: num_browsers - desired])
 
-        :param urls: The list of URLs to be queued
-        :return: An dictionary indicating if this operation
-        was successful
+        return 0
+
+    async def _add_browsers(self, num: int) -> int:
+        """Requests and starts num more browsers for this crawl
+
+        :param num: The number of browsers to add
+        :return: The number of browsers added
         """
-        if len(urls) == 0:
-            return {'success': True}
+        opts = await self.redis.get(self.flock_opts_key)
+        if not opts:
+            return 0
+
+        opts = json.loads(opts)
+        results = await gather_limited(
+            lambda _: self._init_browser(opts, True),
+            range(num),
+            self.manager.shepherd_concurrency,
+        )
+        added, errors = self._flock_results([None] * len(results), results)
+        for error in errors:
+            logger.warning(f'Error adding browser to crawl {self.crawl_id}: {error}')
 
-        for url in urls:
-            url_req = {'url': url, 'depth': 0}
-            await self.redis.rpush(self.frontier_q_key, json.dumps(url_req))
+        if added:
+            tr = self.redis.multi_exec()
+            tr.sadd(self.browser_key, *added)
+            tr.hincrby(self.info_key, 'num_browsers', len(added))
+            await tr.execute()
+            await self.manager.invalidate_crawl(self.crawl_id)
 
-            # add to seen list to avoid dupes
-            await self.redis.sadd(self.seen_key, url)
+        return len(added)
 
-        if self.model.crawl_type == CrawlType.SAME_DOMAIN:
-            await self._init_domain_scopes(urls)
+    async def _remove_browsers(self, reqids: List[str]) -> int:
+        """Removes the supplied idle browsers, and their done tabs, from this crawl
 
-        return {'success': True}
+        :param reqids: The request ids of the browsers to remove
+        :return: The number of browsers removed
+        """
+        if not reqids:
+            return 0
 
-    async def get_info(self, count_urls=True) -> Dict:
-        """Returns this crawls information
+        tabs_done = await self.redis.lrange(self.tabs_done_key, 0, -1)
 
-        :param count_urls: If true, include count of frontier queue, pending set, seen set
-        :return: The crawl information
+        tr = self.redis.multi_exec()
+        tr.srem(self.browser_key, *reqids)
+        for tab_done in tabs_done:
+            if json.loads(tab_done).get('id') in reqids:
+                tr.lrem(self.tabs_done_key, 1, tab_done)
+        tr.hincrby(self.info_key, 'num_browsers', -len(reqids))
+        await tr.execute()
+        await self.manager.invalidate_crawl(self.crawl_id)
+
+        _, errors = await self.flock_op(self.manager.remove_flock, reqids)
+        for error in errors:
+            logger.warning(f'Error removing browser of crawl {self.crawl_id}: {error}')
+
+        return len(reqids)
+
+    def queue_leases(self, tr) -> Callable[[], Tuple[Set[str], Dict[str, float]]]:
+        """Queues the commands reading this crawls pending urls and their
+        leases on the supplied pipeline
+
+        :param tr: The redis pipeline
+        :return: A callable, valid once the pipeline has been executed,
+        that returns the pending urls and the lease expiry of each leased url
         """
-        try:
-            await self.is_done()
-        except Exception as e:
-            logger.exception(str(e))
+        pending = tr.smembers(self.pending_q_key)
+        leases = tr.zrange(self.pending_lease_key, 0, -1, withscores=True)
+        return lambda: (set(pending.result()), dict(leases.result()))
+
+    async def reap_pending(
+        self, pending: Set[str], leases: Dict[str, float], now: float
+    ) -> int:
+        """Leases the pending urls of this crawl and queues again the urls
+        that have been pending for longer than their lease.
+
+        The browsers move urls from the frontier to the pending set and
+        remove them once crawled, but the urls of a browser that dies stay
+        pending. Each url is leased for pending_lease_timeout seconds from
+        the first time it is seen pending (in a sorted set, a:{id}:qp:lease,
+        scored by lease expiry). An expired url is removed from the pending
+        set and queued again with an incremented retries count, or, after
+        pending_max_retries retries, added to the failed set (a:{id}:failed)
+
+        :param pending: The pending urls, as returned by queue_leases
+        :param leases: The lease expiry of each leased url
+        :param now: The current time
+        :return: The number of urls queued again or given up
+        """
+        new = [url_req for url_req in pending if url_req not in leases]
+        released = [url_req for url_req in leases if url_req not in pending]
+        expired = [
+            url_req
+            for url_req, expiry in leases.items()
+            if expiry <= now and url_req in pending
+        ]
+
+        if new or released or expired:
+            tr = self.redis.multi_exec()
+            if new:
+                expiry = now + self.manager.pending_lease_timeout
+                pairs: List = []
+                for url_req in new:
+                    pairs.extend((expiry, url_req))
+                tr.zadd(self.pending_lease_key, *pairs, exist=Redis.ZSET_IF_NOT_EXIST)
+
+            if released or expired:
+                tr.zrem(self.pending_lease_key, *released, *expired)
+
+            # only urls still pending (not crawled in the meantime) are reaped
+            removed = [tr.srem(self.pending_q_key, url_req) for url_req in expired]
+            await tr.execute()
+            expired = [
+                url_req for url_req, fut in zip(expired, removed) if fut.result()
+            ]
+
+        if not expired:
+            return 0
+
+        entries = []
+        failed = []
+        for url_req in expired:
+            req = url_request(url_req)
+            retries = req.get('retries', 0) + 1
+            if retries > self.manager.pending_max_retries:
+                failed.append(url_req)
+                continue
 
-        data, browsers, tabs_done = await aio_gather(
-            self.redis.hgetall(self.info_key),
-            self.redis.smembers(self.browser_key),
-            self.redis.lrange(self.tabs_done_key, 0, -1),
-            loop=self.loop,
-        )
-        if 'browser_overrides' in data:
-            data['browser_overrides'] = json.loads(data['browser_overrides'])
+            req['retries'] = retries
+            entries.append((json.dumps(req), req.get('depth', 0), 0))
 
-        data['browsers'] = list(browsers)
-        data['tabs_done'] = [json.loads(elem) for elem in tabs_done]
+        tr = self.redis.multi_exec()
+        if entries:
+            (self.host_scheduler or self.frontier).push(tr, entries)
+        if failed:
+            tr.sadd(self.failed_key, *failed)
+        await tr.execute()
 
-        # do a count of the url keys
-        if count_urls:
-            num_queue, num_pending, num_seen = await aio_gather(
-                self.redis.llen(self.frontier_q_key),
-                self.redis.scard(self.pending_q_key),
-                self.redis.scard(self.seen_key),
-                loop=self.loop,
+        if failed:
+            logger.warning(
+                f'Crawl {self.crawl_id}: giving up on {len(failed)} url(s) '
+                f'after {self.manager.pending_max_retries} retries'
             )
 
-            data['num_queue'] = num_queue
-            data['num_pending'] = num_pending
-            data['num_seen'] = num_seen
+        return len(expired)
 
-        return data
+    async def get_info_urls(self, query: Optional[UrlsQuery] = None) -> Dict:
+        """Returns this crawls URL information.
 
-    async def get_info_urls(self) -> Dict:
-        """Returns this crawls URL information
+        Without a query, all queued, pending and seen URLs are returned.
+        With a query, only one page of the selected set is returned,
+        along with the cursor of the next page (None when done)
 
+        :param query: Optional selection of one page of one set of URLs
         :return: The crawls URL information
         """
-        scopes, queue, pending, seen = await aio_gather(
+        if query is not None:
+            return await self._get_info_urls_page(query)
+
+        scopes, queue, pending, seen, num_seen = await aio_gather(
             self.redis.smembers(self.scopes_key),
-            self.redis.lrange(self.frontier_q_key, 0, -1),
+            self.frontier.entries(self.redis),
             self.redis.smembers(self.pending_q_key),
-            self.redis.smembers(self.seen_key),
+            self.seen.members(self.redis),
+            self.seen.count(self.redis),
             loop=self.loop,
         )
 
@@ -490,28 +2421,242 @@ class Crawl:
             'queue': queue,
             'pending': list(pending),
             'seen': seen,
+            'num_seen': num_seen,
         }
 
         return data
 
+    async def _get_info_urls_page(self, query: UrlsQuery) -> Dict:
+        """Returns one page of the URL set selected by the supplied query
+
+        :param query: The selected set, cursor, page size and filters
+        :return: The crawls URL information
+        """
+        matches = self._url_matcher(query.prefix, query.regex)
+
+        try:
+            cursor = int(query.cursor)
+        except ValueError:
+            raise HTTPException(400, detail='invalid cursor')
+
+        limit = max(query.limit, 1)
+
+        scopes, num_seen = await aio_gather(
+            self.redis.smembers(self.scopes_key),
+            self.seen.count(self.redis),
+            loop=self.loop,
+        )
+
+        data = {
+            'scopes': [json.loads(scope) for scope in scopes],
+            'queue': [],
+            'pending': [],
+            'seen': None,
+            'num_seen': num_seen,
+            'url_set': query.url_set,
+            'cursor': None,
+        }
+
+        if query.url_set == UrlSet.QUEUE:
+            queue, next_cursor = await self._page_queue(cursor, limit, matches)
+            data['queue'] = [json.loads(url_req) for url_req in queue]
+
+        else:
+            scan = self._url_set_scan(query.url_set, limit, query.prefix)
+            if scan is None:
+                members, next_cursor = None, None
+            else:
+                members, next_cursor = await self._page_set(
+                    scan, cursor, limit, matches
+                )
+
+            if query.url_set == UrlSet.PENDING:
+                data['pending'] = members
+            else:
+                data['seen'] = members
+
+        data['cursor'] = next_cursor
+        return data
+
+    def iter_urls(
+        self, url_set: UrlSet, prefix: str = '', regex: str = '', batch_size: int = 1000
+    ) -> AsyncIterator[List[Dict]]:
+        """Iterates over all URLs of the selected set, in batches read
+        incrementally from redis (LRANGE/ZRANGE windows or SSCAN), so that
+        memory use does not grow with the size of the set
+
+        :param url_set: The set of URLs to iterate over
+        :param prefix: The required URL prefix, if any
+        :param regex: The regex URLs must match, if any
+        :param batch_size: The number of URLs to read at a time
+        :return: An async iterator over batches of url requests
+        """
+        matches = self._url_matcher(prefix, regex)
+        if url_set == UrlSet.QUEUE:
+            return self._iter_queue(matches, batch_size)
+
+        return self._iter_set(url_set, prefix, matches, batch_size)
+
+    async def _iter_queue(
+        self, matches: Callable[[str], bool], batch_size: int
+    ) -> AsyncIterator[List[Dict]]:
+        """Iterates over the queued url requests matching the filter
+
+        :param matches: The URL filter
+        :param batch_size: The number of URLs to read at a time
+        :return: An async iterator over batches of url requests
+        """
+        start = 0
+        while start is not None:
+            batch, cursor = await self._page_queue(start, batch_size, matches)
+            if batch:
+                yield [json.loads(url_req) for url_req in batch]
+            start = int(cursor) if cursor else None
+
+    async def _iter_set(
+        self,
+        url_set: UrlSet,
+        prefix: str,
+        matches: Callable[[str], bool],
+        batch_size: int,
+    ) -> AsyncIterator[List[Dict]]:
+        """Iterates over the pending or seen URLs matching the filter
+
+        :param url_set: The pending or seen set
+        :param prefix: The required URL prefix, if any
+        :param matches: The URL filter
+        :param batch_size: The number of URLs to read at a time
+        :return: An async iterator over batches of url requests
+        """
+        scan = self._url_set_scan(url_set, batch_size, prefix)
+        if scan is None:
+            return
+
+        cursor: Optional[int] = 0
+        while cursor is not None:
+            batch, next_cursor = await self._page_set(scan, cursor, batch_size, matches)
+            if batch:
+                yield [url_request(member) for member in batch]
+            cursor = int(next_cursor) if next_cursor else None
+
+    def _url_matcher(self, prefix: str, regex: str) -> Callable[[str], bool]:
+        """Returns the URL filter for the supplied prefix and regex
+
+        :param prefix: The required URL prefix, if any
+        :param regex: The regex URLs must match, if any
+        :return: The URL filter
+        """
+        try:
+            return url_matcher(prefix, regex)
+        except re.error as e:
+            raise HTTPException(400, detail=f'invalid regex: {e}')
+
+    def _url_set_scan(
+        self, url_set: UrlSet, count: int, prefix: str
+    ) -> Optional[Callable[[int], Awaitable[Tuple[int, List[str]]]]]:
+        """Returns the function performing one SSCAN of the pending or
+        seen set, or None if the set can not be listed
+
+        :param url_set: The pending or seen set
+        :param count: The number of members to scan at a time
+        :param prefix: The required URL prefix, if any
+        :return: The scan function or None
+        """
+        if url_set == UrlSet.PENDING:
+            return partial(self.redis.sscan, self.pending_q_key, count=count)
+
+        if not self.seen.listable:
+            return None
+
+        # let redis pre-filter the seen urls by prefix
+        match = glob_escape(prefix) + '*' if prefix else None
+        return partial(self.seen.scan, self.redis, count=count, match=match)
+
+    async def _page_queue(
+        self, start: int, limit: int, matches: Callable[[str], bool]
+    ) -> Tuple[List[str], Optional[str]]:
+        """Returns up to limit queued url requests matching the filter,
+        reading the frontier in windows of limit entries from start
+
+        :param start: The frontier index to start from
+        :param limit: The maximum number of url requests to return
+        :param matches: The URL filter
+        :return: The url requests and the next cursor (None when done)
+        """
+        results = []
+        while True:
+            window = await self.frontier.entries(self.redis, start, start + limit - 1)
+            for i, url_req in enumerate(window):
+                if not matches(request_url(url_req)):
+                    continue
+
+                results.append(url_req)
+                if len(results) == limit:
+                    return results, str(start + i + 1)
+
+            if len(window) < limit:
+                return results, None
+
+            start += len(window)
+
+    async def _page_set(
+        self,
+        scan: Callable[[int], Awaitable[Tuple[int, List[str]]]],
+        cursor: int,
+        limit: int,
+        matches: Callable[[str], bool],
+    ) -> Tuple[List[str], Optional[str]]:
+        """Returns about limit members of a set matching the filter,
+        using repeated SSCANs from the supplied cursor.
+
+        As a SSCAN can not be resumed in the middle of a batch, a page
+        may contain slightly more than limit members
+
+        :param scan: Performs one SSCAN from the supplied cursor
+        :param cursor: The SSCAN cursor to start from
+        :param limit: The number of members to return
+        :param matches: The member filter
+        :return: The members and the next cursor (None when done)
+        """
+        results: List[str] = []
+        while True:
+            cursor, members = await scan(cursor)
+            results.extend(member for member in members if matches(request_url(member)))
+            if not int(cursor):
+                return results, None
+
+            if len(results) >= limit:
+                return results, str(cursor)
+
     async def start(self) -> Dict:
-        if self.model.status == 'running':
-            raise HTTPException(400, detail='already running')
+        """Starts this crawl, or, if a browser budget is set, queues it
+        until the budget has room for its browsers
 
-        browsers = list(await self.redis.smembers(self.browser_key))
-        errors = []
+        :return: A dictionary containing the results of this operation
+        """
+        if self.model.status in (CrawlStatus.RUNNING, CrawlStatus.QUEUED):
+            raise HTTPException(400, detail=f'already {self.model.status}')
 
-        for reqid in browsers:
-            res = await self.manager.start_flock(reqid)
+        if self.manager.browser_budget > 0:
+            return await self.enqueue()
 
-            if 'error' in res:
-                errors.append(res['error'])
+        return await self._start()
+
+    async def _start(self) -> Dict:
+        """Starts the browsers of this crawl, requesting them first if
+        it has none (eg. it was queued or restored from a checkpoint)
+
+        :return: A dictionary containing the results of this operation
+        """
+        browsers = list(await self.redis.smembers(self.browser_key))
+        if not browsers:
+            return await self._start_new_browsers()
 
+        started, errors = await self.flock_op(self.manager.start_flock, browsers)
         if errors:
-            raise HTTPException(400, detail=errors)
+            raise FlockOpError(errors, started)
 
-        await self.redis.hset(self.info_key, 'status', 'running')
-        await self.redis.hset(self.info_key, 'start_time', int(time.time()))
+        await self.set_status(CrawlStatus.RUNNING.value, start_time=int(time.time()))
 
         return {
             'success': True,
@@ -520,41 +2665,151 @@ class Crawl:
             'id': self.crawl_id,
         }
 
+    async def _start_new_browsers(self) -> Dict:
+        """Requests and starts new browsers for this crawl, with the
+        flock options stored when it was created
+
+        :return: A dictionary containing the results of this operation
+        """
+        opts = await self.redis.get(self.flock_opts_key)
+        if not opts:
+            raise HTTPException(400, detail='no browsers to start')
+
+        res = await self.init_crawl_browsers(json.loads(opts), start=True)
+        await self.redis.hset(self.info_key, 'start_time', int(time.time()))
+        await self.manager.invalidate_crawl(self.crawl_id)
+        return res
+
+    async def enqueue(self) -> Dict:
+        """Queues this crawl to be started once the browser budget has
+        room for its browsers, by priority and then in queue order, and
+        starts queued crawls right away if possible
+
+        :return: A dictionary containing the results of this operation
+        """
+        score = priority_score(0, self.model.priority)
+        tr = self.redis.multi_exec()
+        tr.zadd(self.manager.admission_key, score, self.crawl_id)
+        await tr.execute()
+        await self.set_status(CrawlStatus.QUEUED.value)
+
+        await self.manager.admit_crawls()
+
+        tr = self.redis.pipeline()
+        status = tr.hget(self.info_key, 'status')
+        browsers = tr.smembers(self.browser_key)
+        await tr.execute()
+
+        self.model.status = status.result()
+        return {
+            'success': True,
+            'browsers': list(browsers.result()),
+            'status': self.model.status,
+            'id': self.crawl_id,
+        }
+
+    async def admit(self, score: float) -> bool:
+        """Starts this queued crawl, requesting its browsers first if
+        it has none yet. If starting fails, the browsers requested are
+        removed (or those started are stopped) and the crawl is queued
+        again
+
+        :param score: The admission queue score of this crawl
+        :return: True if the crawl was started, false if it was
+        no longer queued (eg. started by another api worker)
+        """
+        if not await self.redis.zrem(self.manager.admission_key, self.crawl_id):
+            return False
+
+        had_browsers = await self.redis.scard(self.browser_key) > 0
+        try:
+            await self._start()
+        except Exception as e:
+            await self._undo_start(had_browsers, e)
+            if self.model.status == CrawlStatus.QUEUED:
+                await self.redis.zadd(self.manager.admission_key, score, self.crawl_id)
+            raise
+
+        return True
+
+    async def _undo_start(self, had_browsers: bool, error: Exception) -> None:
+        """Releases the browsers of this crawl after it failed to start:
+        the browsers it already had are stopped, the browsers requested
+        (including those that failed to start) are removed
+
+        :param had_browsers: Did the crawl have browsers before starting
+        :param error: The error raised when starting
+        """
+        browsers = set(await self.redis.smembers(self.browser_key))
+        if had_browsers:
+            _, errors = await self.flock_op(self.manager.stop_flock, list(browsers))
+        else:
+            detail = getattr(error, 'detail', None)
+            if isinstance(detail, dict):
+                browsers.update(
+                    err['reqid'] for err in detail.get('errors', []) if err.get('reqid')
+                )
+            await self.redis.delete(self.browser_key)
+            _, errors = await self.flock_op(self.manager.remove_flock, list(browsers))
+
+        for err in errors:
+            logger.warning(f'Error releasing browser of crawl {self.crawl_id}: {err}')
+
     async def init_crawl_browsers(
-        self, browser_init_opts: Dict, start: bool = False
+        self,
+        browser_init_opts: Dict,
+        start: bool = False,
+        pool: Optional[FlockPool] = None,
     ) -> Dict:
-        """Initializes this crawls browsers and if start is true starts each browser in the crawl
+        """Initializes this crawls browsers and if start is true starts
+        each browser in the crawl.
+
+        The browsers are requested (and started) concurrently, at most
+        shepherd_concurrency at a time. When starting, flocks are first
+        claimed from the supplied warm pool, if any, and their deferred
+        autobrowser is started with this crawls environ
 
         :param browser_init_opts: Browser initialization options
         :param start: T/F indicating if the the intialized browser should be started
+        :param pool: Optional warm flock pool to claim flocks from
         :return: A dictionary containing information about the results of this operation
         """
-        errors = []
-        browsers = []
-
-        for _ in range(self.model.num_browsers):
-            res = await self.manager.request_flock(browser_init_opts)
-            reqid = res.get('reqid')
-            if not reqid:
-                if 'error' in res:
-                    errors.append(res['error'])
-                continue
-
-            if start:
-                res = await self.manager.start_flock(reqid)
+        claimed = []
+        if pool and start:
+            claimed = await pool.claim(self.redis, self.model.num_browsers)
+
+        async def init_browser(num: int) -> Dict:
+            if num < len(claimed):
+                reqid, user_params_key = claimed[num]
+                res = await self.manager.start_deferred(
+                    reqid, 'autobrowser', browser_init_opts['environ']
+                )
+                # the browser container runs with the pool user params
+                if user_params_key and 'error' not in res:
+                    await self.redis.hset(
+                        user_params_key,
+                        'auto_id',
+                        browser_init_opts['user_params']['auto_id'],
+                    )
+                return dict(res, reqid=reqid)
+
+            return await self._init_browser(browser_init_opts, start)
+
+        results = await gather_limited(
+            init_browser,
+            range(self.model.num_browsers),
+            self.manager.shepherd_concurrency,
+        )
+        browsers, errors = self._flock_results([None] * len(results), results)
 
-            if 'error' in res:
-                errors.append(res['error'])
-            else:
-                browsers.append(reqid)
-                await self.redis.sadd(self.browser_key, reqid)
+        if browsers:
+            await self.redis.sadd(self.browser_key, *browsers)
 
         if errors:
-            raise HTTPException(400, detail=errors)
+            raise FlockOpError(errors, browsers)
 
         if start:
-            self.model.status = 'running'
-            await self.redis.hset(self.info_key, 'status', 'running')
+            await self.set_status(CrawlStatus.RUNNING.value)
 
         return {
             'success': True,
@@ -563,6 +2818,104 @@ class Crawl:
             'id': self.crawl_id,
         }
 
+    async def _init_browser(self, browser_init_opts: Dict, start: bool) -> Dict:
+        """Requests, and if start is true starts, one browser of this crawl
+
+        :param browser_init_opts: Browser initialization options
+        :param start: T/F indicating if the browser should be started
+        :return: The result of the last shepherd request, with the request id
+        """
+        res = await self.manager.request_flock(browser_init_opts)
+        reqid = res.get('reqid')
+        if not reqid:
+            return {'reqid': None, 'error': res.get('error', 'no_reqid')}
+
+        if start:
+            res = await self.manager.start_flock(reqid)
+
+        return dict(res, reqid=reqid)
+
+    async def flock_op(
+        self, func: Callable[[str], Awaitable[Dict]], reqids: List[str]
+    ) -> Tuple[List[str], List[Dict]]:
+        """Calls the supplied shepherd flock operation for each of the
+        supplied flocks concurrently, at most shepherd_concurrency at a time
+
+        :param func: The flock operation (eg. CrawlManager.start_flock)
+        :param reqids: The request ids of the flocks
+        :return: The request ids of the flocks the operation succeeded for
+        and the error of each flock it failed for
+        """
+        results = await gather_limited(func, reqids, self.manager.shepherd_concurrency)
+        return self._flock_results(reqids, results)
+
+    def _flock_results(
+        self, reqids: List[Optional[str]], results: List[Union[Dict, Exception]]
+    ) -> Tuple[List[str], List[Dict]]:
+        """Splits the supplied results of a flock operation into
+        successes and per-flock errors
+
+        :param reqids: The request ids of the flocks, None if the result has it
+        :param results: The results of the flock operation (or the exception it raised)
+        :return: The request ids of the flocks the operation succeeded for
+        and the error of each flock it failed for
+        """
+        succeeded = []
+        errors = []
+        for reqid, res in zip(reqids, results):
+            if isinstance(res, Exception):
+                res = {'error': getattr(res, 'detail', None) or str(res)}
+
+            reqid = reqid or res.get('reqid')
+            if 'error' in res:
+                errors.append({'reqid': reqid, 'error': res['error']})
+            else:
+                succeeded.append(reqid)
+
+        return succeeded, errors
+
+    def _check_budget(self, crawl_request: CreateCrawlRequest) -> bool:
+        """Checks that the browsers of the supplied crawl request fit in
+        the browser budget, if any
+
+        :param crawl_request: Information about the crawl to be started
+        :return: True if the crawl is to be queued, to be started once
+        admitted, when the browser budget has room
+        """
+        budget = self.manager.browser_budget
+        if budget > 0 and crawl_request.num_browsers > budget:
+            raise HTTPException(
+                400, detail=f'num_browsers exceeds the browser budget of {budget}'
+            )
+
+        return crawl_request.start and budget > 0
+
+    async def _init_scope(self, crawl_request: CreateCrawlRequest) -> int:
+        """Returns the depth of the supplied crawl request, by crawl type,
+        and stores its scopes if it is a custom crawl
+
+        :param crawl_request: Information about the crawl to be started
+        :return: The crawl depth
+        """
+        if crawl_request.crawl_type == CrawlType.ALL_LINKS:
+            return crawl_request.crawl_depth or 1
+
+        if crawl_request.crawl_type == CrawlType.SAME_DOMAIN:
+            return crawl_request.crawl_depth or self.manager.same_domain_depth
+
+        if crawl_request.crawl_type == CrawlType.SINGLE_PAGE:
+            return 0
+
+        try:
+            ScopeEngine(crawl_request.scopes)
+        except ValueError as e:
+            raise HTTPException(400, detail=str(e))
+
+        for scope in crawl_request.scopes:
+            await self.redis.sadd(self.scopes_key, json.dumps(scope))
+
+        return crawl_request.crawl_depth
+
     async def init_crawl(self, crawl_request: CreateCrawlRequest) -> Dict:
         """Initialize the crawl (and optionally start)
 
@@ -570,18 +2923,10 @@ class Crawl:
         :return: An dictionary that includes an indication if this operation
         was successful and a list of browsers in the crawl
         """
-        # init base crawl data
-        if crawl_request.crawl_type == CrawlType.ALL_LINKS:
-            crawl_depth = crawl_request.crawl_depth or 1
-        elif crawl_request.crawl_type == CrawlType.SAME_DOMAIN:
-            crawl_depth = crawl_request.crawl_depth or self.manager.same_domain_depth
-        elif crawl_request.crawl_type == CrawlType.SINGLE_PAGE:
-            crawl_depth = 0
-        elif crawl_request.crawl_type == CrawlType.CUSTOM:
-            crawl_depth = crawl_request.crawl_depth
+        queue = self._check_budget(crawl_request)
 
-            for scope in crawl_request.scopes:
-                await self.redis.sadd(self.scopes_key, json.dumps(scope))
+        # init base crawl data
+        crawl_depth = await self._init_scope(crawl_request)
 
         mode = crawl_request.mode.value
         screenshot_coll = (
@@ -605,11 +2950,20 @@ class Crawl:
             crawl_type=crawl_request.crawl_type.value,
             status='new',
             crawl_depth=crawl_depth,
-            start_time=int(time.time()) if crawl_request.start else 0,
+            start_time=int(time.time()) if crawl_request.start and not queue else 0,
             finish_time=0,
             headless=crawl_request.headless,
             cache=crawl_request.cache.value,
             browser_overrides=crawl_request.browser_overrides,
+            seen_mode=crawl_request.seen_mode.value,
+            seen_capacity=crawl_request.seen_capacity,
+            seen_error_rate=crawl_request.seen_error_rate,
+            frontier_mode=crawl_request.frontier_mode.value,
+            host_concurrency=crawl_request.host_concurrency,
+            host_delay=crawl_request.host_delay,
+            min_browsers=max(crawl_request.min_browsers, 1),
+            max_browsers=crawl_request.max_browsers,
+            priority=crawl_request.priority,
         )
         redis_crawl_info = self.model.dict(exclude={'browser_overrides', 'headless'})
         redis_crawl_info['headless'] = 1 if self.model.headless else 0
@@ -618,6 +2972,7 @@ class Crawl:
                 skip_defaults=True
             )
         await self.redis.hmset_dict(self.info_key, redis_crawl_info)
+        await self.register()
 
         # init seeds
         if crawl_request.seed_urls is not None:
@@ -626,14 +2981,26 @@ class Crawl:
         # init browser user params and environ
         browser = crawl_request.browser or self.manager.default_browser
 
+        custom_user_params = bool(crawl_request.user_params)
         user_params = crawl_request.user_params
         user_params['auto_id'] = self.crawl_id
         user_params['mode'] = self.model.mode
         user_params['coll'] = self.model.coll
         user_params['cache'] = crawl_request.cache.value
 
-        environ = self.manager.container_environ.copy()
-        environ['AUTO_ID'] = self.crawl_id
+        # warm flocks keep the user params they were requested with, so
+        # they are only claimed by crawls with the same pywb user params
+        pool = None
+        if not custom_user_params:
+            pool = self.manager.flock_pool_for(
+                browser,
+                crawl_request.headless,
+                {key: user_params[key] for key in ('coll', 'mode', 'cache')},
+            )
+
+        environ: Dict[str, Any] = self.manager.container_environ.copy()
+        # the browsers read and write the keys a:<AUTO_ID>:...
+        environ['AUTO_ID'] = self.key_id
         environ['NUM_TABS'] = self.model.num_tabs
 
         if crawl_request.mode != CaptureMode.LIVE:
@@ -642,6 +3009,12 @@ class Crawl:
         if crawl_request.cache == CacheMode.NEVER:
             environ['CRAWL_NO_NETCACHE'] = '1'
 
+        if crawl_request.frontier_mode != FrontierMode.FIFO:
+            environ['FRONTIER_MODE'] = crawl_request.frontier_mode.value
+
+        if crawl_request.seen_mode != SeenMode.URL:
+            environ['SEEN_MODE'] = crawl_request.seen_mode.value
+
         if crawl_request.behavior_max_time > 0:
             environ['BEHAVIOR_RUN_TIME'] = crawl_request.behavior_max_time
 
@@ -661,22 +3034,18 @@ class Crawl:
         else:
             environ.pop('EXTRACTED_RAW_DOM_API_URL', '')
 
-        deferred = {'autobrowser': False}
-        if crawl_request.headless:
-            environ['DISPLAY'] = ''
-            deferred['xserver'] = True
-
-        opts = dict(
-            overrides={
-                'browser': 'oldwebtoday/' + browser,
-                'xserver': 'oldwebtoday/vnc-webrtc-audio',
-            },
-            deferred=deferred,
-            user_params=crawl_request.user_params,
-            environ=environ,
+        opts = self.manager.flock_opts(
+            browser, crawl_request.headless, user_params, environ
         )
 
-        return await self.init_crawl_browsers(opts, crawl_request.start)
+        # kept to request the browsers later (when the crawl is admitted or
+        # restored), or more browsers when autoscaling
+        await self.redis.set(self.flock_opts_key, json.dumps(opts))
+
+        if queue:
+            return await self.enqueue()
+
+        return await self.init_crawl_browsers(opts, crawl_request.start, pool)
 
     async def is_done(self) -> Dict[str, bool]:
         """Is this crawl done
@@ -698,20 +3067,15 @@ class Crawl:
         # if await self.redis.scard(self.pending_q_key) > 0:
         #    return {'done': False}
 
-        # if not all browsers are done, not done
-        tabs_done = await self.redis.lrange(self.tabs_done_key, 0, -1)
+        tr = self.redis.pipeline()
+        result = self.queue_done_update(tr)
+        await tr.execute()
 
-        if self.model.num_tabs * self.model.num_browsers != len(tabs_done):
+        update = result()
+        if not update:
             return {'done': False}
 
-        if tabs_done:
-            finish_time = int(json.loads(tabs_done[0])['time'])
-        else:
-            finish_time = 0
-
-        update = {'status': 'done', 'finish_time': finish_time}
-
-        await self.redis.hmset_dict(self.info_key, update)
+        await self.finish(update['finish_time'])
         return {'done': True}
 
     async def stop(self, remove=False) -> Dict[str, bool]:
@@ -720,25 +3084,77 @@ class Crawl:
         :param remove: remove the crawl (if its stopped or not)
         :return: An dictionary indicating if the operation was successful
         """
+        if not remove and self.model.status == CrawlStatus.QUEUED:
+            await self.redis.zrem(self.manager.admission_key, self.crawl_id)
+            await self.redis.hdel(self.manager.admission_retry_key, self.crawl_id)
+            await self.set_status(CrawlStatus.STOPPED.value)
+            return {'success': True}
+
         if not remove and self.model.status != 'running':
             raise HTTPException(400, detail='not running')
 
-        errors = []
+        browsers = list(await self.redis.smembers(self.browser_key))
+        func = self.manager.remove_flock if remove else self.manager.stop_flock
 
-        browsers = await self.redis.smembers(self.browser_key)
+        stopped, errors = await self.flock_op(func, browsers)
+        if errors:
+            raise FlockOpError(errors, stopped)
 
-        for reqid in browsers:
-            if remove:
-                res = await self.manager.remove_flock(reqid)
-            else:
-                res = await self.manager.stop_flock(reqid)
+        await self.set_status(CrawlStatus.STOPPED.value)
 
-            if 'error' in res:
-                errors.append(res['error'])
+        return {'success': True}
 
-        if errors:
-            raise HTTPException(400, detail=errors)
+    async def set_status(self, status: str, **fields) -> None:
+        """Sets the status (and other info fields) of this crawl and
+        moves it to the matching status index of the crawl registry.
 
-        await self.redis.hset(self.info_key, 'status', 'stopped')
+        Running crawls using per-host scheduling are also added to
+        the set of crawls scheduled by the crawl manager
 
-        return {'success': True}
+        :param status: The new status
+        :param fields: Other info fields to be set
+        """
+        now = time.time()
+        tr = self.redis.multi_exec()
+        tr.hmset_dict(self.info_key, dict(fields, status=status))
+        for other in CrawlStatus:
+            if other.value != status:
+                tr.zrem(self.manager.status_key(other.value), self.crawl_id)
+        tr.zadd(self.manager.status_key(status), now, self.crawl_id)
+
+        if status == CrawlStatus.RUNNING and self.host_scheduler:
+            tr.sadd(self.manager.host_scheduled_key, self.crawl_id)
+        else:
+            tr.srem(self.manager.host_scheduled_key, self.crawl_id)
+
+        if status == CrawlStatus.RUNNING and self.model.max_browsers > 0:
+            tr.sadd(self.manager.autoscaled_key, self.crawl_id)
+        else:
+            tr.srem(self.manager.autoscaled_key, self.crawl_id)
+
+        await tr.execute()
+        await self.manager.invalidate_crawl(self.crawl_id)
+        self.model.status = status
+
+    async def register(self, created: Optional[float] = None) -> None:
+        """Adds this crawl to the crawl registry
+
+        :param created: The creation time of the crawl, defaults to now
+        """
+        created = created or time.time()
+        tr = self.redis.multi_exec()
+        tr.zadd(self.manager.crawls_index_key, created, self.crawl_id)
+        tr.zadd(self.manager.status_key(self.model.status), created, self.crawl_id)
+        await tr.execute()
+
+    async def unregister(self) -> None:
+        """Removes this crawl from the crawl registry"""
+        tr = self.redis.multi_exec()
+        tr.zrem(self.manager.crawls_index_key, self.crawl_id)
+        for status in CrawlStatus:
+            tr.zrem(self.manager.status_key(status.value), self.crawl_id)
+        tr.srem(self.manager.host_scheduled_key, self.crawl_id)
+        tr.srem(self.manager.autoscaled_key, self.crawl_id)
+        tr.zrem(self.manager.admission_key, self.crawl_id)
+        tr.hdel(self.manager.admission_retry_key, self.crawl_id)
+        await tr.execute()
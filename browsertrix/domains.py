@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+__all__ = [
+    'PUBLIC_SUFFIX_LIST_PATH',
+    'SuffixTrie',
+    'default_suffix_trie',
+    'registered_domain',
+]
+
+# the public suffix list (https://publicsuffix.org/list/) bundled with
+# browsertrix, can be replaced with a newer copy set in PUBLIC_SUFFIX_LIST
+PUBLIC_SUFFIX_LIST_PATH = os.path.join(
+    os.path.dirname(__file__), 'public_suffix_list.dat'
+)
+
+IPV4_RX = re.compile(r'^\d{1,3}(?:\.\d{1,3}){3}$')
+
+# the trie node keys marking a rule, a wildcard rule and exception rules
+RULE = ''
+WILDCARD = '*'
+EXCEPTIONS = '!'
+
+
+def ace_label(label: str) -> Optional[str]:
+    """Returns the ascii (punycode) form of a non ascii domain label
+
+    :param label: The domain label
+    :return: The ascii label or None if the label is already ascii
+    """
+    try:
+        label.encode('ascii')
+        return None
+    except UnicodeEncodeError:
+        return 'xn--' + label.encode('punycode').decode('ascii')
+
+
+# ============================================================================
+class SuffixTrie:
+    """Public suffix rules in a trie, by reversed label.
+
+    Each node is a dict of child labels that may also hold the RULE key
+    (a suffix ends here), the WILDCARD key (any one more label is part of
+    the suffix) and the EXCEPTIONS key (the labels the wildcard does not
+    cover, as in !www.ck)
+    """
+
+    __slots__ = ['root']
+
+    def __init__(self, rules: Iterable[str] = ()) -> None:
+        self.root: Dict = {}
+        for rule in rules:
+            self.add(rule)
+
+    @classmethod
+    def load(cls, path: str, private: bool = True) -> SuffixTrie:
+        """Loads the rules of a public suffix list file
+
+        :param path: The path of the public suffix list
+        :param private: Include the private domains section
+        (eg. github.io), not only the ICANN domains
+        :return: The suffix trie
+        """
+        rules = []
+        with open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                line = line.strip()
+                if line.startswith('// ===BEGIN PRIVATE DOMAINS') and not private:
+                    break
+                if line and not line.startswith('//'):
+                    rules.append(line.split()[0])
+
+        return cls(rules)
+
+    def add(self, rule: str) -> None:
+        """Adds one public suffix list rule (eg. co.uk, *.ck or !www.ck)
+
+        :param rule: The rule
+        """
+        rule = rule.lower()
+        exception = rule.startswith('!')
+        labels = rule.lstrip('!').split('.')
+
+        for ascii_labels in self.label_forms(labels):
+            node = self.root
+            for label in reversed(ascii_labels[1:]):
+                node = node.setdefault(label, {})
+
+            last = ascii_labels[0]
+            if exception:
+                node.setdefault(EXCEPTIONS, set()).add(last)
+            elif last == WILDCARD:
+                node[WILDCARD] = True
+            else:
+                node.setdefault(last, {})[RULE] = True
+
+    @staticmethod
+    def label_forms(labels: List[str]) -> List[List[str]]:
+        """Returns the supplied labels and, for internationalized
+        domains, their ascii form
+
+        :param labels: The labels of a rule
+        :return: The list of label forms
+        """
+        ace = [ace_label(label) for label in labels]
+        if not any(ace):
+            return [labels]
+        return [labels, [alt or label for label, alt in zip(labels, ace)]]
+
+    def suffix_length(self, labels: List[str]) -> int:
+        """Returns the number of labels of the public suffix of a host
+        name, applying the implicit * rule if no rule matches
+
+        :param labels: The labels of the host name
+        :return: The number of labels of its public suffix
+        """
+        node = self.root
+        length = 1
+        for i, label in enumerate(reversed(labels)):
+            if WILDCARD in node:
+                if label in node.get(EXCEPTIONS, ()):
+                    return i
+                length = i + 1
+
+            node = node.get(label)
+            if node is None:
+                break
+            if RULE in node:
+                length = i + 1
+
+        return length
+
+    def registered_domain(self, hostname: str) -> str:
+        """Returns the registered domain (the public suffix and one more
+        label) of a lowercased host name, eg. example.co.uk for
+        www.sub.example.co.uk. IP addresses and host names that are
+        public suffixes are returned unchanged
+
+        :param hostname: The host name
+        :return: The registered domain
+        """
+        hostname = hostname.rstrip('.')
+        if ':' in hostname or IPV4_RX.match(hostname):
+            return hostname
+
+        labels = hostname.split('.')
+        length = self.suffix_length(labels)
+        if length >= len(labels):
+            return hostname
+        return '.'.join(labels[-length - 1 :])
+
+
+@lru_cache(maxsize=1)
+def default_suffix_trie() -> SuffixTrie:
+    """Returns the suffix trie of the public suffix list file set in
+    PUBLIC_SUFFIX_LIST, defaults to the bundled list, loaded once
+
+    :return: The suffix trie
+    """
+    return SuffixTrie.load(
+        os.environ.get('PUBLIC_SUFFIX_LIST') or PUBLIC_SUFFIX_LIST_PATH
+    )
+
+
+@lru_cache(maxsize=65536)
+def registered_domain(hostname: str) -> str:
+    """Returns the registered domain of the supplied lowercased host name
+    with the default suffix trie, memoized for the most recent hosts
+
+    :param hostname: The host name
+    :return: The registered domain
+    """
+    return default_suffix_trie().registered_domain(hostname)
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import logging
+from asyncio import (
+    CancelledError,
+    Queue,
+    Task,
+    TimeoutError as AsyncTimeoutError,
+    get_event_loop,
+    sleep as aio_sleep,
+    wait_for,
+)
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import ujson as json
+
+from .schema import CrawlStatus
+
+__all__ = ['CrawlEvents', 'info_events', 'sse_message']
+
+logger = logging.getLogger('browsertrix')
+
+# a live crawl event: its name and data
+CrawlEvent = Tuple[str, Dict[str, Any]]
+
+COUNT_FIELDS = ('num_queue', 'num_pending', 'num_seen')
+
+SNAPSHOT_FIELDS = ('id', 'status', 'start_time', 'finish_time') + COUNT_FIELDS
+
+# statuses after which no more events are sent
+FINAL_STATUSES = (CrawlStatus.DONE,)
+
+
+def sse_message(event: str, data: Dict) -> str:
+    """Returns the supplied event as a server-sent events message
+
+    :param event: The name of the event
+    :param data: The data of the event, sent as json
+    :return: The server-sent events message
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def info_snapshot(info: Dict) -> Dict:
+    """Returns the fields of the supplied crawl information sent in an info event
+
+    :param info: The crawl information
+    :return: The snapshot of the crawl information
+    """
+    snapshot = {field: info.get(field) for field in SNAPSHOT_FIELDS}
+    snapshot['num_tabs_done'] = len(info.get('tabs_done', []))
+    return snapshot
+
+
+def info_events(prev: Optional[Dict], info: Dict) -> List[CrawlEvent]:
+    """Returns the events describing the changes between two successive
+    crawl informations
+
+    :param prev: The previous crawl information, None if there is none
+    :param info: The current crawl information
+    :return: The list of events
+    """
+    if prev is None:
+        return [('info', info_snapshot(info))]
+
+    events = []
+    if info['status'] != prev['status']:
+        events.append(
+            (
+                'status',
+                {
+                    'status': info['status'],
+                    'start_time': info.get('start_time'),
+                    'finish_time': info.get('finish_time'),
+                },
+            )
+        )
+
+    delta = {field: info[field] - prev[field] for field in COUNT_FIELDS}
+    if any(delta.values()):
+        counts = {field: info[field] for field in COUNT_FIELDS}
+        counts['delta'] = delta
+        events.append(('counts', counts))
+
+    for tab_done in info['tabs_done'][len(prev['tabs_done']) :]:
+        events.append(('tab_done', tab_done))
+
+    return events
+
+
+# ============================================================================
+class CrawlEvents:
+    """Live progress feed of one crawl, shared by all of its viewers.
+
+    A single poller per crawl reads the crawl information (with one
+    pipeline) every interval seconds and pushes the changes as events
+    to the queue of each subscribed viewer. The poller is started by
+    the first subscriber and stopped when the last one leaves
+    """
+
+    __slots__ = ['crawl_id', 'load_info', 'interval', 'last', 'subscribers', 'task']
+
+    def __init__(
+        self,
+        crawl_id: str,
+        load_info: Callable[[], Awaitable[Optional[Dict]]],
+        interval: float,
+    ) -> None:
+        self.crawl_id: str = crawl_id
+        self.load_info: Callable[[], Awaitable[Optional[Dict]]] = load_info
+        self.interval: float = interval
+        self.last: Optional[Dict] = None
+        self.subscribers: Set[Queue] = set()
+        self.task: Optional[Task] = None
+
+    def subscribe(self) -> Queue:
+        """Adds a viewer of this feed, starting the poller if needed
+
+        :return: The queue receiving the events (None after the last event)
+        """
+        queue: Queue = Queue()
+        if self.last is not None:
+            queue.put_nowait(('info', info_snapshot(self.last)))
+
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = get_event_loop().create_task(self.poll_loop())
+        return queue
+
+    def unsubscribe(self, queue: Queue) -> None:
+        """Removes a viewer of this feed, stopping the poller after the last one
+
+        :param queue: The queue returned by subscribe
+        """
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.close()
+
+    def close(self) -> None:
+        """Stops the poller of this feed"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self.last = None
+
+    def publish(self, event: Optional[CrawlEvent]) -> None:
+        """Pushes the supplied event to each viewer
+
+        :param event: The event, None to end the feed
+        """
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    async def poll(self) -> bool:
+        """Reads the crawl information and publishes its changes
+
+        :return: True if the feed is over (the crawl is done or deleted)
+        """
+        info = await self.load_info()
+        if info is None:
+            self.publish(('deleted', {'id': self.crawl_id}))
+            self.publish(None)
+            return True
+
+        for event in info_events(self.last, info):
+            self.publish(event)
+
+        self.last = info
+        if info['status'] in FINAL_STATUSES:
+            self.publish(None)
+            return True
+
+        return False
+
+    async def poll_loop(self) -> None:
+        """Runs poll every interval seconds until the feed is over"""
+        while True:
+            try:
+                if await self.poll():
+                    break
+            except CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(str(e))
+
+            await aio_sleep(self.interval)
+
+        self.task = None
+
+    async def stream(
+        self,
+        is_disconnected: Callable[[], Awaitable[bool]],
+        keep_alive: float = 15.0,
+    ) -> AsyncIterator[str]:
+        """Streams the events of this feed as server-sent events messages,
+        until the feed is over or the viewer disconnects
+
+        :param is_disconnected: Returns true once the viewer has disconnected
+        :param keep_alive: The number of seconds after which a comment is
+        sent if there were no events
+        :return: An async iterator over the messages
+        """
+        queue = self.subscribe()
+        try:
+            while not await is_disconnected():
+                try:
+                    event = await wait_for(queue.get(), timeout=keep_alive)
+                except AsyncTimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+
+                if event is None:
+                    yield sse_message('end', {'id': self.crawl_id})
+                    break
+
+                yield sse_message(*event)
+        finally:
+            self.unsubscribe(queue)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, List, Optional, Tuple
+
+from aioredis import Redis
+
+from .schema import CrawlInfo, FrontierMode
+
+__all__ = [
+    'Frontier',
+    'FrontierEntry',
+    'PriorityFrontier',
+    'frontier_for',
+    'priority_score',
+]
+
+# score distance between two depth (or priority) levels, larger than
+# any enqueue timestamp so that the timestamp only breaks ties
+DEPTH_SCORE_STEP = 10_000_000_000
+
+# a queued url: the json encoded url request, its depth and priority
+FrontierEntry = Tuple[str, int, int]
+
+
+def priority_score(depth: int, priority: int = 0, now: Optional[float] = None) -> float:
+    """Returns the priority frontier score for a url, lower scores
+    are crawled first.
+
+    Shallow urls come before deep ones, each priority level offsets
+    one depth level and urls at the same level are crawled in the
+    order they were queued
+
+    :param depth: The depth of the url
+    :param priority: The priority of the url (or of its seed)
+    :param now: The enqueue time, defaults to the current time
+    :return: The score of the url
+    """
+    if now is None:
+        now = time.time()
+    return (depth - priority) * DEPTH_SCORE_STEP + now
+
+
+# ============================================================================
+class Frontier:
+    """FIFO frontier stored as a Redis list"""
+
+    __slots__ = ['key']
+
+    # the push mode of the queue urls script (see scripts.QUEUE_URLS)
+    script_mode: str = 'rpush'
+
+    def __init__(self, key: str) -> None:
+        self.key: str = key
+
+    @property
+    def keys(self) -> List[str]:
+        """The redis keys used by this frontier"""
+        return [self.key]
+
+    def push(self, tr, entries: List[FrontierEntry]) -> None:
+        """Queues the commands adding the supplied entries to this
+        frontier on the supplied pipeline or transaction
+
+        :param tr: The redis pipeline or transaction
+        :param entries: The entries to be added
+        """
+        tr.rpush(self.key, *(url_req for url_req, _, _ in entries))
+
+    def script_push(
+        self, entries: List[FrontierEntry], now: float
+    ) -> Tuple[List[str], List[List]]:
+        """Returns the queue urls script keys and, for each entry, the
+        arguments pushing it to this frontier
+
+        :param entries: The entries to be added
+        :param now: The enqueue time
+        :return: The push and push counter keys and the list of arguments
+        """
+        return [self.key, self.key], [[url_req] for url_req, _, _ in entries]
+
+    async def count(self, redis: Redis) -> int:
+        """Returns the number of urls in this frontier
+
+        :param redis: The redis instance
+        :return: The number of queued urls
+        """
+        return int(await redis.llen(self.key))
+
+    def queue_count(self, tr) -> Callable[[], int]:
+        """Queues the command counting the urls in this frontier on the
+        supplied pipeline or transaction
+
+        :param tr: The redis pipeline or transaction
+        :return: A callable, valid once the pipeline has been executed,
+        that returns the number of queued urls
+        """
+        fut = tr.llen(self.key)
+        return lambda: int(fut.result())
+
+    async def entries(self, redis: Redis, start: int = 0, stop: int = -1) -> List[str]:
+        """Returns the json encoded url requests in this frontier,
+        in crawl order, from start to stop (inclusive)
+
+        :param redis: The redis instance
+        :param start: The index of the first entry
+        :param stop: The index of the last entry
+        :return: The list of url requests
+        """
+        entries: List[str] = await redis.lrange(self.key, start, stop)
+        return entries
+
+    async def overflow(self, redis: Redis, keep: int) -> List[Tuple[str, float]]:
+        """Returns all entries after the first keep entries, with their
+        score (always 0 for this frontier)
+
+        :param redis: The redis instance
+        :param keep: The number of entries to keep in this frontier
+        :return: The list of url requests and scores
+        """
+        return [(url_req, 0.0) for url_req in await self.entries(redis, keep)]
+
+
+# ============================================================================
+class PriorityFrontier(Frontier):
+    """Frontier stored as a Redis sorted set scored by
+    depth, priority and enqueue time (see priority_score)
+    """
+
+    __slots__ = []
+
+    script_mode: str = 'zadd'
+
+    def push(self, tr, entries: List[FrontierEntry]) -> None:
+        now = time.time()
+        pairs: List = []
+        for url_req, depth, priority in entries:
+            pairs.extend((priority_score(depth, priority, now), url_req))
+
+        tr.zadd(self.key, *pairs)
+
+    def script_push(
+        self, entries: List[FrontierEntry], now: float
+    ) -> Tuple[List[str], List[List]]:
+        return [self.key, self.key], [
+            [priority_score(depth, priority, now), url_req]
+            for url_req, depth, priority in entries
+        ]
+
+    async def count(self, redis: Redis) -> int:
+        return int(await redis.zcard(self.key))
+
+    def queue_count(self, tr) -> Callable[[], int]:
+        fut = tr.zcard(self.key)
+        return lambda: int(fut.result())
+
+    async def entries(self, redis: Redis, start: int = 0, stop: int = -1) -> List[str]:
+        entries: List[str] = await redis.zrange(self.key, start, stop)
+        return entries
+
+    async def overflow(self, redis: Redis, keep: int) -> List[Tuple[str, float]]:
+        overflow: List[Tuple[str, float]] = await redis.zrange(
+            self.key, keep, -1, withscores=True
+        )
+        return overflow
+
+
+def frontier_for(key: str, model: Optional[CrawlInfo]) -> Frontier:
+    """Returns the frontier implementation for the frontier mode
+    of the supplied crawl info
+
+    :param key: The redis key of the frontier
+    :param model: The crawl info
+    :return: The frontier
+    """
+    if model and model.frontier_mode == FrontierMode.PRIORITY:
+        return PriorityFrontier(key)
+    return Frontier(key)
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import time
+from asyncio import ensure_future
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from aioredis import Redis
+from starlette.routing import Match
+
+from .shepherd import LatencyHistogram
+
+__all__ = [
+    'CONTENT_TYPE',
+    'Metrics',
+    'MetricsMiddleware',
+    'format_gauge',
+    'format_histogram',
+    'instrument_redis',
+]
+
+# the content type of the prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def format_value(value: float) -> str:
+    """Returns the supplied sample value in the exposition format
+
+    :param value: The sample value
+    :return: The formatted value
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value)
+
+
+def format_labels(labels: Labels) -> str:
+    """Returns the supplied label pairs in the exposition format
+
+    :param labels: The (name, value) label pairs
+    :return: The formatted labels, empty if there are none
+    """
+    if not labels:
+        return ''
+
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def format_gauge(
+    name: str,
+    help_: str,
+    samples: Iterable[Tuple[Labels, float]],
+    type_: str = 'gauge',
+) -> List[str]:
+    """Returns the lines of a gauge (or counter) metric
+
+    :param name: The name of the metric
+    :param help_: The description of the metric
+    :param samples: The labels and value of each sample
+    :param type_: The type of the metric, gauge or counter
+    :return: The lines of the metric
+    """
+    lines = [f'# HELP {name} {help_}', f'# TYPE {name} {type_}']
+    for labels, value in samples:
+        lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+    return lines
+
+
+def format_histogram(
+    name: str, help_: str, histograms: Iterable[Tuple[Labels, LatencyHistogram]]
+) -> List[str]:
+    """Returns the lines of a histogram metric
+
+    :param name: The name of the metric
+    :param help_: The description of the metric
+    :param histograms: The labels and latency histogram of each sample
+    :return: The lines of the metric
+    """
+    lines = [f'# HELP {name} {help_}', f'# TYPE {name} histogram']
+    for labels, histogram in histograms:
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            cumulative += count
+            bucket_labels = format_labels(labels + (('le', format_value(bound)),))
+            lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+
+        lines.append(f'{name}_sum{format_labels(labels)} {format_value(histogram.sum)}')
+        lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+    return lines
+
+
+def instrument_redis(redis: Redis, record: Callable[[str, float], None]) -> Redis:
+    """Records the latency of each command sent with the supplied redis
+    client (by command name) and of each pipeline and transaction
+    (as PIPELINE and MULTI_EXEC)
+
+    :param redis: The redis client
+    :param record: Called with the command name and latency of each command
+    :return: The redis client
+    """
+    execute = redis.execute
+
+    def timed_execute(command, *args, **kwargs):
+        start = time.monotonic()
+        fut = ensure_future(execute(command, *args, **kwargs))
+        if isinstance(command, bytes):
+            command = command.decode('utf-8')
+        name = command.upper()
+        fut.add_done_callback(lambda _: record(name, time.monotonic() - start))
+        return fut
+
+    def timed_pipelines(factory: Callable, name: str) -> Callable:
+        def create(*args, **kwargs):
+            pipe = factory(*args, **kwargs)
+            pipe_execute = pipe.execute
+
+            async def timed_pipe_execute(*args, **kwargs):
+                start = time.monotonic()
+                try:
+                    return await pipe_execute(*args, **kwargs)
+                finally:
+                    record(name, time.monotonic() - start)
+
+            pipe.execute = timed_pipe_execute
+            return pipe
+
+        return create
+
+    redis.execute = timed_execute
+    redis.pipeline = timed_pipelines(redis.pipeline, 'PIPELINE')
+    redis.multi_exec = timed_pipelines(redis.multi_exec, 'MULTI_EXEC')
+    return redis
+
+
+# ============================================================================
+class Metrics:
+    """The latency histograms recorded by the api, and the crawl gauges
+    sampled in the background by the crawl manager
+    """
+
+    __slots__ = [
+        'request_latency',
+        'redis_latency',
+        'crawl_counts',
+        'crawl_sizes',
+        'sample_time',
+    ]
+
+    def __init__(self) -> None:
+        self.request_latency: Dict[Labels, LatencyHistogram] = {}
+        self.redis_latency: Dict[Labels, LatencyHistogram] = {}
+        # number of crawls by status
+        self.crawl_counts: Dict[str, int] = {}
+        # frontier, pending, seen and failed sizes, by running crawl id
+        self.crawl_sizes: Dict[str, Dict[str, int]] = {}
+        self.sample_time: float = 0.0
+
+    @staticmethod
+    def observe(
+        histograms: Dict[Labels, LatencyHistogram], labels: Labels, seconds: float
+    ) -> None:
+        """Records one latency in the histogram with the supplied labels
+
+        :param histograms: The histograms, by labels
+        :param labels: The labels of the histogram
+        :param seconds: The latency
+        """
+        histogram = histograms.get(labels)
+        if histogram is None:
+            histogram = histograms[labels] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def record_request(
+        self, method: str, route: str, status: int, seconds: float
+    ) -> None:
+        """Records the latency of an api request
+
+        :param method: The http method of the request
+        :param route: The path of the matched route
+        :param status: The status code of the response
+        :param seconds: The time until the response started
+        """
+        labels = (('method', method), ('route', route), ('status', str(status)))
+        self.observe(self.request_latency, labels, seconds)
+
+    def record_redis(self, command: str, seconds: float) -> None:
+        """Records the latency of a redis command
+
+        :param command: The name of the command
+        :param seconds: The latency of the command
+        """
+        self.observe(self.redis_latency, (('command', command),), seconds)
+
+
+# ============================================================================
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of each http request, by
+    method, route path (eg. /crawl/{crawl_id}) and status code.
+
+    The latency is measured until the response starts, so that streamed
+    responses (eg. crawl events) are not timed for their whole duration
+    """
+
+    def __init__(self, app: Callable, metrics: Metrics, routes: List) -> None:
+        self.app: Callable = app
+        self.metrics: Metrics = metrics
+        self.routes: List = routes
+
+    def route_path(self, scope: Dict) -> str:
+        """Returns the path of the route matching the supplied request scope
+
+        :param scope: The ASGI scope of the request
+        :return: The route path, or unmatched
+        """
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return str(route.path)
+        return 'unmatched'
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.monotonic()
+        method = scope['method']
+        route = self.route_path(scope)
+        started = False
+
+        async def timed_send(message: Dict) -> None:
+            nonlocal started
+            if message['type'] == 'http.response.start':
+                started = True
+                self.metrics.record_request(
+                    method, route, message['status'], time.monotonic() - start
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        except Exception:
+            if not started:
+                self.metrics.record_request(
+                    method, route, 500, time.monotonic() - start
+                )
+            raise
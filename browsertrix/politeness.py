@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aioredis import Redis
+
+from .frontier import Frontier, FrontierEntry
+from .scripts import OVERFLOW_HOSTS, SCHEDULE_HOSTS
+from .utils import extract_domain, request_url
+
+__all__ = ['HostScheduler', 'url_host']
+
+
+def url_host(url_req: str) -> str:
+    """Returns the host, as used for per-host scheduling, of a queued
+    or pending url: either a json encoded url request or a plain url.
+    The host is the registered domain of the url, so all the subdomains
+    of a site share its politeness limits
+
+    :param url_req: The queued or pending url
+    :return: The host of the url
+    """
+    return extract_domain(request_url(url_req))
+
+
+# ============================================================================
+class HostScheduler:
+    """Politeness layer in front of a crawls frontier.
+
+    New urls are kept in per-host sub-queues (a:{id}:hq:{host}), of the
+    same kind as the frontier, and a sorted set of hosts (a:{id}:hosts)
+    scored by the time each host may next be crawled. Each call to
+    schedule tops up the frontier, to one url per tab, by handing out
+    urls round-robin across the ready hosts, never exceeding
+    host_concurrency urls per host in the frontier or pending set and
+    waiting host_delay seconds between two urls of the same host.
+
+    Urls pushed directly to the frontier (eg. outlinks found by the
+    browsers) beyond the top up target are moved back into the
+    per-host sub-queues
+    """
+
+    __slots__ = [
+        'key_prefix',
+        'frontier',
+        'pending_q_key',
+        'hosts_key',
+        'count_key',
+        'host_concurrency',
+        'host_delay',
+        'target',
+    ]
+
+    def __init__(
+        self,
+        key_prefix: str,
+        frontier: Frontier,
+        pending_q_key: str,
+        host_concurrency: int,
+        host_delay: float,
+        target: int,
+    ) -> None:
+        self.key_prefix: str = key_prefix
+        self.frontier: Frontier = frontier
+        self.pending_q_key: str = pending_q_key
+
+        self.hosts_key: str = f'{key_prefix}hosts'
+        self.count_key: str = f'{key_prefix}hq:count'
+
+        self.host_concurrency: int = max(host_concurrency, 1)
+        self.host_delay: float = host_delay
+        self.target: int = max(target, 1)
+
+    @property
+    def script_mode(self) -> str:
+        """The push mode of the queue urls script (see scripts.QUEUE_URLS)"""
+        return f'hosts:{self.frontier.script_mode}'
+
+    def host_q_key(self, host: str) -> str:
+        """Returns the key of the sub-queue for the supplied host
+
+        :param host: The host
+        :return: The redis key of the host sub-queue
+        """
+        return f'{self.key_prefix}hq:{host}'
+
+    def host_queue(self, host: str) -> Frontier:
+        """Returns the sub-queue for the supplied host
+
+        :param host: The host
+        :return: The host sub-queue, of the same kind as the frontier
+        """
+        return type(self.frontier)(self.host_q_key(host))
+
+    async def keys(self, redis: Redis) -> List[str]:
+        """Returns the redis keys used by this scheduler
+
+        :param redis: The redis instance
+        :return: The list of keys
+        """
+        hosts = await redis.zrange(self.hosts_key, 0, -1)
+        return [self.hosts_key, self.count_key] + [
+            self.host_q_key(host) for host in hosts
+        ]
+
+    def push(self, tr, entries: Iterable[FrontierEntry]) -> None:
+        """Queues the commands adding the supplied entries to their
+        host sub-queues on the supplied pipeline or transaction
+
+        :param tr: The redis pipeline or transaction
+        :param entries: The entries to be added
+        """
+        by_host: Dict[str, List[FrontierEntry]] = defaultdict(list)
+        for entry in entries:
+            by_host[url_host(entry[0])].append(entry)
+
+        now = time.time()
+        for host, host_entries in by_host.items():
+            self.host_queue(host).push(tr, host_entries)
+            tr.zadd(self.hosts_key, now, host, exist=Redis.ZSET_IF_NOT_EXIST)
+
+        num_entries = sum(len(host_entries) for host_entries in by_host.values())
+        if num_entries:
+            tr.incrby(self.count_key, num_entries)
+
+    def script_push(
+        self, entries: List[FrontierEntry], now: float
+    ) -> Tuple[List[str], List[List]]:
+        """Returns the queue urls script keys (including the sub-queue
+        key of each entry) and, for each entry, the arguments adding it
+        to its host sub-queue
+
+        :param entries: The entries to be added
+        :param now: The enqueue time
+        :return: The keys and the list of arguments
+        """
+        keys = [self.hosts_key, self.count_key]
+        args = []
+        for entry in entries:
+            host = url_host(entry[0])
+            host_keys, host_args = self.host_queue(host).script_push([entry], now)
+            keys.append(host_keys[0])
+            args.append([host] + host_args[0])
+        return keys, args
+
+    async def count(self, redis: Redis) -> int:
+        """Returns the number of urls waiting in the host sub-queues
+
+        :param redis: The redis instance
+        :return: The number of urls
+        """
+        return int(await redis.get(self.count_key) or 0)
+
+    def queue_count(self, tr) -> Callable[[], int]:
+        """Queues the command counting the urls waiting in the host
+        sub-queues on the supplied pipeline or transaction
+
+        :param tr: The redis pipeline or transaction
+        :return: A callable, valid once the pipeline has been executed,
+        that returns the number of urls
+        """
+        fut = tr.get(self.count_key)
+        return lambda: int(fut.result() or 0)
+
+    async def schedule(self, redis: Redis, now: Optional[float] = None) -> int:
+        """Moves urls from the host sub-queues to the frontier.
+
+        Urls beyond the top up target are first moved back from the
+        frontier to their host sub-queues, with their frontier score,
+        by a single Lua script (see scripts.OVERFLOW_HOSTS).
+
+        The hosts to release a url from are chosen here, each release
+        (moving the url, removing the host once its sub-queue is empty
+        or delaying it) is then done by a single Lua script (see
+        scripts.SCHEDULE_HOSTS), so that urls pushed or released at the
+        same time, eg. by another replica, are never lost
+
+        :param redis: The redis instance
+        :param now: The current time, defaults to time.time()
+        :return: The number of urls moved to the frontier
+        """
+        if now is None:
+            now = time.time()
+
+        overflow = await self.frontier.overflow(redis, self.target)
+        if overflow:
+            keys = [self.hosts_key, self.count_key, self.frontier.key]
+            args = [self.frontier.script_mode, now]
+            for url_req, score in overflow:
+                host = url_host(url_req)
+                keys.append(self.host_q_key(host))
+                args.extend((url_req, score, host))
+
+            await redis.eval(OVERFLOW_HOSTS, keys=keys, args=args)
+
+        queued = await self.frontier.entries(redis)
+        pending = await redis.smembers(self.pending_q_key)
+        in_flight = Counter(url_host(url_req) for url_req in queued)
+        in_flight.update(url_host(url_req) for url_req in pending)
+
+        free = self.target - len(queued)
+        num_released = 0
+
+        while free > 0:
+            ready = await redis.zrangebyscore(self.hosts_key, max=now)
+            hosts = [host for host in ready if in_flight[host] < self.host_concurrency]
+            hosts = hosts[:free]
+            if not hosts:
+                break
+
+            released = await redis.eval(
+                SCHEDULE_HOSTS,
+                keys=[self.hosts_key, self.count_key, self.frontier.key]
+                + [self.host_q_key(host) for host in hosts],
+                args=[self.frontier.script_mode, now, now + self.host_delay] + hosts,
+            )
+            if not released:
+                break
+
+            in_flight.update(released)
+            free -= len(released)
+            num_released += len(released)
+
+            # with a delay, each ready host gives at most one url per call
+            if self.host_delay > 0:
+                break
+
+        return num_released
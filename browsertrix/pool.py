@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aioredis import Redis
+
+from .utils import gather_limited
+
+__all__ = ['FlockPool']
+
+logger = logging.getLogger('browsertrix')
+
+
+# ============================================================================
+class FlockPool:
+    """Pool of warm flocks for one browser image and display mode.
+
+    The flocks are requested and started ahead of time, except for
+    their deferred autobrowser container, and kept by request id in a
+    Redis sorted set (flockpool:{name}) scored by the time they were
+    started, so the pool is shared by all api workers. A new crawl
+    claims its flocks from the pool and only has to start their
+    autobrowser, with its own environ. Refilling adds flocks until the
+    pool holds size flocks, flocks idle for more than max_idle seconds
+    are removed.
+
+    The user params key (up:<ip>, read by pywb) of the browser container
+    of each flock is kept in the hash flockpool:{name}:up, so that a
+    crawl can add its own user params to a claimed flock
+    """
+
+    __slots__ = ['name', 'key', 'user_params_key', 'opts', 'size', 'max_idle']
+
+    def __init__(self, name: str, opts: Dict, size: int, max_idle: float) -> None:
+        self.name: str = name
+        self.key: str = f'flockpool:{name}'
+        self.user_params_key: str = f'{self.key}:up'
+        self.opts: Dict = opts
+        self.size: int = size
+        self.max_idle: float = max_idle
+
+    async def count(self, redis: Redis) -> int:
+        """Returns the number of flocks in this pool
+
+        :param redis: The redis instance
+        :return: The number of flocks
+        """
+        return int(await redis.zcard(self.key))
+
+    async def claim(self, redis: Redis, num: int) -> List[Tuple[str, Optional[str]]]:
+        """Removes and returns up to num flocks from this pool, oldest first
+
+        :param redis: The redis instance
+        :param num: The number of flocks wanted
+        :return: The request id and user params key (None if unknown)
+        of each claimed flock
+        """
+        if num <= 0:
+            return []
+
+        tr = redis.multi_exec()
+        fut = tr.zrange(self.key, 0, num - 1)
+        tr.zremrangebyrank(self.key, 0, num - 1)
+        await tr.execute()
+
+        reqids = fut.result()
+        if not reqids:
+            return []
+
+        tr = redis.multi_exec()
+        fut = tr.hmget(self.user_params_key, *reqids)
+        tr.hdel(self.user_params_key, *reqids)
+        await tr.execute()
+        return list(zip(reqids, fut.result()))
+
+    async def refill(
+        self,
+        redis: Redis,
+        request_flock: Callable[[Dict], Awaitable[Dict]],
+        start_flock: Callable[[str], Awaitable[Dict]],
+        remove_flock: Callable[[str], Awaitable[Dict]],
+        concurrency: int,
+        limit: Optional[int] = None,
+    ) -> int:
+        """Requests and starts flocks until this pool holds size flocks.
+        A flock is only added once started, a flock that fails to start
+        is removed
+
+        :param redis: The redis instance
+        :param request_flock: Requests one flock (eg. CrawlManager.request_flock)
+        :param start_flock: Starts one flock (eg. CrawlManager.start_flock)
+        :param remove_flock: Removes one flock (eg. CrawlManager.remove_flock)
+        :param concurrency: The maximum number of concurrent requests
+        :param limit: Optional maximum number of flocks to add
+        (eg. the room left in the browser budget)
+        :return: The number of flocks added
+        """
+        missing = self.size - await self.count(redis)
+        if limit is not None:
+            missing = min(missing, limit)
+        if missing <= 0:
+            return 0
+
+        async def add_flock(_: int) -> Dict:
+            res = await request_flock(self.opts)
+            reqid = res.get('reqid')
+            if not reqid:
+                return res
+
+            try:
+                res = await start_flock(reqid)
+            except Exception:
+                await remove_flock(reqid)
+                raise
+
+            if 'error' in res:
+                await remove_flock(reqid)
+                return res
+
+            return dict(res, reqid=reqid)
+
+        results = await gather_limited(add_flock, range(missing), concurrency)
+
+        now = time.time()
+        pairs: List = []
+        user_params_keys = {}
+        for res in results:
+            reqid = None
+            if isinstance(res, dict) and 'error' not in res:
+                reqid = res.get('reqid')
+            if not reqid:
+                logger.warning(f'Error refilling flock pool {self.name}: {res}')
+                continue
+
+            pairs.extend((now, reqid))
+            browser = res.get('containers', {}).get('browser') or {}
+            if browser.get('ip'):
+                user_params_keys[reqid] = 'up:' + browser['ip']
+
+        if not pairs:
+            return 0
+
+        tr = redis.multi_exec()
+        if user_params_keys:
+            tr.hmset_dict(self.user_params_key, user_params_keys)
+        tr.zadd(self.key, *pairs)
+        await tr.execute()
+        return len(pairs) // 2
+
+    async def shrink(
+        self,
+        redis: Redis,
+        remove_flock: Callable[[str], Awaitable[Dict]],
+        concurrency: int,
+        num: int,
+    ) -> int:
+        """Removes up to num flocks from this pool, eg. to make room in
+        the browser budget for a queued crawl
+
+        :param redis: The redis instance
+        :param remove_flock: Removes one flock (eg. CrawlManager.remove_flock)
+        :param concurrency: The maximum number of concurrent requests
+        :param num: The number of flocks to remove
+        :return: The number of flocks removed
+        """
+        reqids = [reqid for reqid, _ in await self.claim(redis, num)]
+        await gather_limited(remove_flock, reqids, concurrency)
+        return len(reqids)
+
+    async def expire(
+        self,
+        redis: Redis,
+        remove_flock: Callable[[str], Awaitable[Dict]],
+        concurrency: int,
+        now: Optional[float] = None,
+    ) -> int:
+        """Removes the flocks that have been in this pool for more than max_idle seconds
+
+        :param redis: The redis instance
+        :param remove_flock: Removes one flock (eg. CrawlManager.remove_flock)
+        :param concurrency: The maximum number of concurrent requests
+        :param now: The current time, defaults to time.time()
+        :return: The number of flocks removed
+        """
+        if now is None:
+            now = time.time()
+
+        expired = await redis.zrangebyscore(self.key, max=now - self.max_idle)
+        if not expired:
+            return 0
+
+        # only remove the flocks not claimed in the meantime
+        tr = redis.multi_exec()
+        futs = [tr.zrem(self.key, reqid) for reqid in expired]
+        await tr.execute()
+        expired = [reqid for reqid, fut in zip(expired, futs) if fut.result()]
+        if expired:
+            await redis.hdel(self.user_params_key, *expired)
+
+        await gather_limited(remove_flock, expired, concurrency)
+        return len(expired)
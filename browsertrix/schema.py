@@ -2,12 +2,13 @@ import math
 from enum import Enum
 from typing import Any, Dict, List, Optional, Set, Union
 
-from pydantic import BaseModel, Schema, UrlStr
+from pydantic import BaseModel, Schema, UrlStr, validator
 
 __all__ = [
     'BrowserCookie',
     'BrowserOverrides',
     'CacheMode',
+    'CheckpointResponse',
     'CaptureMode',
     'CookieSameSite',
     'CrawlDoneResponse',
@@ -15,14 +16,27 @@ __all__ = [
     'CrawlInfoResponse',
     'CrawlInfoUrlsResponse',
     'CrawlInfosResponse',
+    'CrawlStatus',
     'CrawlType',
     'CreateCrawlRequest',
     'CreateStartResponse',
+    'DeleteCrawlsResponse',
     'EmulatedDevice',
     'EmulatedGeoLocation',
+    'FrontierMode',
     'FullCrawlInfoResponse',
+    'MigrateKeysResponse',
     'OperationSuccessResponse',
+    'QueueUrl',
     'QueueUrlsRequest',
+    'QueueUrlsResponse',
+    'RestoreCrawlRequest',
+    'ScopeTestRequest',
+    'ScopeTestResponse',
+    'ScopeTestResult',
+    'SeenMode',
+    'UrlSet',
+    'UrlsQuery',
 ]
 
 # ============================================================================
@@ -41,6 +55,14 @@ class CrawlType(str, Enum):
     CUSTOM = 'custom'
 
 
+class CrawlStatus(str, Enum):
+    NEW = 'new'
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    STOPPED = 'stopped'
+    DONE = 'done'
+
+
 class CaptureMode(str, Enum):
     RECORD = 'record'
     REPLAY = 'replay'
@@ -53,6 +75,23 @@ class CacheMode(str, Enum):
     DEFAULT = 'default'
 
 
+class SeenMode(str, Enum):
+    URL = 'url'
+    FINGERPRINT = 'fingerprint'
+    BLOOM = 'bloom'
+
+
+class FrontierMode(str, Enum):
+    FIFO = 'fifo'
+    PRIORITY = 'priority'
+
+
+class UrlSet(str, Enum):
+    QUEUE = 'queue'
+    PENDING = 'pending'
+    SEEN = 'seen'
+
+
 class CookieSameSite(str, Enum):
     STRICT = 'Strict'
     LAX = 'LAX'
@@ -143,6 +182,86 @@ class CreateCrawlRequest(BaseCreateCrawl):
     start: bool = True
     browser_overrides: Optional[BrowserOverrides] = None
 
+    frontier_mode: FrontierMode = Schema(
+        FrontierMode.FIFO,
+        description='Crawl urls in queue order or by depth, priority and queue time',
+    )
+
+    host_concurrency: int = Schema(
+        0,
+        description=(
+            'Max number of urls per host queued or being crawled at once, '
+            '0 for no per-host scheduling'
+        ),
+    )
+    host_delay: float = Schema(
+        0.0, description='Min seconds between two urls of the same host'
+    )
+
+    seen_mode: SeenMode = Schema(
+        SeenMode.URL,
+        description=(
+            'How seen urls are stored: full urls, 64-bit fingerprints '
+            'or a bloom filter'
+        ),
+    )
+    seen_capacity: int = Schema(
+        10000000, description='Expected number of urls, for the bloom seen mode'
+    )
+    seen_error_rate: float = Schema(
+        0.001, description='False positive rate, for the bloom seen mode'
+    )
+
+    min_browsers: int = Schema(
+        1, description='Min number of browsers, when autoscaling the number of browsers'
+    )
+    max_browsers: int = Schema(
+        0,
+        description=(
+            'Max number of browsers to scale the crawl to based on its queue, '
+            '0 for no autoscaling'
+        ),
+    )
+
+    priority: int = Schema(
+        0,
+        description=(
+            'Priority of the crawl when waiting for browsers of the '
+            'browser budget, higher first'
+        ),
+    )
+
+    @validator('num_browsers', 'num_tabs', 'seen_capacity')
+    def at_least_one(cls, value: int) -> int:
+        if value < 1:
+            raise ValueError('must be at least 1')
+        return value
+
+    @validator(
+        'behavior_max_time',
+        'host_concurrency',
+        'host_delay',
+        'min_browsers',
+        'max_browsers',
+    )
+    def not_negative(cls, value: Optional[float]) -> Optional[float]:
+        if value is not None and value < 0:
+            raise ValueError('must not be negative')
+        return value
+
+    @validator('seen_error_rate')
+    def error_rate(cls, value: float) -> float:
+        if not 0 < value < 1:
+            raise ValueError('must be between 0 and 1')
+        return value
+
+    @validator('max_browsers')
+    def max_browsers_range(cls, value: int, values: Dict[str, Any]) -> int:
+        min_browsers = values.get('min_browsers')
+        if value > 0 and min_browsers is not None and min_browsers > value:
+            raise ValueError('must not be less than min_browsers')
+        return value
+
 
 class OperationSuccessResponse(BaseModel):
     success: bool
@@ -154,6 +273,28 @@ class CreateStartResponse(OperationSuccessResponse):
     browsers: Optional[List[str]]
 
 
+class DeleteCrawlsResponse(OperationSuccessResponse):
+    num_deleted: int = 0
+    errors: List[Dict[Any, Any]] = []
+
+
+class MigrateKeysResponse(OperationSuccessResponse):
+    num_migrated: int = 0
+    stopped: List[str] = []
+
+
+class CheckpointResponse(OperationSuccessResponse):
+    id: str
+    checkpoint: str
+    size: int = 0
+
+
+class RestoreCrawlRequest(BaseModel):
+    checkpoint: str = Schema(
+        ..., description='Name of the checkpoint file to restore the crawl from'
+    )
+
+
 class CrawlInfoResponse(BaseCreateCrawl):
     id: str
     status: str = 'new'
@@ -165,14 +306,18 @@ class CrawlInfoResponse(BaseCreateCrawl):
     num_queue: int = 0
     num_seen: int = 0
     num_pending: int = 0
+    num_failed: int = 0
+    seen_mode: SeenMode = SeenMode.URL
+    frontier_mode: FrontierMode = FrontierMode.FIFO
 
 
 class CrawlInfosResponse(BaseModel):
     crawls: List[CrawlInfoResponse]
+    total: int = 0
 
 
 class CrawlInfo(BaseModel):
-    """ Model for validate a:{crawl_id}:info key
+    """Model for validate a:{crawl_id}:info key
     All fields should be set in the model
     """
 
@@ -191,6 +336,15 @@ class CrawlInfo(BaseModel):
     finish_time: int = 0
     headless: bool = False
     browser_overrides: Optional[BrowserOverrides] = None
+    seen_mode: str = SeenMode.URL.value
+    seen_capacity: int = 0
+    seen_error_rate: float = 0.0
+    frontier_mode: str = FrontierMode.FIFO.value
+    host_concurrency: int = 0
+    host_delay: float = 0.0
+    min_browsers: int = 1
+    max_browsers: int = 0
+    priority: int = 0
 
 
 class CrawlInfoUrlsResponse(BaseModel):
@@ -198,14 +352,59 @@ class CrawlInfoUrlsResponse(BaseModel):
     queue: List[Dict[Any, Any]]
     pending: OptionalList
     seen: OptionalSet
+    num_seen: int = 0
+    url_set: Optional[UrlSet] = None
+    cursor: Optional[str] = None
+
+
+class UrlsQuery(BaseModel):
+    """Selects one page of one set of a crawls urls"""
+
+    url_set: UrlSet
+    cursor: str = '0'
+    limit: int = 1000
+    prefix: str = ''
+    regex: str = ''
 
 
 class FullCrawlInfoResponse(CrawlInfo, CrawlInfoUrlsResponse):
     success: bool
 
 
+class QueueUrl(BaseModel):
+    url: str
+    depth: int = Schema(0, description='Depth (hops from a seed) of the url')
+    priority: int = Schema(
+        0, description='Priority of the url, for the priority frontier mode'
+    )
+
+
 class QueueUrlsRequest(BaseModel):
-    urls: List[str]
+    urls: List[Union[QueueUrl, str]]
+
+
+class QueueUrlsResponse(OperationSuccessResponse):
+    num_added: int = 0
+    num_dupes: int = 0
+    num_rejected: int = Schema(0, description='Number of out of scope urls')
+
+
+class ScopeTestRequest(BaseModel):
+    urls: List[Union[QueueUrl, str]]
+
+
+class ScopeTestResult(BaseModel):
+    url: str
+    depth: int = 0
+    in_scope: bool
+    reason: Optional[str] = Schema(
+        None,
+        description='Why the url is out of scope: depth, excluded or not-included',
+    )
+
+
+class ScopeTestResponse(BaseModel):
+    results: List[ScopeTestResult]
 
 
 class CrawlDoneResponse(BaseModel):
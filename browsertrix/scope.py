@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Pattern, Tuple
+from urllib.parse import urlsplit
+
+import ujson as json
+
+__all__ = [
+    'DomainTrie',
+    'MatchRule',
+    'ScopeEngine',
+    'compile_scopes',
+    'surt',
+    'surt_prefix',
+]
+
+# the reasons a url is out of scope
+DEPTH = 'depth'
+EXCLUDED = 'excluded'
+NOT_INCLUDED = 'not-included'
+
+INCLUDE_CONDITIONS = ('domain', 'surt', 'regex', 'substring')
+
+# the condition of each urlcanon url_match type
+URL_MATCH_CONDITIONS = {
+    'STRING_MATCH': 'substring',
+    'SURT_MATCH': 'surt',
+    'REGEX_MATCH': 'regex',
+}
+
+SURT_SCHEME_RX = re.compile(r'^[a-z][a-z0-9+.-]*://')
+
+
+def url_hostname(url: str) -> str:
+    """Returns the lowercased host name of the supplied url, without
+    user info, port or trailing dot
+
+    :param url: The url
+    :return: The host name, empty if the url has none
+    """
+    try:
+        hostname = urlsplit(url).hostname
+    except ValueError:
+        return ''
+    return (hostname or '').rstrip('.')
+
+
+def surt(url: str) -> str:
+    """Returns the SURT (Sort-friendly URI Reordering Transform) form of
+    the supplied url, without its scheme: the host labels reversed and
+    comma separated (dropping a leading www), then the path and query,
+    eg. https://www.example.com/a?b -> com,example,)/a?b
+
+    :param url: The url
+    :return: The SURT of the url
+    """
+    parts = urlsplit(url)
+    labels = url_hostname(url).split('.')
+    if labels[0] == 'www':
+        labels = labels[1:]
+
+    host = ','.join(reversed(labels)) + ','
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != {'http': 80, 'https': 443}.get(parts.scheme):
+        host += f':{port}'
+
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    return f'{host}){path}'
+
+
+def surt_prefix(prefix: str) -> str:
+    """Normalizes a SURT prefix to the form returned by surt: the
+    scheme and opening parenthesis of heritrix style prefixes, eg.
+    http://(com,example, are removed
+
+    :param prefix: The SURT prefix
+    :return: The normalized prefix
+    """
+    prefix = SURT_SCHEME_RX.sub('', prefix.strip().lower())
+    return prefix.lstrip('(')
+
+
+# ============================================================================
+class DomainTrie:
+    """Trie of domains, by reversed label, matching a host name if it
+    is one of the domains or a subdomain of one
+    """
+
+    __slots__ = ['root']
+
+    # marks the node of a domain
+    END = ''
+
+    def __init__(self, domains: Iterable[str] = ()) -> None:
+        self.root: Dict = {}
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain: str) -> None:
+        """Adds the supplied domain, which may include a port
+
+        :param domain: The domain
+        """
+        hostname = url_hostname('//' + domain)
+        if not hostname:
+            return
+
+        node = self.root
+        for label in reversed(hostname.split('.')):
+            node = node.setdefault(label, {})
+        node[self.END] = True
+
+    def match(self, hostname: str) -> bool:
+        """Returns true if the supplied host name is one of the domains
+        of this trie, or a subdomain of one
+
+        :param hostname: The lowercased host name
+        :return: True if the host name matches
+        """
+        node = self.root
+        for label in reversed(hostname.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if self.END in node:
+                return True
+        return False
+
+    def __bool__(self) -> bool:
+        return bool(self.root)
+
+
+def compile_regex(regexes: List[str]) -> Optional[Pattern]:
+    """Compiles the supplied regexes into a single alternation
+
+    :param regexes: The regexes
+    :return: The compiled pattern or None if there are no regexes
+    :raises ValueError: If a regex is invalid
+    """
+    if not regexes:
+        return None
+
+    try:
+        return re.compile('|'.join(f'(?:{regex})' for regex in regexes))
+    except re.error as e:
+        raise ValueError(f'invalid scope regex: {e}')
+
+
+# ============================================================================
+class MatchRule:
+    """An include rule with several conditions, all of which must match
+    (as in urlcanon MatchRules)
+    """
+
+    __slots__ = ['domain', 'surt', 'regex', 'substring']
+
+    def __init__(self, conditions: Dict[str, str]) -> None:
+        self.domain: Optional[DomainTrie] = None
+        if 'domain' in conditions:
+            self.domain = DomainTrie([conditions['domain']])
+
+        self.surt: Optional[str] = None
+        if 'surt' in conditions:
+            self.surt = surt_prefix(conditions['surt'])
+
+        self.regex: Optional[Pattern] = None
+        if 'regex' in conditions:
+            self.regex = compile_regex([conditions['regex']])
+
+        self.substring: Optional[str] = conditions.get('substring')
+
+    def applies(self, url: str, hostname: str, url_surt: str) -> bool:
+        return (
+            (self.domain is None or self.domain.match(hostname))
+            and (self.surt is None or url_surt.startswith(self.surt))
+            and (self.regex is None or self.regex.match(url) is not None)
+            and (self.substring is None or self.substring in url)
+        )
+
+
+def rule_conditions(rule: Dict) -> Optional[Dict[str, str]]:
+    """Returns the include conditions of the supplied urlcanon style
+    rule (a url_match and value pair is converted to the matching
+    condition), or None if the rule has conditions that can only be
+    checked by the browsers (eg. parent_url_regex)
+
+    :param rule: The rule
+    :return: The conditions, by name
+    """
+    rule = dict(rule)
+    url_match = rule.pop('url_match', None)
+    value = rule.pop('value', None)
+    if url_match:
+        name = URL_MATCH_CONDITIONS.get(str(url_match).upper())
+        if not name or name in rule:
+            return None
+        rule[name] = value
+
+    if not rule or any(key not in INCLUDE_CONDITIONS for key in rule):
+        return None
+
+    return {key: str(value) for key, value in rule.items() if value is not None}
+
+
+# ============================================================================
+class ScopeEngine:
+    """A crawls scope rules, compiled for checking urls in bulk.
+
+    The rules are json objects, as stored in a:{id}:scope. Include rules
+    are urlcanon style MatchRules with any of the conditions:
+
+    - domain: the url host is the domain or one of its subdomains
+    - surt: the SURT of the url starts with the prefix (see surt)
+    - regex: the url matches (re.match) the regex
+    - substring: the url contains the substring
+
+    The conditions of a rule must all match. The single condition domain,
+    surt and regex rules are merged into a domain trie, a sorted list of
+    SURT prefixes and a single regex. Two more rules are only applied by
+    the crawl service:
+
+    - {"exclude": regex}: the url must not match (re.search) the regex
+    - {"max_depth": n}: the depth of the url is at most n
+
+    A url is in scope if its depth is within every max_depth, it matches
+    no exclude and it matches any include rule (if the crawl has any).
+    Rules with conditions that can only be checked by the browsers (eg.
+    parent_url_regex) disable the include check
+    """
+
+    __slots__ = [
+        'domains',
+        'surts',
+        'include',
+        'rules',
+        'exclude',
+        'max_depth',
+        'opaque',
+    ]
+
+    def __init__(self, rules: Iterable[Dict]) -> None:
+        self.domains: DomainTrie = DomainTrie()
+        self.rules: List[MatchRule] = []
+        self.max_depth: Optional[int] = None
+        self.opaque: bool = False
+
+        surts = set()
+        include = []
+        exclude = []
+
+        for rule in rules:
+            if not isinstance(rule, dict):
+                self.opaque = True
+                continue
+
+            if 'exclude' in rule:
+                exclude.append(str(rule['exclude']))
+                continue
+
+            if 'max_depth' in rule:
+                try:
+                    max_depth = int(rule['max_depth'])
+                except (TypeError, ValueError):
+                    raise ValueError(f'invalid scope max_depth: {rule["max_depth"]}')
+                if self.max_depth is None or max_depth < self.max_depth:
+                    self.max_depth = max_depth
+                continue
+
+            conditions = rule_conditions(rule)
+            if not conditions:
+                self.opaque = True
+            elif len(conditions) > 1 or 'substring' in conditions:
+                self.rules.append(MatchRule(conditions))
+            elif 'domain' in conditions:
+                self.domains.add(conditions['domain'])
+            elif 'surt' in conditions:
+                surts.add(surt_prefix(conditions['surt']))
+            else:
+                include.append(conditions['regex'])
+
+        # drop the prefixes covered by a shorter one, the closest sorted
+        # prefix before a SURT is then the only one that can match it
+        self.surts: List[str] = []
+        for prefix in sorted(surts):
+            if not self.surts or not prefix.startswith(self.surts[-1]):
+                self.surts.append(prefix)
+
+        self.include: Optional[Pattern] = compile_regex(include)
+        self.exclude: Optional[Pattern] = compile_regex(exclude)
+
+    @property
+    def has_includes(self) -> bool:
+        """Are urls checked against include rules"""
+        return not self.opaque and bool(
+            self.domains or self.surts or self.include or self.rules
+        )
+
+    @property
+    def empty(self) -> bool:
+        """Does this scope accept every url"""
+        return not self.has_includes and not self.exclude and self.max_depth is None
+
+    def match_surt(self, url_surt: str) -> bool:
+        index = bisect_right(self.surts, url_surt)
+        return index > 0 and url_surt.startswith(self.surts[index - 1])
+
+    def check(self, url: str, depth: int = 0) -> Optional[str]:
+        """Checks if the supplied url is in scope
+
+        :param url: The url
+        :param depth: The depth of the url
+        :return: None if the url is in scope, otherwise the reason it is
+        not: depth, excluded or not-included
+        """
+        if self.max_depth is not None and depth > self.max_depth:
+            return DEPTH
+
+        if self.exclude and self.exclude.search(url):
+            return EXCLUDED
+
+        if not self.has_includes:
+            return None
+
+        hostname = url_hostname(url)
+        if self.domains and self.domains.match(hostname):
+            return None
+
+        if self.include and self.include.match(url):
+            return None
+
+        if self.surts or self.rules:
+            url_surt = surt(url)
+            if self.surts and self.match_surt(url_surt):
+                return None
+
+            for rule in self.rules:
+                if rule.applies(url, hostname, url_surt):
+                    return None
+
+        return NOT_INCLUDED
+
+    def filter(
+        self, entries: Iterable[Tuple[str, int, int]]
+    ) -> List[Tuple[str, int, int]]:
+        """Returns the (url, depth, priority) entries that are in scope
+
+        :param entries: The entries to be checked
+        :return: The entries in scope
+        """
+        if self.empty:
+            return list(entries)
+        return [entry for entry in entries if self.check(entry[0], entry[1]) is None]
+
+
+@lru_cache(maxsize=256)
+def compile_scopes(scopes: FrozenSet[str]) -> ScopeEngine:
+    """Returns the compiled scope engine for the supplied json encoded
+    scope rules (the members of a:{id}:scope), cached by rules
+
+    :param scopes: The json encoded scope rules
+    :return: The scope engine
+    :raises ValueError: If a rule is invalid
+    """
+    rules = []
+    for scope in scopes:
+        try:
+            rules.append(json.loads(scope))
+        except ValueError:
+            rules.append(None)
+
+    return ScopeEngine(rules)
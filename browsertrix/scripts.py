@@ -0,0 +1,186 @@
+__all__ = ['OVERFLOW_HOSTS', 'QUEUE_URLS', 'RELEASE_LOCK', 'SCHEDULE_HOSTS']
+
+# Adds a chunk of urls to a seen set and pushes those not seen before
+# to the frontier, atomically (see Crawl._queue_chunk).
+#
+# KEYS: the seen set key, the seen counter key (bloom mode), the push key
+# (the frontier, or the hosts set of a host scheduler), the push counter
+# key (host scheduler) and, with a host scheduler, the sub-queue key of
+# each url
+#
+# ARGV: the seen mode (sadd or setbit), the push mode (rpush or zadd,
+# prefixed with hosts: for a host scheduler), the current time, the
+# number of seen and of push arguments of each url and then, for each
+# url, its seen arguments (the set member or the bloom filter bit
+# offsets) followed by its push arguments (the url request or the score
+# and url request, preceded by the host for a host scheduler)
+#
+# Returns a list with 1 for each new url and 0 for each url seen before
+QUEUE_URLS = """
+local seen_mode, push_mode, now = ARGV[1], ARGV[2], ARGV[3]
+local seen_argc, push_argc = tonumber(ARGV[4]), tonumber(ARGV[5])
+local by_host = push_mode:sub(1, 6) == 'hosts:'
+if by_host then
+    push_mode = push_mode:sub(7)
+end
+
+local results = {}
+local num_added = 0
+local n = 0
+
+for i = 6, #ARGV, seen_argc + push_argc do
+    n = n + 1
+    local new = 0
+    if seen_mode == 'setbit' then
+        for j = i, i + seen_argc - 1 do
+            if redis.call('setbit', KEYS[1], ARGV[j], 1) == 0 then
+                new = 1
+            end
+        end
+    else
+        new = redis.call('sadd', KEYS[1], ARGV[i])
+    end
+
+    if new == 1 then
+        local p = i + seen_argc
+        local key = KEYS[3]
+        if by_host then
+            key = KEYS[4 + n]
+            redis.call('zadd', KEYS[3], 'NX', now, ARGV[p])
+            p = p + 1
+        end
+        if push_mode == 'zadd' then
+            redis.call('zadd', key, ARGV[p], ARGV[p + 1])
+        else
+            redis.call('rpush', key, ARGV[p])
+        end
+        num_added = num_added + 1
+    end
+    results[n] = new
+end
+
+if num_added > 0 then
+    if seen_mode == 'setbit' then
+        redis.call('incrby', KEYS[2], num_added)
+    end
+    if by_host then
+        redis.call('incrby', KEYS[4], num_added)
+    end
+end
+
+return results
+"""
+
+# Moves the first url of each supplied host sub-queue to the frontier,
+# atomically (see HostScheduler.schedule). A host that is no longer
+# ready (eg. released at the same time by another replica) is skipped,
+# a host with an empty sub-queue is removed and the others may next be
+# crawled after the host delay.
+#
+# KEYS: the hosts set, the host sub-queues counter and frontier keys,
+# then the sub-queue key of each host
+#
+# ARGV: the frontier mode (rpush or zadd), the current time, the time
+# the released hosts may next be crawled, then the hosts
+#
+# Returns the list of hosts a url was moved to the frontier from
+SCHEDULE_HOSTS = """
+local mode, now, next_time = ARGV[1], tonumber(ARGV[2]), ARGV[3]
+local released = {}
+
+for i = 4, #ARGV do
+    local host, key = ARGV[i], KEYS[i]
+    local score = redis.call('zscore', KEYS[1], host)
+    if score and tonumber(score) <= now then
+        local url_req = false
+        if mode == 'zadd' then
+            local first = redis.call('zrange', key, 0, 0, 'WITHSCORES')
+            if first[1] then
+                url_req = first[1]
+                redis.call('zrem', key, url_req)
+                redis.call('zadd', KEYS[3], first[2], url_req)
+            end
+        else
+            url_req = redis.call('lpop', key)
+            if url_req then
+                redis.call('rpush', KEYS[3], url_req)
+            end
+        end
+
+        if url_req then
+            redis.call('zadd', KEYS[1], next_time, host)
+            released[#released + 1] = host
+        else
+            redis.call('zrem', KEYS[1], host)
+        end
+    end
+end
+
+if #released > 0 then
+    redis.call('decrby', KEYS[2], #released)
+end
+
+return released
+"""
+
+# Moves the supplied urls from the frontier back to their host
+# sub-queues, atomically (see HostScheduler.schedule). An url that is
+# no longer in the frontier (eg. moved at the same time by another
+# replica or already popped by a browser) is skipped. The urls keep
+# their frontier score, the hosts not scheduled yet may be crawled now.
+#
+# KEYS: the hosts set, the host sub-queues counter and frontier keys,
+# then the sub-queue key of each url
+#
+# ARGV: the frontier mode (rpush or zadd), the current time, then the
+# url request, score and host of each url
+#
+# Returns the number of urls moved
+OVERFLOW_HOSTS = """
+local mode, now = ARGV[1], ARGV[2]
+local moved = 0
+local n = 0
+
+for i = 3, #ARGV, 3 do
+    n = n + 1
+    local url_req, score, host = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    local key = KEYS[3 + n]
+    if mode == 'zadd' then
+        if redis.call('zrem', KEYS[3], url_req) == 1 then
+            redis.call('zadd', key, score, url_req)
+            moved = moved + 1
+        else
+            host = false
+        end
+    elseif redis.call('lrem', KEYS[3], -1, url_req) == 1 then
+        redis.call('rpush', key, url_req)
+        moved = moved + 1
+    else
+        host = false
+    end
+
+    if host then
+        redis.call('zadd', KEYS[1], 'NX', now, host)
+    end
+end
+
+if moved > 0 then
+    redis.call('incrby', KEYS[2], moved)
+end
+
+return moved
+"""
+
+# Deletes a lock key only if it still holds the supplied token, ie. the
+# lock was not expired and taken by another holder since.
+#
+# KEYS: the lock key
+# ARGV: the token of the holder
+#
+# Returns 1 if the lock was released, otherwise 0
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import math
+from hashlib import blake2b
+from typing import Callable, List, Optional, Set, Tuple
+
+from aioredis import Redis
+
+from .schema import CrawlInfo, SeenMode
+
+__all__ = [
+    'BloomSeenSet',
+    'FingerprintSeenSet',
+    'UrlSeenSet',
+    'seen_set_for',
+    'url_fingerprint',
+]
+
+# Redis bitmaps are limited to 512MB
+MAX_BLOOM_BITS = 2**32
+
+
+def url_fingerprint(url: str) -> int:
+    """Returns a signed 64-bit fingerprint of the supplied URL.
+
+    Redis stores set members that fit in a signed 64-bit integer
+    as integers instead of strings
+
+    :param url: The URL to fingerprint
+    :return: The fingerprint of the URL
+    """
+    digest = blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+# ============================================================================
+class UrlSeenSet:
+    """Seen set storing each full URL as a member of a Redis set"""
+
+    __slots__ = ['key']
+
+    # can the seen URLs be listed
+    listable: bool = True
+
+    # the seen mode of the queue urls script (see scripts.QUEUE_URLS)
+    script_mode: str = 'sadd'
+
+    def __init__(self, key: str) -> None:
+        self.key: str = key
+
+    @property
+    def keys(self) -> List[str]:
+        """The redis keys used by this seen set"""
+        return [self.key]
+
+    def member(self, url: str) -> str:
+        """Returns the set member stored for the supplied URL
+
+        :param url: The URL to be added
+        :return: The set member for the URL
+        """
+        return url
+
+    @property
+    def script_keys(self) -> List[str]:
+        """The seen set and counter keys of the queue urls script"""
+        return [self.key, self.key]
+
+    def script_args(self, url: str) -> List:
+        """Returns the queue urls script arguments adding the supplied
+        URL to this seen set
+
+        :param url: The URL to be added
+        :return: The list of arguments
+        """
+        return [self.member(url)]
+
+    async def count(self, redis: Redis) -> int:
+        """Returns the number of URLs in this seen set
+
+        :param redis: The redis instance
+        :return: The number of URLs seen
+        """
+        return int(await redis.scard(self.key))
+
+    def queue_count(self, tr) -> Callable[[], int]:
+        """Queues the command counting the URLs in this seen set on the
+        supplied pipeline or transaction
+
+        :param tr: The redis pipeline or transaction
+        :return: A callable, valid once the pipeline has been executed,
+        that returns the number of URLs seen
+        """
+        fut = tr.scard(self.key)
+        return lambda: int(fut.result())
+
+    async def members(self, redis: Redis) -> Optional[Set[str]]:
+        """Returns the URLs in this seen set, if they are stored
+
+        :param redis: The redis instance
+        :return: The set of URLs seen or None
+        """
+        members: Set[str] = await redis.smembers(self.key)
+        return members
+
+    async def scan(
+        self, redis: Redis, cursor: int, count: int, match: Optional[str] = None
+    ) -> Tuple[int, List[str]]:
+        """Incrementally iterates the URLs in this seen set (SSCAN),
+        only supported if listable
+
+        :param redis: The redis instance
+        :param cursor: The scan cursor, 0 to start
+        :param count: The number of members to scan (a hint)
+        :param match: Optional glob-style pattern the URLs must match
+        :return: The next cursor (0 when done) and the scanned URLs
+        """
+        cursor, urls = await redis.sscan(self.key, cursor, match=match, count=count)
+        return cursor, urls
+
+
+# ============================================================================
+class FingerprintSeenSet(UrlSeenSet):
+    """Seen set storing a 64-bit fingerprint of each URL as a member of
+    a Redis set. The URLs themselves can not be listed
+    """
+
+    __slots__ = []
+
+    listable: bool = False
+
+    def member(self, url: str) -> str:
+        return str(url_fingerprint(url))
+
+    async def members(self, redis: Redis) -> Optional[Set[str]]:
+        return None
+
+
+# ============================================================================
+class BloomSeenSet(UrlSeenSet):
+    """Seen set backed by a Bloom filter stored in a Redis bitmap.
+
+    The size of the bitmap and the number of hash functions are derived
+    from the expected number of URLs (capacity) and the acceptable
+    false positive rate. A false positive causes a new URL to be
+    treated as already seen. The number of URLs added is kept in a
+    separate counter key
+    """
+
+    __slots__ = ['count_key', 'num_bits', 'num_hashes']
+
+    listable: bool = False
+
+    script_mode: str = 'setbit'
+
+    def __init__(self, key: str, capacity: int, error_rate: float) -> None:
+        super().__init__(key)
+        self.count_key: str = f'{key}:count'
+
+        capacity = max(capacity, 1)
+        error_rate = min(max(error_rate, 1e-9), 0.5)
+
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_bits: int = min(num_bits, MAX_BLOOM_BITS)
+        self.num_hashes: int = max(round(self.num_bits / capacity * math.log(2)), 1)
+
+    @property
+    def keys(self) -> List[str]:
+        return [self.key, self.count_key]
+
+    def offsets(self, url: str) -> List[int]:
+        """Returns the bit offsets for the supplied URL, using double
+        hashing of a 128-bit digest
+
+        :param url: The URL to be hashed
+        :return: The list of bit offsets
+        """
+        digest = blake2b(url.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    @property
+    def script_keys(self) -> List[str]:
+        return [self.key, self.count_key]
+
+    def script_args(self, url: str) -> List:
+        return self.offsets(url)
+
+    async def count(self, redis: Redis) -> int:
+        return int(await redis.get(self.count_key) or 0)
+
+    def queue_count(self, tr) -> Callable[[], int]:
+        fut = tr.get(self.count_key)
+        return lambda: int(fut.result() or 0)
+
+    async def members(self, redis: Redis) -> Optional[Set[str]]:
+        return None
+
+
+def seen_set_for(key: str, model: Optional[CrawlInfo]) -> UrlSeenSet:
+    """Returns the seen set implementation for the seen mode
+    of the supplied crawl info
+
+    :param key: The redis key of the seen set
+    :param model: The crawl info
+    :return: The seen set
+    """
+    mode = model.seen_mode if model else SeenMode.URL
+    if mode == SeenMode.FINGERPRINT:
+        return FingerprintSeenSet(key)
+    if mode == SeenMode.BLOOM:
+        return BloomSeenSet(key, model.seen_capacity, model.seen_error_rate)
+    return UrlSeenSet(key)
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import logging
+import random
+import time
+from asyncio import (
+    AbstractEventLoop,
+    TimeoutError as AsyncTimeoutError,
+    sleep as aio_sleep,
+)
+from bisect import bisect_left
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import ujson as json
+from aiohttp import (
+    AsyncResolver,
+    ClientError,
+    ClientResponseError,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
+from starlette.exceptions import HTTPException
+
+__all__ = ['CircuitBreaker', 'LatencyHistogram', 'ShepherdClient', 'endpoint_name']
+
+logger = logging.getLogger('browsertrix')
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# shepherd endpoints that can safely be retried: they act on an
+# existing flock, unlike /flock/request which creates a new one
+IDEMPOTENT_ENDPOINTS = ('/flock/start', '/flock/stop', '/flock/remove')
+
+
+def endpoint_name(url_path: str) -> str:
+    """Returns the endpoint of the supplied shepherd api path,
+    without the flock request id or query
+
+    :param url_path: The path of the request (eg. /flock/start/<reqid>)
+    :return: The endpoint (eg. /flock/start)
+    """
+    path = url_path.split('?', 1)[0]
+    return '/' + '/'.join(path.strip('/').split('/')[:2])
+
+
+# ============================================================================
+class LatencyHistogram:
+    """Cumulative histogram of request latencies"""
+
+    __slots__ = ['buckets', 'counts', 'count', 'sum']
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Records one request latency
+
+        :param seconds: The latency of the request
+        """
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def snapshot(self) -> Dict:
+        """Returns the count and sum of the recorded latencies and the
+        cumulative count of each bucket (keyed by its upper bound)
+
+        :return: The histogram data
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+# ============================================================================
+class CircuitBreaker:
+    """Fails requests fast after a run of consecutive failures.
+
+    After failure_threshold consecutive failures the circuit opens and
+    requests are rejected for reset_timeout seconds. One trial request
+    is then let through (half-open): its success closes the circuit,
+    its failure opens it again. A trial that ends without either (eg.
+    it is cancelled), or that is still running after trial_timeout
+    seconds, lets another trial through
+    """
+
+    __slots__ = [
+        'failure_threshold',
+        'reset_timeout',
+        'trial_timeout',
+        'failures',
+        'opened_at',
+        'trial_at',
+    ]
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        trial_timeout: Optional[float] = None,
+    ) -> None:
+        self.failure_threshold: int = max(failure_threshold, 1)
+        self.reset_timeout: float = reset_timeout
+        self.trial_timeout: float = (
+            reset_timeout if trial_timeout is None else trial_timeout
+        )
+        self.failures: int = 0
+        self.opened_at: Optional[float] = None
+        self.trial_at: Optional[float] = None
+
+    @property
+    def trial(self) -> bool:
+        """Is a trial request running"""
+        return (
+            self.trial_at is not None
+            and time.monotonic() - self.trial_at < self.trial_timeout
+        )
+
+    @property
+    def state(self) -> str:
+        """The state of the circuit: closed, open or half-open"""
+        if self.opened_at is None:
+            return 'closed'
+        if self.trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Returns true if a request may be made
+
+        :return: T/F indicating if the request may be made
+        """
+        state = self.state
+        if state == 'closed':
+            return True
+
+        if state == 'half-open' and not self.trial:
+            self.trial_at = time.monotonic()
+            return True
+
+        return False
+
+    def success(self) -> None:
+        """Records a successful request, closing the circuit"""
+        self.failures = 0
+        self.opened_at = None
+        self.trial_at = None
+
+    def failure(self) -> None:
+        """Records a failed request, opening the circuit after too many"""
+        self.failures += 1
+        trial = self.trial_at is not None
+        if trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None or trial:
+                logger.warning('Shepherd circuit breaker opened')
+            self.opened_at = time.monotonic()
+            self.trial_at = None
+
+    def abort(self, started: float) -> None:
+        """Records a request that ended without a result (eg. it was
+        cancelled), letting another trial through if it was the trial
+
+        :param started: The time.monotonic() time the request started
+        """
+        if self.trial_at is not None and self.trial_at <= started:
+            self.trial_at = None
+
+
+# ============================================================================
+class ShepherdClient:
+    """Client of the shepherd api.
+
+    Requests are made over a pool of keep-alive connections with a
+    timeout per call. Failed calls to idempotent endpoints are retried
+    with a jittered exponential backoff, the latency of each call is
+    recorded per endpoint, and a circuit breaker fails calls fast while
+    shepherd is unavailable
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        loop: AbstractEventLoop,
+        pool_size: int = 100,
+        timeout: float = 30.0,
+        retries: int = 2,
+        retry_backoff: float = 0.2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.api_url: str = api_url
+        self.timeout: ClientTimeout = ClientTimeout(total=timeout)
+        self.retries: int = retries
+        self.retry_backoff: float = retry_backoff
+        self.breaker: CircuitBreaker = CircuitBreaker(
+            failure_threshold, reset_timeout, trial_timeout=timeout
+        )
+        self.latencies: Dict[str, LatencyHistogram] = {}
+
+        self.session: ClientSession = ClientSession(
+            connector=TCPConnector(
+                resolver=AsyncResolver(loop=loop),
+                limit=pool_size,
+                keepalive_timeout=60,
+                loop=loop,
+            ),
+            json_serialize=partial(json.dumps, ensure_ascii=False),
+            timeout=self.timeout,
+            loop=loop,
+        )
+
+    async def close(self) -> None:
+        """Closes the connection pool"""
+        await self.session.close()
+
+    async def post(self, url_path: str, post_data: Optional[Dict] = None) -> Dict:
+        """Makes an HTTP post request to the supplied shepherd api path
+
+        :param url_path: The path of the request
+        :param post_data: Optional post request body
+        :return: The response body
+        """
+        endpoint = endpoint_name(url_path)
+        attempts = 1 + (self.retries if endpoint in IDEMPOTENT_ENDPOINTS else 0)
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise HTTPException(503, 'shepherd unavailable')
+
+            start = time.monotonic()
+            try:
+                res = await self._post(url_path, post_data)
+            except (ClientError, AsyncTimeoutError, ValueError) as e:
+                self.record(endpoint, time.monotonic() - start)
+                self.breaker.failure()
+
+                text = str(e) or type(e).__name__
+                logger.debug(text)
+                if attempt + 1 >= attempts:
+                    raise HTTPException(400, text)
+
+                await aio_sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                # eg. cancelled, a trial request must not stay in flight
+                self.breaker.abort(start)
+                raise
+
+            self.record(endpoint, time.monotonic() - start)
+            self.breaker.success()
+            logger.debug(str(res))
+            return res
+
+        # not reached, the last attempt returns or raises
+        raise HTTPException(400, 'shepherd request failed')
+
+    async def _post(self, url_path: str, post_data: Optional[Dict]) -> Dict:
+        """Makes a single HTTP post request, raising on server errors
+
+        :param url_path: The path of the request
+        :param post_data: Optional post request body
+        :return: The response body
+        """
+        url = self.api_url + url_path
+        async with self.session.post(url, json=post_data) as res:
+            if res.status >= 500:
+                raise ClientResponseError(
+                    res.request_info, res.history, status=res.status, message=res.reason
+                )
+            data: Dict = await res.json(content_type=None)
+            return data
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the delay before the retry following the supplied attempt
+
+        :param attempt: The number of the failed attempt, from 0
+        :return: The delay in seconds (full jitter)
+        """
+        return random.uniform(0, self.retry_backoff * (2**attempt))
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        """Records the latency of a request to the supplied endpoint
+
+        :param endpoint: The endpoint of the request
+        :param seconds: The latency of the request
+        """
+        histogram = self.latencies.get(endpoint)
+        if histogram is None:
+            histogram = self.latencies[endpoint] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def stats(self) -> Dict:
+        """Returns the state of the circuit breaker and the latency
+        histogram of each endpoint
+
+        :return: The client stats
+        """
+        return {
+            'circuit': self.breaker.state,
+            'latency': {
+                endpoint: histogram.snapshot()
+                for endpoint, histogram in sorted(self.latencies.items())
+            },
+        }
@@ -1,15 +1,64 @@
-from asyncio import AbstractEventLoop
+import re
+import zlib
+from asyncio import AbstractEventLoop, Semaphore, gather as aio_gather
 from os import environ
-from typing import Any, Dict, Optional, Type, Union
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Type,
+    Union,
+)
 from urllib.parse import urlsplit
 
-from aioredis import Redis, create_redis
-from ujson import loads as ujson_loads
+from aioredis import Redis, create_redis, create_redis_pool
+from ujson import dumps as ujson_dumps, loads as ujson_loads
 
-__all__ = ['env', 'extract_domain', 'init_redis']
+from .domains import registered_domain
 
+__all__ = [
+    'chunked',
+    'env',
+    'extract_domain',
+    'gather_limited',
+    'glob_escape',
+    'init_redis',
+    'ndjson_stream',
+    'request_url',
+    'url_matcher',
+    'url_request',
+]
+
+GLOB_SPECIAL_RX = re.compile(r'([\\*?\[\]])')
+
+# the host of an absolute url (ipv6 hosts are left to urlsplit)
+URL_HOST_RX = re.compile(r'^[A-Za-z][A-Za-z0-9+.-]*://(?:[^/?#@]*@)?([^/?#:\[]+)')
+
+
+async def init_redis(
+    redis_url: str, loop: AbstractEventLoop, pool_size: int = 1
+) -> Redis:
+    """Returns a redis client for the supplied url: with a single connection,
+    or a pool of up to pool_size connections if pool_size is greater than one
+
+    :param redis_url: The url of the redis server
+    :param loop: The event loop
+    :param pool_size: The maximum number of connections
+    :return: The redis client
+    """
+    if pool_size > 1:
+        return await create_redis_pool(
+            redis_url, encoding='utf-8', minsize=1, maxsize=pool_size, loop=loop
+        )
 
-async def init_redis(redis_url: str, loop: AbstractEventLoop) -> Redis:
     return await create_redis(redis_url, encoding='utf-8', loop=loop)
 
 
@@ -17,7 +66,7 @@ def env(
     key: str,
     type_: Type[Union[str, bool, int, dict, float]] = str,
     default: Optional[Any] = None,
-) -> Union[str, int, bool, float, Dict]:
+) -> Any:
     """Returns the value of the supplied env key name converting
     the env key's value to the specified type.
 
@@ -65,13 +114,142 @@ def env(
     elif type_ == dict:
         return ujson_loads(val)
 
+    raise ValueError(f'Unsupported type for environment variable "{key}": {type_}')
+
 
 def extract_domain(url: str) -> str:
-    """Extracts and returns the domain, including the suffix,
-    of the supplied URL
+    """Extracts and returns the registered domain (the public suffix and
+    one more label, see registered_domain) of the supplied URL, so that
+    subdomains, ports and user info do not change the domain
 
     :param url: The url to have its domain extracted from
     :return: The extracted domain
     """
-    extracted = urlsplit(url).netloc
-    return extracted.replace('www.', '')
+    m = URL_HOST_RX.match(url)
+    if m and m.group(1):
+        hostname = m.group(1).lower()
+    else:
+        try:
+            hostname = urlsplit(url).hostname
+        except ValueError:
+            return ''
+    return registered_domain(hostname) if hostname else ''
+
+
+def chunked(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Splits the supplied iterable into lists of at most size items
+
+    :param iterable: The iterable to be split
+    :param size: The maximum number of items per chunk
+    :return: An iterator over the chunks
+    """
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def gather_limited(
+    func: Callable[[Any], Awaitable[Any]], items: Iterable[Any], limit: int
+) -> List[Any]:
+    """Calls the supplied coroutine function with each item, running
+    at most limit calls concurrently.
+
+    Exceptions raised by a call are returned in place of its result
+
+    :param func: The coroutine function to be called
+    :param items: The items to call the function with
+    :param limit: The maximum number of concurrent calls
+    :return: The list of results, in the order of the items
+    """
+    semaphore = Semaphore(max(limit, 1))
+
+    async def call(item: Any) -> Any:
+        async with semaphore:
+            return await func(item)
+
+    results: List[Any] = await aio_gather(
+        *(call(item) for item in items), return_exceptions=True
+    )
+    return results
+
+
+def request_url(url_req: str) -> str:
+    """Returns the URL of a queued or pending entry, which is either
+    a json encoded url request or a plain URL
+
+    :param url_req: The queued or pending entry
+    :return: The URL of the entry
+    """
+    try:
+        url: str = ujson_loads(url_req)['url']
+        return url
+    except (ValueError, TypeError, KeyError):
+        return url_req
+
+
+def url_request(url_req: str) -> Dict[str, Any]:
+    """Returns a queued or pending entry, which is either a json encoded
+    url request or a plain URL, as an url request dictionary
+
+    :param url_req: The queued or pending entry
+    :return: The url request
+    """
+    try:
+        req = ujson_loads(url_req)
+    except ValueError:
+        req = None
+    return req if isinstance(req, dict) else {'url': url_req}
+
+
+def glob_escape(value: str) -> str:
+    """Escapes the redis glob-style pattern characters of the supplied value
+
+    :param value: The value to be escaped
+    :return: The escaped value
+    """
+    return GLOB_SPECIAL_RX.sub(r'\\\1', value)
+
+
+def url_matcher(prefix: str = '', regex: str = '') -> Callable[[str], bool]:
+    """Returns a function that checks if a URL starts with the supplied
+    prefix and matches (re.search) the supplied regex
+
+    :param prefix: The required URL prefix, if any
+    :param regex: The regex URLs must match, if any
+    :return: The matching function
+    :raises re.error: If the regex is invalid
+    """
+    rx = re.compile(regex) if regex else None
+
+    def matches(url: str) -> bool:
+        if prefix and not url.startswith(prefix):
+            return False
+        return rx is None or rx.search(url) is not None
+
+    return matches
+
+
+async def ndjson_stream(
+    batches: AsyncIterable[List[Any]], compress: bool = False
+) -> AsyncIterator[bytes]:
+    """Encodes the items of the supplied batches as newline delimited json,
+    one chunk per batch, optionally gzip compressed
+
+    :param batches: The batches of items to encode
+    :param compress: T/F indicating if the output should be gzip compressed
+    :return: An async iterator over the encoded chunks
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    async for batch in batches:
+        chunk = ''.join(ujson_dumps(item) + '\n' for item in batch).encode('utf-8')
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
@@ -1,4 +1,5 @@
 import click
+import json
 import sys
 
 import requests
@@ -90,15 +91,63 @@ def conn_error_exit(url):
 
 
 # ============================================================================
-def sesh_get(url, prefix=None):
+def sesh_get(url, prefix=None, params=None):
     url = (prefix or settings.server_prefix) + url
     try:
-        res = settings.sesh.get(url)
+        res = settings.sesh.get(url, params=params)
         return ensure_success(res)
     except requests.exceptions.ConnectionError:
         conn_error_exit(url)
 
 
+# ============================================================================
+def sesh_download(url, fh, prefix=None, params=None):
+    """ Stream the response body of a GET request to a file
+
+        :param url: The url path of the request
+        :param fh: The file (opened in binary mode) to write to
+        :param prefix: Optional server prefix (defaults to the Browsertrix server)
+        :param params: Optional query params
+        :return: The number of bytes written
+    """
+    url = (prefix or settings.server_prefix) + url
+    try:
+        with settings.sesh.get(url, params=params, stream=True) as res:
+            if res.status_code != 200:
+                ensure_success(res)
+            size = 0
+            for chunk in res.iter_content(chunk_size=65536):
+                fh.write(chunk)
+                size += len(chunk)
+            return size
+    except requests.exceptions.ConnectionError:
+        conn_error_exit(url)
+
+
+# ============================================================================
+def sesh_events(url, prefix=None):
+    """ Iterate over the server-sent events of a GET request
+
+        :param url: The url path of the request
+        :param prefix: Optional server prefix (defaults to the Browsertrix server)
+        :return: generator of (event name, parsed JSON data) tuples
+    """
+    url = (prefix or settings.server_prefix) + url
+    try:
+        with settings.sesh.get(url, stream=True) as res:
+            if res.status_code != 200:
+                ensure_success(res)
+            event = 'message'
+            for line in res.iter_lines(decode_unicode=True):
+                if line.startswith('event: '):
+                    event = line[len('event: ') :]
+                elif line.startswith('data: '):
+                    yield event, json.loads(line[len('data: ') :])
+                    event = 'message'
+    except requests.exceptions.ConnectionError:
+        conn_error_exit(url)
+
+
 # ============================================================================
 def sesh_post(url, json=None, prefix=None):
     url = (prefix or settings.server_prefix) + url
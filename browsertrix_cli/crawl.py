@@ -15,6 +15,8 @@ from browsertrix_cli.basecli import (
     sesh_get,
     sesh_post,
     sesh_delete,
+    sesh_download,
+    sesh_events,
     settings,
 )
 from browsertrix_cli.profile import get_profile_image
@@ -138,10 +140,18 @@ def open_browsers(browsers, crawl_id, tabs_done=None, num_tabs=-1):
 
 # ============================================================================
 @crawl.command(name='list', help='List all crawls')
-def list_crawls():
+@click.option(
+    '--status',
+    type=click.Choice(['new', 'queued', 'running', 'stopped', 'done']),
+    help='Only list crawls with this status',
+)
+def list_crawls(status):
     """ List all available crawls
+
+        :param status: Optional status of the crawls to list
     """
-    res = sesh_get('/crawls')
+    params = {'status': status} if status else None
+    res = sesh_get('/crawls', params=params)
 
     sorted_list = sorted(res['crawls'], key=lambda x: x['start_time'], reverse=True)
 
@@ -347,21 +357,191 @@ def start_crawl(crawl_id, browser, headless, behavior_time):
     default=False,
     help='Get detailed info on crawl, listing all urls',
 )
-def get_info(crawl_id, urls):
+@click.option(
+    '--url-set',
+    type=click.Choice(['queue', 'pending', 'seen']),
+    default=None,
+    help='With --urls, list only one page of the queued, pending or seen urls',
+)
+@click.option(
+    '--limit', type=int, default=100, help='Max number of urls per page (--url-set)'
+)
+@click.option(
+    '--cursor',
+    type=str,
+    default='0',
+    help='Cursor of the page to list, as returned for the previous page (--url-set)',
+)
+@click.option(
+    '--prefix', type=str, default='', help='List only urls with this prefix (--url-set)'
+)
+@click.option(
+    '--regex',
+    type=str,
+    default='',
+    help='List only urls matching this regex (--url-set)',
+)
+def get_info(crawl_id, urls, url_set, limit, cursor, prefix, regex):
     """ Get info on existing crawl(s)
 
         :param crawl_id: list of crawl ids to get info on
         :param urls: Get detailed info on crawl, listing all urls
+        :param url_set: List only one page of the queued, pending or seen urls
+        :param limit: Max number of urls per page
+        :param cursor: Cursor of the page to list
+        :param prefix: List only urls with this prefix
+        :param regex: List only urls matching this regex
     """
+    params = None
+    if url_set:
+        params = {
+            'url_set': url_set,
+            'limit': limit,
+            'cursor': cursor,
+            'prefix': prefix,
+            'regex': regex,
+        }
+
     for id_ in crawl_id:
         if urls:
-            res = sesh_get('/crawl/{0}/info'.format(id_))
+            res = sesh_get('/crawl/{0}/info'.format(id_), params=params)
         else:
             res = sesh_get('/crawl/{0}'.format(id_))
 
         print(yaml.dump(res))
 
 
+# ============================================================================
+@crawl.command(name='export', help='Export the urls of a crawl to an NDJSON file')
+@click.argument('crawl_id', nargs=1)
+@click.option(
+    '--url-set',
+    type=click.Choice(['queue', 'pending', 'seen']),
+    default='seen',
+    help='Export the queued, pending or seen (default) urls',
+)
+@click.option(
+    '--prefix', type=str, default='', help='Export only urls with this prefix'
+)
+@click.option(
+    '--regex', type=str, default='', help='Export only urls matching this regex'
+)
+@click.option(
+    '--gzip', is_flag=True, default=False, type=bool, help='Gzip compress the export'
+)
+@click.option(
+    '-o',
+    '--output',
+    type=click.File('wb'),
+    default=None,
+    help='File to write to, defaults to <crawl_id>-<url_set>.ndjson[.gz]',
+)
+def export_crawl(crawl_id, url_set, prefix, regex, gzip, output):
+    """ Export the urls of a crawl to an NDJSON file
+
+        :param crawl_id: The crawl to export urls from
+        :param url_set: Export the queued, pending or seen urls
+        :param prefix: Export only urls with this prefix
+        :param regex: Export only urls matching this regex
+        :param gzip: Gzip compress the export
+        :param output: File to write to
+    """
+    if output is None:
+        filename = '{0}-{1}.ndjson'.format(crawl_id, url_set)
+        if gzip:
+            filename += '.gz'
+        output = open(filename, 'wb')
+
+    params = {'url_set': url_set, 'prefix': prefix, 'regex': regex, 'gzip': gzip}
+
+    with output:
+        size = sesh_download(
+            '/crawl/{0}/urls/export'.format(crawl_id), output, params=params
+        )
+
+    if is_quiet():
+        print(output.name)
+    else:
+        print(
+            'Exported {0} urls of crawl {1} to {2} ({3} bytes)'.format(
+                url_set, crawl_id, output.name, size
+            )
+        )
+
+
+# ============================================================================
+@crawl.command(name='checkpoint', help='Checkpoint one or more existing crawls')
+@click.argument('crawl_id', nargs=-1)
+def checkpoint_crawl(crawl_id):
+    """ Checkpoint one or more existing crawls
+
+        :param crawl_id: list of crawl ids to checkpoint
+    """
+    for id_ in crawl_id:
+        res = sesh_post('/crawl/{0}/checkpoint'.format(id_))
+
+        if is_quiet():
+            print(res['checkpoint'])
+        else:
+            print(
+                'Checkpointed Crawl {0} to {1} ({2} bytes)'.format(
+                    id_, res['checkpoint'], res['size']
+                )
+            )
+
+
+# ============================================================================
+@crawl.command(name='restore', help='Restore a crawl from a checkpoint')
+@click.argument('checkpoint', nargs=1)
+def restore_crawl(checkpoint):
+    """ Restore a crawl from a checkpoint
+
+        :param checkpoint: The name of the checkpoint file
+    """
+    res = sesh_post('/crawls/restore', json={'checkpoint': checkpoint})
+
+    if is_quiet():
+        print(res['id'])
+    else:
+        print('Restored Crawl {0} ({1})'.format(res['id'], res['status']))
+
+
+# ============================================================================
+@crawl.command(name='progress', help='Follow the live progress of a crawl')
+@click.argument('crawl_id', nargs=1)
+def crawl_progress(crawl_id):
+    """ Follow the live progress of a crawl, until it is done
+
+        :param crawl_id: The crawl to follow
+    """
+    for event, data in sesh_events('/crawl/{0}/events'.format(crawl_id)):
+        if is_quiet():
+            continue
+
+        if event == 'info':
+            print(
+                'Crawl {0}: {1}, to crawl: {2}, pending: {3}, seen: {4}'.format(
+                    crawl_id,
+                    data['status'],
+                    data['num_queue'],
+                    data['num_pending'],
+                    data['num_seen'],
+                )
+            )
+        elif event == 'status':
+            print('Status: {0}'.format(data['status']))
+        elif event == 'counts':
+            print(
+                'To crawl: {0}, pending: {1}, seen: {2}'.format(
+                    data['num_queue'], data['num_pending'], data['num_seen']
+                )
+            )
+        elif event == 'tab_done':
+            print('Tab done: {0}'.format(data))
+        elif event == 'deleted':
+            print('Crawl {0} was removed'.format(crawl_id))
+
+
 # ============================================================================
 @crawl.command(name='watch', help='Watch crawling browsers in local browser')
 @click.argument('crawl_id', nargs=-1)
@@ -442,18 +622,46 @@ def remove_crawl(crawl_id):
 
 # ============================================================================
 @crawl.command(name='remove-all', help='Stop and remove all crawls')
-def remove_all():
+@click.option(
+    '--status',
+    type=click.Choice(['new', 'queued', 'running', 'stopped', 'done']),
+    help='Only remove crawls with this status',
+)
+def remove_all(status):
     """ Stop and remove all crawls
+
+        :param status: Optional status of the crawls to remove
     """
-    res = sesh_get('/crawls')
+    url = '/crawls?status={0}'.format(status) if status else '/crawls'
+    res = sesh_delete(url)
+    if not res:
+        return
 
-    crawls = res['crawls']
+    for error in res['errors']:
+        print('Error removing {0}: {1}'.format(error['id'], error['error']))
 
-    for crawl in crawls:
-        id_ = crawl['id']
-        res = sesh_delete('/crawl/{0}'.format(id_))
-        if not is_quiet():
-            print('Removed Crawl: {0}'.format(id_))
+    if not is_quiet():
+        print('Removed {0} Crawls'.format(res['num_deleted']))
+
+
+# ============================================================================
+@crawl.command(
+    name='migrate-keys',
+    help='Move the Redis keys of all crawls to the cluster compatible key layout',
+)
+def migrate_keys():
+    """ Move the Redis keys of all crawls to the hash tagged key layout
+        (requires REDIS_KEY_HASH_TAGS on the server). Running crawls are stopped
+    """
+    res = sesh_post('/crawls/migrate-keys')
+    if not res:
+        return
+
+    for id_ in res['stopped']:
+        print('Stopped Crawl {0}, start it again to resume'.format(id_))
+
+    if not is_quiet():
+        print('Migrated {0} Crawls'.format(res['num_migrated']))
 
 
 # ============================================================================
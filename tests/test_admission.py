@@ -0,0 +1,252 @@
+import asyncio
+import time
+
+import pytest
+import ujson as json
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+broken_reqids = set()
+
+removed_reqids = []
+
+
+async def broken_coll_shepherd_api(self, url_path, post_data=None):
+    """shepherd api stand-in that fails to start the flocks requested for
+    the broken collection
+    """
+    res = await fake_shepherd_api(self, url_path, post_data)
+    reqid = url_path.rsplit('/', 1)[-1]
+
+    if 'flock/request' in url_path:
+        if post_data['user_params']['coll'] == 'broken':
+            broken_reqids.add(res['reqid'])
+    elif 'flock/start' in url_path and reqid in broken_reqids:
+        return {'error': 'start_failed'}
+    elif 'flock/remove' in url_path:
+        removed_reqids.append(reqid)
+
+    return res
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestAdmission:
+    crawl_ids = {}
+
+    def create(self, name, **params):
+        params.setdefault('seed_urls', ['https://example.com/'])
+        res = self.client.post('/crawls', json=dict(params, name=name)).json()
+        TestAdmission.crawl_ids[name] = res['id']
+        return res
+
+    def info(self, name):
+        return self.client.get(f'/crawl/{self.crawl_ids[name]}').json()
+
+    def test_create_within_budget(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.browser_budget = 4
+
+        assert self.create('A', num_browsers=2)['status'] == 'running'
+        assert self.create('B', num_browsers=2)['status'] == 'running'
+        assert run(crawl_man.browsers_in_use()) == 4
+
+    def test_create_queued(self):
+        res = self.create('C', num_browsers=2)
+        assert res['status'] == 'queued'
+        assert res['browsers'] == []
+
+        assert self.create('D', num_browsers=1, priority=5)['status'] == 'queued'
+
+        info = self.info('C')
+        assert info['status'] == 'queued'
+        assert info['start_time'] == 0
+
+        res = self.client.get('/crawls', params={'status': 'queued'}).json()
+        assert res['total'] == 2
+
+    def test_over_budget(self):
+        res = self.client.post('/crawls', json={'num_browsers': 5})
+        assert res.status_code == 400
+        assert res.json()['detail'] == 'num_browsers exceeds the browser budget of 4'
+
+    def test_admit_by_priority(self):
+        from browsertrix.api import crawl_man
+
+        assert run(crawl_man.admit_crawls()) == 0
+
+        self.client.post(f'/crawl/{self.crawl_ids["A"]}/stop')
+
+        # D has a higher priority, C does not fit anymore
+        assert run(crawl_man.admit_crawls()) == 1
+        info = self.info('D')
+        assert info['status'] == 'running'
+        assert len(info['browsers']) == 1
+        assert info['start_time'] > 0
+        assert self.info('C')['status'] == 'queued'
+
+        self.client.post(f'/crawl/{self.crawl_ids["B"]}/stop')
+        assert run(crawl_man.admit_crawls()) == 1
+        info = self.info('C')
+        assert info['status'] == 'running'
+        assert len(info['browsers']) == 2
+
+    def test_start_queued(self):
+        # only one browser left in the budget
+        res = self.client.post(f'/crawl/{self.crawl_ids["A"]}/start').json()
+        assert res['status'] == 'queued'
+
+        res = self.client.post(f'/crawl/{self.crawl_ids["A"]}/start')
+        assert res.json()['detail'] == 'already queued'
+
+    def test_stop_queued(self):
+        from browsertrix.api import crawl_man
+
+        res = self.client.post(f'/crawl/{self.crawl_ids["A"]}/stop').json()
+        assert res['success']
+        assert self.info('A')['status'] == 'stopped'
+        assert run(crawl_man.redis.zcard(crawl_man.admission_key)) == 0
+
+    def test_autoscale_within_budget(self):
+        from browsertrix.api import crawl_man
+
+        res = self.create(
+            'E',
+            num_browsers=1,
+            max_browsers=4,
+            seed_urls=[f'https://example.com/{i}' for i in range(200)],
+        )
+        assert res['status'] == 'running'
+
+        # 4 browsers used by C, D and E: no room to grow
+        assert run(crawl_man.autoscale_crawls()) == 0
+
+    def test_delete(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.delete('/crawls').json()['num_deleted'] == 5
+        crawl_man.browser_budget = 0
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', broken_coll_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestAdmissionRetry:
+    crawl_ids = {}
+
+    def create(self, name, **params):
+        params.setdefault('seed_urls', ['https://example.com/'])
+        res = self.client.post('/crawls', json=dict(params, name=name)).json()
+        TestAdmissionRetry.crawl_ids[name] = res['id']
+        return res
+
+    def info(self, name):
+        return self.client.get(f'/crawl/{self.crawl_ids[name]}').json()
+
+    def retry(self, name):
+        from browsertrix.api import crawl_man
+
+        key = crawl_man.admission_retry_key
+        retry = run(crawl_man.redis.hget(key, self.crawl_ids[name]))
+        return json.loads(retry) if retry else None
+
+    def skip_backoff(self, name):
+        from browsertrix.api import crawl_man
+
+        retry = dict(self.retry(name), retry_at=0)
+        key = crawl_man.admission_retry_key
+        run(crawl_man.redis.hset(key, self.crawl_ids[name], json.dumps(retry)))
+
+    def test_failed_start_does_not_block(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.browser_budget = 2
+
+        assert self.create('F', num_browsers=2)['status'] == 'running'
+        res = self.create('G', num_browsers=1, priority=5, coll='broken')
+        assert res['status'] == 'queued'
+        assert self.create('H', num_browsers=1)['status'] == 'queued'
+
+        self.client.post(f'/crawl/{self.crawl_ids["F"]}/stop')
+
+        # G fails to start, H is admitted after it
+        assert run(crawl_man.admit_crawls()) == 1
+        assert self.info('H')['status'] == 'running'
+
+        info = self.info('G')
+        assert info['status'] == 'queued'
+        assert info['browsers'] == []
+        assert len(broken_reqids) == 1
+        assert removed_reqids == list(broken_reqids)
+
+    def test_retry_backoff(self):
+        from browsertrix.api import crawl_man
+
+        retry = self.retry('G')
+        assert retry['attempts'] == 1
+        assert retry['retry_at'] > time.time()
+
+        # not retried before the backoff
+        assert run(crawl_man.admit_crawls()) == 0
+        assert len(broken_reqids) == 1
+
+        self.skip_backoff('G')
+        assert run(crawl_man.admit_crawls()) == 0
+        assert len(broken_reqids) == 2
+
+        retry = self.retry('G')
+        assert retry['attempts'] == 2
+        assert retry['retry_at'] > time.time() + crawl_man.admission_interval
+
+    def test_retry_then_stop(self):
+        from browsertrix.api import crawl_man
+
+        self.skip_backoff('G')
+        assert run(crawl_man.admit_crawls()) == 0
+
+        assert self.info('G')['status'] == 'stopped'
+        assert len(broken_reqids) == 3
+        assert sorted(removed_reqids) == sorted(broken_reqids)
+
+        assert run(crawl_man.redis.zcard(crawl_man.admission_key)) == 0
+        assert self.retry('G') is None
+
+    def test_lock_not_released_if_taken(self):
+        from browsertrix.api import crawl_man
+
+        async def admit_while_lock_expires():
+            await crawl_man.redis.set(crawl_man.admission_lock_key, 'other')
+            return 0
+
+        with patch.object(crawl_man, '_admit_crawls', admit_while_lock_expires):
+            assert run(crawl_man.admit_crawls()) == 0
+
+        lock = run(crawl_man.redis.get(crawl_man.admission_lock_key))
+        assert lock == 'other'
+        run(crawl_man.redis.delete(crawl_man.admission_lock_key))
+
+    def test_start_failed_error(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.browser_budget = 0
+
+        params = {'seed_urls': ['https://example.com/'], 'coll': 'broken'}
+        res = self.client.post('/crawls', json=dict(params, num_browsers=1))
+        assert res.status_code == 400
+
+        detail = res.json()['detail']
+        assert detail['browsers'] == []
+        assert [error['error'] for error in detail['errors']] == ['start_failed']
+
+    def test_delete(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.delete('/crawls').json()['num_deleted'] == 4
+        crawl_man.browser_budget = 0
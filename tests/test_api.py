@@ -87,7 +87,23 @@ class TestCrawlAPI:
         urls = {'urls': ['https://example.com/', 'http://iana.org/']}
 
         res = self.client.put(f'/crawl/{self.crawl_id}/urls', json=urls)
-        assert res.json()['success']
+        assert res.json() == {
+            'success': True,
+            'num_added': 2,
+            'num_dupes': 0,
+            'num_rejected': 0,
+        }
+
+    def test_crawl_queue_dupe_urls(self):
+        urls = {'urls': ['http://iana.org/', 'https://example.com/', 'http://iana.org/']}
+
+        res = self.client.put(f'/crawl/{self.crawl_id}/urls', json=urls)
+        assert res.json() == {
+            'success': True,
+            'num_added': 0,
+            'num_dupes': 3,
+            'num_rejected': 0,
+        }
 
     def test_get_crawl(self):
         res = self.client.get(f'/crawl/{self.crawl_id}')
@@ -108,11 +124,12 @@ class TestCrawlAPI:
         assert json['num_queue'] == 2
         assert json['num_seen'] == 2
         assert json['num_pending'] == 0
+        assert json['num_failed'] == 0
         assert json['headless'] == False
         assert json['screenshot_coll'] == 'live'
         assert json['text_coll'] == 'live'
 
-        assert len(json) == 19
+        assert len(json) == 22
 
     def test_get_crawl_details(self):
         res = self.client.get(f'/crawl/{self.crawl_id}/urls')
@@ -145,7 +162,20 @@ class TestCrawlAPI:
         res = self.client.put(f'/crawl/{crawl_id}/urls', json=urls)
         assert res.json()['success']
 
+        urls = {'urls': [{'url': 'https://example.com/', 'depth': 1},
+                         {'url': 'https://example.com/page', 'depth': 3}]}
+
+        res = self.client.put(f'/crawl/{crawl_id}/urls', json=urls)
+        assert res.json() == {
+            'success': True,
+            'num_added': 1,
+            'num_dupes': 1,
+            'num_rejected': 0,
+        }
+
         res = self.client.get(f'/crawl/{crawl_id}/urls')
+        assert res.json()['queue'][-1] == {'url': 'https://example.com/page', 'depth': 3}
+
         scopes = res.json()['scopes']
         assert len(scopes) == 2
         assert {'domain': 'example.com'} in scopes
@@ -201,6 +231,21 @@ class TestCrawlAPI:
 
         assert res.json() == {'detail': 'crawl not found'}
 
+    @pytest.mark.parametrize('params', [
+        {'num_browsers': -1},
+        {'num_tabs': 0},
+        {'min_browsers': 3, 'max_browsers': 2},
+        {'host_delay': -1},
+        {'behavior_max_time': -1},
+        {'seen_error_rate': 2},
+    ])
+    def test_invalid_crawl_params(self, params):
+        res = self.client.post('/crawls', json=params)
+
+        assert res.status_code == 422
+
+        assert res.json()['detail']
+
     def test_start_crawl(self):
         res = self.client.post(f'/crawl/{self.crawl_id}/start')
         json = res.json()
@@ -249,8 +294,9 @@ class TestCrawlAPI:
         assert json['num_queue'] == 2
         assert json['num_seen'] == 2
         assert json['num_pending'] == 0
+        assert json['num_failed'] == 0
 
-        assert len(json) == 19
+        assert len(json) == 22
 
     @patch('browsertrix.crawl.CrawlManager.do_request', mock_shepherd_api)
     def test_stop_crawl(self):
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from mock import patch
+
+from browsertrix.autoscale import desired_browsers, idle_browsers
+
+from .utils import fake_shepherd_api, fake_shepherd_urls
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def desired(num_browsers, num_queue, num_pending=0, rate=None, step=10):
+    return desired_browsers(
+        num_browsers, 2, 1, 8, num_queue, num_pending, rate, 10, 60, step
+    )
+
+
+def test_desired_browsers():
+    # 20 urls per browser
+    assert desired(2, 40) == 2
+    assert desired(2, 100) == 5
+    assert desired(2, 1000) == 8
+    assert desired(2, 90, 30) == 6
+
+    # min browsers
+    assert desired(4, 0) == 1
+
+    # max change per call
+    assert desired(2, 1000, step=2) == 4
+    assert desired(8, 0, step=2) == 6
+
+    # queue drained fast enough at the current rate
+    assert desired(2, 100, rate=10.0) == 2
+    assert desired(2, 100, rate=1.0) == 5
+
+    # no usable rate
+    assert desired(2, 100, rate=0.0) == 5
+    assert desired(2, 100, rate=-1.0) == 5
+
+
+def test_idle_browsers():
+    tabs_done = [{'id': 'A'}, {'id': 'A'}, {'id': 'B'}]
+    assert idle_browsers(['A', 'B', 'C'], tabs_done, 2) == ['A']
+    assert idle_browsers(['A', 'B', 'C'], tabs_done, 1) == ['A', 'B']
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestAutoscale:
+    crawl_id = None
+
+    def info(self):
+        return self.client.get(f'/crawl/{self.crawl_id}').json()
+
+    def test_create_autoscaled_crawl(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.autoscale_urls_per_tab = 50
+        crawl_man.autoscale_step = 2
+
+        params = {
+            'num_browsers': 1,
+            'max_browsers': 4,
+            'seed_urls': [f'https://example.com/{i}' for i in range(200)],
+        }
+        res = self.client.post('/crawls', json=params).json()
+        assert len(res['browsers']) == 1
+        TestAutoscale.crawl_id = res['id']
+
+    def test_scale_up(self):
+        from browsertrix.api import crawl_man
+
+        fake_shepherd_urls.clear()
+
+        # 200 urls, 50 per tab: 4 browsers, at most 2 more at once
+        assert run(crawl_man.autoscale_crawls()) == 2
+        assert len(self.info()['browsers']) == 3
+        assert self.info()['num_browsers'] == 3
+
+        assert len([url for url in fake_shepherd_urls if 'request' in url]) == 2
+        assert len([url for url in fake_shepherd_urls if 'start' in url]) == 2
+
+        assert run(crawl_man.autoscale_crawls()) == 1
+        assert self.info()['num_browsers'] == 4
+
+        # at max
+        assert run(crawl_man.autoscale_crawls()) == 0
+
+    def test_scale_down_idle(self):
+        from browsertrix.api import crawl_man
+
+        run(crawl_man.redis.delete(f'a:{self.crawl_id}:q'))
+
+        # not idle yet, so not removed
+        assert run(crawl_man.autoscale_crawls()) == 0
+
+        browsers = sorted(self.info()['browsers'])
+        key = f'a:{self.crawl_id}:br:done'
+        for reqid in browsers[:3]:
+            run(crawl_man.redis.rpush(key, f'{{"id": "{reqid}", "time": 100}}'))
+
+        fake_shepherd_urls.clear()
+        assert run(crawl_man.autoscale_crawls()) == -2
+
+        info = self.info()
+        assert info['status'] == 'running'
+        assert info['num_browsers'] == 2
+        assert len(info['browsers']) == 2
+        assert len(info['tabs_done']) == 1
+        assert len([url for url in fake_shepherd_urls if 'remove' in url]) == 2
+
+    def test_not_autoscaled_when_stopped(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.post(f'/crawl/{self.crawl_id}/stop').json()['success']
+        assert run(crawl_man.redis.smembers('crawls:autoscaled')) == set()
+        assert run(crawl_man.autoscale_crawls()) == 0
+
+    def test_delete_crawl(self):
+        from browsertrix.api import crawl_man
+
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
+        assert not run(crawl_man.redis.exists(f'a:{self.crawl_id}:flock_opts'))
@@ -0,0 +1,96 @@
+from mock import patch
+from starlette.testclient import TestClient
+
+from benchmarks import bench_api, bench_domains, simulate
+
+from .utils import fake_shepherd_api, init_fake_redis
+
+
+def test_bench_api():
+    args = bench_api.parse_args(
+        ['--fake-redis', '--crawls', '2', '--urls', '5', '--browsers', '1,2']
+        + ['--requests', '4']
+    )
+    report = bench_api.main(args)
+
+    assert report['redis'] == 'fake'
+    assert len(report['results']) == 8
+
+    endpoints = {result['endpoint'] for result in report['results']}
+    assert endpoints == {
+        'POST /crawls',
+        'GET /crawls',
+        'GET /crawl/{id}',
+        'PUT /crawl/{id}/urls',
+    }
+    for result in report['results']:
+        assert result['rps'] > 0
+        assert result['p99_ms'] >= result['p50_ms'] > 0
+
+
+@patch('browsertrix.utils.init_redis', init_fake_redis)
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+def test_bench_api_keeps_other_crawls():
+    from browsertrix.api import app
+
+    args = bench_api.parse_args(['--requests', '2'])
+    with TestClient(app) as client:
+        crawl_id = client.post('/crawls', json={'start': False}).json()['id']
+
+        bench_api.bench_combination(client, 2, 2, 1, args)
+
+        assert client.get('/crawls').json()['total'] == 1
+        assert client.get(f'/crawl/{crawl_id}').status_code == 200
+        client.delete(f'/crawl/{crawl_id}')
+
+
+def test_bench_domains():
+    args = bench_domains.parse_args(['--lookups', '1000', '--hosts', '100'])
+    report = bench_domains.main(args)
+
+    assert report['load_seconds'] > 0
+    assert set(report['results']) == {'trie', 'cached', 'url'}
+    for result in report['results'].values():
+        assert result['lookups'] == 1000
+        assert result['lookups_per_sec'] > 0
+
+
+def test_simulate():
+    args = simulate.parse_args(
+        ['--fake-redis', '--crawls', '2', '--browsers', '2', '--tabs', '2']
+        + ['--hosts', '3', '--pages', '20', '--idle', '0.1']
+    )
+
+    deleted = []
+    client_delete = TestClient.delete
+
+    def delete(self, url, **kwargs):
+        deleted.append(url)
+        return client_delete(self, url, **kwargs)
+
+    with patch.object(TestClient, 'delete', delete):
+        report = simulate.main(args)
+
+    # only the simulated crawls are deleted
+    assert len(deleted) == 2
+    assert all(url.startswith('/crawl/') for url in deleted)
+
+    results = report['results']
+    assert results['crawls_done'] == 2
+    assert results['pages'] > 2
+    # every seen url, seeds included, was crawled
+    assert results['num_seen'] == results['pages']
+    assert results['pages_per_sec'] > 0
+    assert results['redis_ops'] >= 4 * results['pages']
+    assert report['samples'][0]['pages'] == 0
+
+
+def test_site_graph():
+    graph = simulate.SiteGraph(4, 10, 5, 0.5)
+    url = graph.page_url(1, 3)
+    assert graph.outlinks(url) == graph.outlinks(url)
+    assert len(graph.outlinks(url)) == 5
+    assert graph.outlinks('https://example.com/') == []
+
+    local = simulate.SiteGraph(4, 10, 5, 0)
+    assert all(link.startswith('http://host1.example/') for link in local.outlinks(url))
@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+from mock import patch
+
+from browsertrix.cache import CrawlInfoCache
+from browsertrix.schema import CrawlInfo
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def crawl_info(crawl_id, status='new'):
+    return CrawlInfo(
+        id=crawl_id,
+        name='',
+        coll='live',
+        screenshot_coll='',
+        text_coll='',
+        mode='record',
+        status=status,
+        crawl_type='all-links',
+        crawl_depth=1,
+        num_browsers=1,
+        num_tabs=1,
+    )
+
+
+def test_cache_lru():
+    cache = CrawlInfoCache(2, 60)
+    for crawl_id in ('A', 'B', 'C'):
+        cache.put(crawl_id, crawl_info(crawl_id), cache.generation)
+
+    assert cache.get('A') is None
+    assert cache.get('B').id == 'B'
+
+    # B was used last, C is evicted
+    cache.put('D', crawl_info('D'), cache.generation)
+    assert cache.get('C') is None
+    assert list(cache.entries) == ['B', 'D']
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_ttl():
+    cache = CrawlInfoCache(10, 0.05)
+    cache.put('A', crawl_info('A'), cache.generation)
+    assert cache.get('A')
+    time.sleep(0.06)
+    assert cache.get('A') is None
+    assert not cache.entries
+
+
+def test_cache_copies():
+    cache = CrawlInfoCache(10, 60)
+    model = crawl_info('A')
+    cache.put('A', model, cache.generation)
+
+    model.status = 'running'
+    cached = cache.get('A')
+    assert cached.status == 'new'
+
+    cached.status = 'running'
+    assert cache.get('A').status == 'new'
+
+
+def test_cache_invalidated_during_read():
+    cache = CrawlInfoCache(10, 60)
+    generation = cache.generation
+    cache.invalidate('A')
+    cache.put('A', crawl_info('A'), generation)
+    assert cache.get('A') is None
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestCrawlInfoCache:
+    crawl_id = None
+
+    def test_subscribed(self):
+        from browsertrix.api import crawl_man
+
+        run(asyncio.sleep(0.05))
+        assert crawl_man.invalidation_subscribed
+
+    def test_cached_reads(self):
+        from browsertrix.api import crawl_man
+
+        res = self.client.post('/crawls', json={'start': False}).json()
+        TestCrawlInfoCache.crawl_id = res['id']
+        cache = crawl_man.crawl_cache
+
+        hits = cache.hits
+        for _ in range(3):
+            assert self.client.get(f'/crawl/{self.crawl_id}').json()['status'] == 'new'
+
+        assert cache.hits == hits + 2
+        assert cache.get(self.crawl_id).status == 'new'
+
+    def test_invalidated_on_write(self):
+        from browsertrix.api import crawl_man
+
+        res = self.client.post(f'/crawl/{self.crawl_id}/start').json()
+        assert res['status'] == 'running'
+        assert self.crawl_id not in crawl_man.crawl_cache.entries
+
+        # the cached status is up to date, so the crawl can be stopped
+        self.client.get(f'/crawl/{self.crawl_id}')
+        assert self.client.post(f'/crawl/{self.crawl_id}/stop').json()['success']
+
+    def test_invalidated_by_other_worker(self):
+        from browsertrix.api import crawl_man
+
+        # a read is not cached if an invalidation, eg. of an earlier
+        # write, is received while it is in progress
+        for _ in range(10):
+            self.client.get(f'/crawl/{self.crawl_id}')
+            if self.crawl_id in crawl_man.crawl_cache.entries:
+                break
+            run(asyncio.sleep(0.01))
+
+        assert self.crawl_id in crawl_man.crawl_cache.entries
+
+        run(crawl_man.redis.publish(crawl_man.invalidation_channel, self.crawl_id))
+        for _ in range(100):
+            if self.crawl_id not in crawl_man.crawl_cache.entries:
+                break
+            run(asyncio.sleep(0.01))
+
+        assert self.crawl_id not in crawl_man.crawl_cache.entries
+
+    def test_delete(self):
+        self.client.get(f'/crawl/{self.crawl_id}')
+        assert self.client.delete(f'/crawl/{self.crawl_id}').json()['success']
+        assert self.client.get(f'/crawl/{self.crawl_id}').status_code == 404
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import shutil
+import tempfile
+
+import pytest
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestCheckpoint:
+    crawl_id = None
+    checkpoint = None
+    bloom_crawl_id = None
+
+    def info(self, crawl_id):
+        return self.client.get(f'/crawl/{crawl_id}').json()
+
+    def test_init(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.checkpoint_dir = tempfile.mkdtemp()
+
+        params = {
+            'start': False,
+            'seed_urls': [f'https://example.com/{i}' for i in range(3)],
+        }
+        res = self.client.post('/crawls', json=params).json()
+        TestCheckpoint.crawl_id = res['id']
+
+        # one url being crawled by a tab
+        url_req = run(crawl_man.redis.lpop(f'a:{self.crawl_id}:q'))
+        run(crawl_man.redis.sadd(f'a:{self.crawl_id}:qp', url_req))
+        run(crawl_man.redis.rpush(f'a:{self.crawl_id}:br:done', '{"id": "A"}'))
+
+        info = self.info(self.crawl_id)
+        assert info['num_queue'] == 2
+        assert info['num_pending'] == 1
+
+    def test_checkpoint(self):
+        from browsertrix.api import crawl_man
+
+        res = self.client.post(f'/crawl/{self.crawl_id}/checkpoint').json()
+        assert res['success']
+        assert res['id'] == self.crawl_id
+        assert res['checkpoint'].startswith(self.crawl_id)
+
+        path = os.path.join(crawl_man.checkpoint_dir, res['checkpoint'])
+        assert os.path.getsize(path) == res['size']
+        TestCheckpoint.checkpoint = res['checkpoint']
+
+    def test_restore(self):
+        before = self.info(self.crawl_id)
+        assert self.client.delete(f'/crawl/{self.crawl_id}').json()['success']
+        assert self.client.get(f'/crawl/{self.crawl_id}').status_code == 404
+
+        res = self.client.post('/crawls/restore', json={'checkpoint': self.checkpoint})
+        res = res.json()
+        assert res['success']
+        assert res['id'] == self.crawl_id
+        assert res['status'] == 'new'
+
+        # the browsers of the checkpoint are gone
+        assert before['browsers']
+        assert res['browsers'] == []
+
+        # the pending url is queued again
+        info = self.info(self.crawl_id)
+        assert info['num_queue'] == 3
+        assert info['num_pending'] == 0
+        assert info['num_seen'] == 3
+        assert info['tabs_done'] == []
+        assert info['browsers'] == []
+
+        urls = self.client.get(f'/crawl/{self.crawl_id}/urls').json()
+        assert sorted(url['url'] for url in urls['queue']) == [
+            f'https://example.com/{i}' for i in range(3)
+        ]
+
+        crawls = self.client.get('/crawls').json()['crawls']
+        assert self.crawl_id in [crawl['id'] for crawl in crawls]
+
+    def test_start_restored(self):
+        from browsertrix.api import crawl_man
+
+        res = self.client.post(f'/crawl/{self.crawl_id}/start').json()
+        assert res['status'] == 'running'
+        assert len(res['browsers']) == 2
+        assert sorted(self.info(self.crawl_id)['browsers']) == sorted(res['browsers'])
+
+        assert not run(crawl_man.redis.keys(f'a:{self.crawl_id}:restore:*'))
+
+        res = self.client.post(f'/crawl/{self.crawl_id}/stop').json()
+        assert res['success']
+
+    def test_restore_truncated(self):
+        from browsertrix.api import crawl_man
+
+        path = os.path.join(crawl_man.checkpoint_dir, self.checkpoint)
+        with open(path, 'rb') as fh:
+            data = fh.read()
+
+        with open(path + '.part', 'wb') as fh:
+            fh.write(data[: len(data) - 20])
+
+        assert self.client.delete(f'/crawl/{self.crawl_id}').json()['success']
+
+        res = self.client.post(
+            '/crawls/restore', json={'checkpoint': self.checkpoint + '.part'}
+        )
+        assert res.status_code == 400
+        assert res.json()['detail'] == 'invalid checkpoint'
+
+        # nothing of the crawl is left
+        assert run(crawl_man.redis.keys(f'a:{self.crawl_id}:*')) == []
+
+        res = self.client.post('/crawls/restore', json={'checkpoint': self.checkpoint})
+        assert res.json()['success']
+
+    def test_restore_existing(self):
+        res = self.client.post('/crawls/restore', json={'checkpoint': self.checkpoint})
+        assert res.status_code == 400
+        assert res.json()['detail'] == 'crawl already exists'
+
+    def test_restore_invalid(self):
+        res = self.client.post('/crawls/restore', json={'checkpoint': '../info'})
+        assert res.status_code == 400
+
+        res = self.client.post('/crawls/restore', json={'checkpoint': 'missing'})
+        assert res.status_code == 404
+
+    def test_checkpoint_running_bloom(self):
+        params = {
+            'seen_mode': 'bloom',
+            'seen_capacity': 1000,
+            'seed_urls': ['https://example.com/'],
+        }
+        res = self.client.post('/crawls', json=params).json()
+        assert res['status'] == 'running'
+        crawl_id = res['id']
+        TestCheckpoint.bloom_crawl_id = crawl_id
+
+        res = self.client.post(f'/crawl/{crawl_id}/checkpoint').json()
+        assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+
+        res = self.client.post(
+            '/crawls/restore', json={'checkpoint': res['checkpoint']}
+        )
+        assert res.json()['status'] == 'stopped'
+
+        # the bloom filter is restored
+        info = self.info(crawl_id)
+        assert info['num_seen'] == 1
+        urls = {'urls': ['https://example.com/', 'https://example.com/new']}
+        res = self.client.put(f'/crawl/{crawl_id}/urls', json=urls).json()
+        assert res['num_added'] == 1
+        assert res['num_dupes'] == 1
+
+    def test_delete(self):
+        from browsertrix.api import crawl_man
+
+        for crawl_id in (self.crawl_id, self.bloom_crawl_id):
+            assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+
+        shutil.rmtree(crawl_man.checkpoint_dir)
+        crawl_man.checkpoint_dir = 'checkpoints'
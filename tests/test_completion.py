@@ -0,0 +1,71 @@
+import asyncio
+import os
+
+import pytest
+from mock import patch
+
+from .utils import fake_shepherd_api, fake_shepherd_urls
+
+os.environ['COMPLETION_WATCH_INTERVAL'] = '0'
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestCompletionWatcher:
+    crawl_id = None
+    browsers = None
+
+    def tab_done(self, time):
+        from browsertrix.api import crawl_man
+
+        key = f'a:{self.crawl_id}:br:done'
+        run(crawl_man.redis.rpush(key, f'{{"time": {time}}}'))
+
+    def status(self):
+        from browsertrix.api import crawl_man
+
+        info_key = f'a:{self.crawl_id}:info'
+        return run(crawl_man.redis.hmget(info_key, 'status', 'finish_time'))
+
+    def test_create_crawl(self):
+        params = {'num_browsers': 2, 'num_tabs': 2, 'seed_urls': ['https://a.com/']}
+        res = self.client.post('/crawls', json=params).json()
+        assert res['status'] == 'running'
+        TestCompletionWatcher.crawl_id = res['id']
+        TestCompletionWatcher.browsers = res['browsers']
+
+    def test_not_done(self):
+        from browsertrix.api import crawl_man
+
+        for time in (100, 110, 120):
+            self.tab_done(time)
+
+        assert run(crawl_man.watch_completion()) == 0
+        assert self.status() == ['running', '0']
+
+    def test_done(self):
+        from browsertrix.api import crawl_man
+
+        fake_shepherd_urls.clear()
+        self.tab_done(130)
+
+        assert run(crawl_man.watch_completion()) == 1
+        assert self.status() == ['done', '100']
+        assert sorted(fake_shepherd_urls) == sorted(
+            f'/flock/stop/{reqid}' for reqid in self.browsers
+        )
+
+        # already done, not running anymore
+        assert run(crawl_man.watch_completion()) == 0
+
+        res = self.client.get('/crawls', params={'status': 'done'}).json()
+        assert [crawl['id'] for crawl in res['crawls']] == [self.crawl_id]
+
+    def test_delete_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
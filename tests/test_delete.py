@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from aioredis import ReplyError
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def crawl_keys(crawl_id):
+    from browsertrix.api import crawl_man
+
+    return list(crawl_man.redis.redis.scan_iter(match=f'a:{crawl_id}:*'))
+
+
+async def failing_shepherd_api(url_path, post_data=None):
+    if 'flock/remove' in url_path:
+        return {'error': 'remove_failed'}
+    return await fake_shepherd_api(None, url_path, post_data)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestDeleteCrawls:
+    def create(self, **params):
+        params.setdefault('seed_urls', [f'https://example.com/{i}' for i in range(50)])
+        return self.client.post('/crawls', json=params).json()['id']
+
+    def test_delete_unlink(self):
+        crawl_id = self.create(host_concurrency=2)
+        assert crawl_keys(crawl_id)
+
+        assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+        assert crawl_keys(crawl_id) == []
+
+    def test_delete_chunked(self):
+        from browsertrix.api import crawl_man
+
+        async def unlink(*keys):
+            raise ReplyError("ERR unknown command 'UNLINK'")
+
+        crawl_man.redis.unlink = unlink
+        crawl_man.queue_chunk_size = 10
+
+        crawl_id = self.create(frontier_mode='priority', start=False)
+        assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+        assert crawl_keys(crawl_id) == []
+        assert crawl_man.use_unlink is False
+
+        del crawl_man.redis.unlink
+        crawl_man.use_unlink = True
+        crawl_man.queue_chunk_size = 1000
+
+    def test_delete_by_status(self):
+        new_ids = [self.create(start=False), self.create(start=False)]
+        running_id = self.create()
+
+        res = self.client.delete('/crawls', params={'status': 'new'}).json()
+        assert res == {'success': True, 'num_deleted': 2, 'errors': []}
+
+        for crawl_id in new_ids:
+            assert crawl_keys(crawl_id) == []
+
+        crawls = self.client.get('/crawls').json()['crawls']
+        assert [crawl['id'] for crawl in crawls] == [running_id]
+
+    def test_delete_all_with_errors(self):
+        crawl_id = self.create(start=False)
+
+        with patch('browsertrix.crawl.CrawlManager.do_request', failing_shepherd_api):
+            res = self.client.delete('/crawls').json()
+
+        assert not res['success']
+        assert res['num_deleted'] == 0
+        assert len(res['errors']) == 2
+        assert crawl_id in [error['id'] for error in res['errors']]
+
+        res = self.client.delete('/crawls').json()
+        assert res == {'success': True, 'num_deleted': 2, 'errors': []}
+        assert self.client.get('/crawls').json() == {'crawls': [], 'total': 0}
@@ -0,0 +1,54 @@
+import pytest
+
+from browsertrix.domains import SuffixTrie, registered_domain
+from browsertrix.politeness import url_host
+from browsertrix.utils import extract_domain
+
+
+# ============================================================================
+@pytest.mark.parametrize(
+    'hostname, domain',
+    [
+        ('example.com', 'example.com'),
+        ('www.sub.example.co.uk', 'example.co.uk'),
+        ('co.uk', 'co.uk'),
+        ('user.github.io', 'user.github.io'),
+        ('a.b.foo.ck', 'b.foo.ck'),
+        ('www.ck', 'www.ck'),
+        ('a.city.kawasaki.jp', 'city.kawasaki.jp'),
+        ('a.b.公司.cn', 'b.公司.cn'),
+        ('a.xn--85x722f.xn--55qx5d.cn', 'xn--85x722f.xn--55qx5d.cn'),
+        ('localhost', 'localhost'),
+        ('127.0.0.1', '127.0.0.1'),
+        ('example.com.', 'example.com'),
+    ],
+)
+def test_registered_domain(hostname, domain):
+    assert registered_domain(hostname) == domain
+
+
+def test_suffix_trie():
+    trie = SuffixTrie(['uk', 'co.uk', '*.ck', '!www.ck'])
+    assert trie.suffix_length(['example', 'co', 'uk']) == 2
+    assert trie.suffix_length(['example', 'com']) == 1
+    assert trie.suffix_length(['a', 'b', 'ck']) == 2
+    assert trie.suffix_length(['www', 'ck']) == 1
+
+
+def test_extract_domain():
+    assert (
+        extract_domain('https://user:pw@WWW.Sub.Example.co.uk:8080/a')
+        == 'example.co.uk'
+    )
+    assert extract_domain('https://www.example.com/') == 'example.com'
+    assert extract_domain('http://example.com?q=1') == 'example.com'
+    assert extract_domain('http://[::1]:8080/') == '::1'
+    assert extract_domain('//example.com/') == 'example.com'
+    assert extract_domain('not a url') == ''
+
+
+def test_url_host():
+    assert (
+        url_host('{"url": "https://a.example.co.uk/", "depth": 1}') == 'example.co.uk'
+    )
+    assert url_host('https://b.example.co.uk:8080/') == 'example.co.uk'
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+import ujson as json
+from mock import patch
+
+from browsertrix.events import CrawlEvents, info_events, sse_message
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def make_info(status='running', num_queue=0, num_pending=0, num_seen=0, tabs=0):
+    return {
+        'id': 'abc',
+        'status': status,
+        'start_time': 100,
+        'finish_time': 0,
+        'num_queue': num_queue,
+        'num_pending': num_pending,
+        'num_seen': num_seen,
+        'tabs_done': [{'time': 200 + i} for i in range(tabs)],
+    }
+
+
+async def connected():
+    return False
+
+
+def test_info_events():
+    first = make_info(num_queue=5, num_seen=5)
+    assert info_events(None, first) == [
+        (
+            'info',
+            {
+                'id': 'abc',
+                'status': 'running',
+                'start_time': 100,
+                'finish_time': 0,
+                'num_queue': 5,
+                'num_pending': 0,
+                'num_seen': 5,
+                'num_tabs_done': 0,
+            },
+        )
+    ]
+
+    assert info_events(first, make_info(num_queue=5, num_seen=5)) == []
+
+    second = make_info(num_queue=3, num_pending=2, num_seen=8, tabs=1)
+    assert info_events(first, second) == [
+        (
+            'counts',
+            {
+                'num_queue': 3,
+                'num_pending': 2,
+                'num_seen': 8,
+                'delta': {'num_queue': -2, 'num_pending': 2, 'num_seen': 3},
+            },
+        ),
+        ('tab_done', {'time': 200}),
+    ]
+
+    third = make_info(status='stopped', num_queue=3, num_pending=2, num_seen=8, tabs=1)
+    assert info_events(second, third) == [
+        ('status', {'status': 'stopped', 'start_time': 100, 'finish_time': 0})
+    ]
+
+
+def test_sse_message():
+    assert sse_message('end', {'id': 'abc'}) == 'event: end\ndata: {"id":"abc"}\n\n'
+
+
+def test_shared_feed():
+    infos = [make_info(), make_info(num_queue=1), None]
+    calls = []
+
+    async def load_info():
+        calls.append(1)
+        return infos[len(calls) - 1]
+
+    events = CrawlEvents('abc', load_info, 0)
+
+    async def view():
+        return [message async for message in events.stream(connected)]
+
+    first, second = run(asyncio.gather(view(), view()))
+
+    # one poll per change, shared by both viewers
+    assert len(calls) == 3
+    assert first == second
+    assert [message.split('\n')[0] for message in first] == [
+        'event: info',
+        'event: counts',
+        'event: deleted',
+        'event: end',
+    ]
+    assert events.task is None
+    assert not events.subscribers
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestCrawlEventsAPI:
+    crawl_id = None
+
+    def test_create_crawl(self):
+        params = {'num_browsers': 1, 'num_tabs': 2, 'seed_urls': ['https://a.com/']}
+        res = self.client.post('/crawls', json=params).json()
+        assert res['status'] == 'running'
+        TestCrawlEventsAPI.crawl_id = res['id']
+
+    def test_events_until_done(self):
+        from browsertrix.api import crawl_man
+
+        key = f'a:{self.crawl_id}:br:done'
+        run(crawl_man.redis.rpush(key, '{"time": 300}', '{"time": 310}'))
+
+        res = self.client.get(f'/crawl/{self.crawl_id}/events')
+        assert res.headers['content-type'].startswith('text/event-stream')
+
+        messages = res.text.strip().split('\n\n')
+        assert len(messages) == 2
+
+        event, data = messages[0].split('\n')
+        assert event == 'event: info'
+        info = json.loads(data[len('data: ') :])
+        assert info['id'] == self.crawl_id
+        assert info['status'] == 'done'
+        assert info['finish_time'] == 300
+        assert info['num_queue'] == 1
+        assert info['num_tabs_done'] == 2
+
+        assert messages[1].startswith('event: end')
+        assert crawl_man.crawl_events == {}
+
+    def test_events_not_found(self):
+        res = self.client.get('/crawl/x-invalid/events')
+        assert res.status_code == 404
+
+    def test_delete_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
@@ -0,0 +1,64 @@
+import gzip
+
+import pytest
+import ujson as json
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestExportUrls:
+    crawl_id = None
+    seeds = [f'https://example.com/{i}' for i in range(30)]
+
+    def export(self, **params):
+        return self.client.get(f'/crawl/{self.crawl_id}/urls/export', params=params)
+
+    def test_create_crawl(self):
+        params = {'crawl_type': 'all-links', 'start': False, 'seed_urls': self.seeds}
+        res = self.client.post('/crawls', json=params)
+        assert res.json()['success']
+        TestExportUrls.crawl_id = res.json()['id']
+
+    def test_export_queue(self):
+        res = self.export(url_set='queue')
+        assert res.headers['content-type'] == 'application/x-ndjson'
+        assert 'queue.ndjson' in res.headers['content-disposition']
+
+        lines = [json.loads(line) for line in res.text.splitlines()]
+        assert lines == [{'url': url, 'depth': 0} for url in self.seeds]
+
+    def test_export_seen_gzip(self):
+        res = self.export(url_set='seen', gzip=True, regex=r'/1\d$')
+        assert res.headers['content-type'] == 'application/gzip'
+
+        lines = gzip.decompress(res.content).decode('utf-8').splitlines()
+        urls = sorted(json.loads(line)['url'] for line in lines)
+        assert urls == sorted(self.seeds[10:20])
+
+    def test_export_invalid(self):
+        assert self.export(regex='(').status_code == 400
+        assert self.export(url_set='other').status_code == 422
+        res = self.client.get('/crawl/x-invalid/urls/export')
+        assert res.status_code == 404
+
+    @pytest.mark.parametrize('seen_mode', ['fingerprint', 'bloom'])
+    def test_export_seen_not_listable(self, seen_mode):
+        params = {'crawl_type': 'all-links', 'start': False, 'seen_mode': seen_mode}
+        crawl_id = self.client.post('/crawls', json=params).json()['id']
+
+        res = self.client.get(f'/crawl/{crawl_id}/urls/export?url_set=seen')
+        assert res.status_code == 400
+        assert seen_mode in res.json()['detail']
+
+        res = self.client.get(f'/crawl/{crawl_id}/urls/export?url_set=queue')
+        assert res.status_code == 200
+
+        assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+
+    def test_delete_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
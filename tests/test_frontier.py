@@ -0,0 +1,65 @@
+import pytest
+from mock import patch
+
+from browsertrix.frontier import priority_score
+
+from .utils import fake_shepherd_api
+
+
+# ============================================================================
+def test_priority_score():
+    assert priority_score(0, now=100) < priority_score(1, now=0)
+    assert priority_score(2, priority=1, now=0) < priority_score(2, now=0)
+    assert priority_score(1, now=100) < priority_score(1, now=101)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestPriorityFrontier:
+    crawl_id = None
+
+    def test_create_priority_crawl(self):
+        params = {
+            'crawl_type': 'all-links',
+            'start': False,
+            'frontier_mode': 'priority',
+            'seed_urls': ['https://example.com/'],
+        }
+        res = self.client.post('/crawls', json=params)
+        assert res.json()['success']
+        TestPriorityFrontier.crawl_id = res.json()['id']
+
+    def test_queue_by_priority(self):
+        urls = {
+            'urls': [
+                {'url': 'https://example.com/deep', 'depth': 3},
+                {'url': 'https://example.com/a', 'depth': 1},
+                {'url': 'https://example.com/important', 'depth': 2, 'priority': 2},
+                {'url': 'https://example.com/b', 'depth': 1},
+            ]
+        }
+        res = self.client.put(f'/crawl/{self.crawl_id}/urls', json=urls)
+        assert res.json() == {
+            'success': True,
+            'num_added': 4,
+            'num_dupes': 0,
+            'num_rejected': 0,
+        }
+
+        res = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert res['frontier_mode'] == 'priority'
+        assert res['num_queue'] == 5
+
+        res = self.client.get(f'/crawl/{self.crawl_id}/urls').json()
+        assert [entry['url'] for entry in res['queue']] == [
+            'https://example.com/',
+            'https://example.com/important',
+            'https://example.com/a',
+            'https://example.com/b',
+            'https://example.com/deep',
+        ]
+
+    def test_delete_priority_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def crawl_keys(key_id):
+    from browsertrix.api import crawl_man
+
+    # escape the braces of hash tagged key ids in the glob pattern
+    pattern = 'a:' + key_id.replace('{', '\\{').replace('}', '\\}') + ':*'
+    return sorted(crawl_man.redis.redis.scan_iter(match=pattern))
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestKeyLayout:
+    crawl_ids = {}
+
+    def create(self, name, **params):
+        params.setdefault('seed_urls', [f'https://example.com/{i}' for i in range(5)])
+        res = self.client.post('/crawls', json=dict(params, name=name)).json()
+        TestKeyLayout.crawl_ids[name] = res['id']
+        return res
+
+    def test_migrate_requires_hash_tags(self):
+        res = self.client.post('/crawls/migrate-keys')
+        assert res.status_code == 400
+        assert res.json()['detail'] == 'key hash tags are not enabled'
+
+    def test_plain_layout(self):
+        self.create('stopped', start=False, host_concurrency=1)
+        self.create('running')
+
+        crawl_id = self.crawl_ids['stopped']
+        keys = crawl_keys(crawl_id)
+        assert f'a:{crawl_id}:info' in keys
+        assert f'a:{crawl_id}:hosts' in keys
+
+    def test_hash_tagged_layout(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.key_hash_tags = True
+
+        # crawls of the plain layout are not found until migrated
+        assert self.client.get(f'/crawl/{self.crawl_ids["running"]}').status_code == 404
+
+        res = self.create('tagged')
+        assert res['status'] == 'running'
+
+        crawl_id = self.crawl_ids['tagged']
+        assert f'a:{{{crawl_id}}}:info' in crawl_keys('{' + crawl_id + '}')
+        assert crawl_keys(crawl_id) == []
+
+        info = self.client.get(f'/crawl/{crawl_id}').json()
+        assert info['num_queue'] == 5
+
+        crawl = run(crawl_man.load_crawl(crawl_id))
+        assert crawl.key_prefix == f'a:{{{crawl_id}}}:'
+
+    def test_migrate(self):
+        plain_keys = {
+            name: crawl_keys(self.crawl_ids[name]) for name in ('stopped', 'running')
+        }
+
+        res = self.client.post('/crawls/migrate-keys').json()
+        assert res == {
+            'success': True,
+            'num_migrated': 2,
+            'stopped': [self.crawl_ids['running']],
+        }
+
+        for name, keys in plain_keys.items():
+            crawl_id = self.crawl_ids[name]
+            assert crawl_keys(crawl_id) == []
+
+            prefix = f'a:{crawl_id}:'
+            assert crawl_keys('{' + crawl_id + '}') == sorted(
+                f'a:{{{crawl_id}}}:' + key[len(prefix) :] for key in keys
+            )
+
+        info = self.client.get(f'/crawl/{self.crawl_ids["stopped"]}').json()
+        assert info['status'] == 'new'
+        assert info['num_queue'] == 5
+
+        info = self.client.get(f'/crawl/{self.crawl_ids["running"]}').json()
+        assert info['status'] == 'stopped'
+
+        # nothing left to migrate
+        res = self.client.post('/crawls/migrate-keys').json()
+        assert res['num_migrated'] == 0
+
+    def test_restart_migrated(self):
+        crawl_id = self.crawl_ids['running']
+        res = self.client.post(f'/crawl/{crawl_id}/start').json()
+        assert res['status'] == 'running'
+        assert self.client.get(f'/crawl/{crawl_id}').json()['num_queue'] == 5
+
+    def test_delete(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.delete('/crawls').json()['num_deleted'] == 3
+        for crawl_id in self.crawl_ids.values():
+            assert crawl_keys('{' + crawl_id + '}') == []
+
+        crawl_man.key_hash_tags = False
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestPendingLeases:
+    crawl_id = None
+
+    def key(self, name):
+        return f'a:{self.crawl_id}:{name}'
+
+    def take_url(self):
+        """move the next queued url to the pending set, like a browser tab"""
+        from browsertrix.api import crawl_man
+
+        url_req = run(crawl_man.redis.lpop(self.key('q')))
+        run(crawl_man.redis.sadd(self.key('qp'), url_req))
+        return url_req
+
+    def test_init(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.pending_lease_timeout = 10
+        crawl_man.pending_max_retries = 1
+
+        params = {'seed_urls': ['https://example.com/1', 'https://example.com/2']}
+        res = self.client.post('/crawls', json=params).json()
+        assert res['status'] == 'running'
+        TestPendingLeases.crawl_id = res['id']
+
+    def test_lease_and_release(self):
+        from browsertrix.api import crawl_man
+
+        first = self.take_url()
+        self.take_url()
+
+        assert run(crawl_man.reap_pending(1000)) == 0
+        leases = run(
+            crawl_man.redis.zrange(self.key('qp:lease'), 0, -1, withscores=True)
+        )
+        assert [expiry for _, expiry in leases] == [1010, 1010]
+
+        # crawled
+        run(crawl_man.redis.srem(self.key('qp'), first))
+        assert run(crawl_man.reap_pending(1005)) == 0
+        assert run(crawl_man.redis.zcard(self.key('qp:lease'))) == 1
+
+    def test_requeue_expired(self):
+        from browsertrix.api import crawl_man
+
+        assert run(crawl_man.reap_pending(1011)) == 1
+        assert run(crawl_man.redis.scard(self.key('qp'))) == 0
+        assert run(crawl_man.redis.zcard(self.key('qp:lease'))) == 0
+
+        queue = run(crawl_man.redis.lrange(self.key('q'), 0, -1))
+        assert [json.loads(url_req) for url_req in queue] == [
+            {'url': 'https://example.com/2', 'depth': 0, 'retries': 1}
+        ]
+
+        info = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert info['num_queue'] == 1
+        assert info['num_pending'] == 0
+        assert info['num_failed'] == 0
+
+    def test_give_up_after_retries(self):
+        from browsertrix.api import crawl_man
+
+        url_req = self.take_url()
+        assert run(crawl_man.reap_pending(2000)) == 0
+        assert run(crawl_man.reap_pending(2011)) == 1
+
+        assert run(crawl_man.redis.smembers(self.key('failed'))) == {url_req}
+        info = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert info['num_queue'] == 0
+        assert info['num_pending'] == 0
+        assert info['num_failed'] == 1
+
+    def test_not_reaped_when_stopped(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.post(f'/crawl/{self.crawl_id}/stop').json()['success']
+        run(crawl_man.redis.sadd(self.key('qp'), 'https://example.com/3'))
+        assert run(crawl_man.reap_pending(3000)) == 0
+        assert not run(crawl_man.redis.exists(self.key('qp:lease')))
+
+    def test_delete(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.delete(f'/crawl/{self.crawl_id}').json()['success']
+        assert not run(crawl_man.redis.exists(self.key('failed')))
+
+        crawl_man.pending_lease_timeout = 600.0
+        crawl_man.pending_max_retries = 2
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from mock import patch
+
+from browsertrix.metrics import format_gauge, format_histogram
+from browsertrix.shepherd import LatencyHistogram
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_format_histogram():
+    histogram = LatencyHistogram((0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 2.0):
+        histogram.observe(seconds)
+
+    lines = format_histogram('latency', 'Some latency', [((('op', 'a'),), histogram)])
+    assert lines == [
+        '# HELP latency Some latency',
+        '# TYPE latency histogram',
+        'latency_bucket{op="a",le="0.1"} 1',
+        'latency_bucket{op="a",le="1.0"} 3',
+        'latency_bucket{op="a",le="+Inf"} 4',
+        'latency_sum{op="a"} 3.05',
+        'latency_count{op="a"} 4',
+    ]
+
+
+def test_format_gauge_escapes_labels():
+    lines = format_gauge('size', 'Some size', [((('name', 'a"b\\c\n'),), 2), ((), 1)])
+    assert lines[2:] == ['size{name="a\\"b\\\\c\\n"} 2', 'size 1']
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestMetrics:
+    crawl_id = None
+
+    def metrics(self):
+        res = self.client.get('/metrics')
+        assert res.status_code == 200
+        assert res.headers['content-type'].startswith('text/plain; version=0.0.4')
+        return res.text.split('\n')
+
+    def sample(self, lines, name):
+        values = [line.rsplit(' ', 1)[1] for line in lines if line.startswith(name)]
+        return float(values[0]) if values else 0
+
+    def test_request_latency(self):
+        name = 'browsertrix_http_request_duration_seconds_count'
+        found = name + '{method="GET",route="/crawl/{crawl_id}",status="200"}'
+        not_found = name + '{method="GET",route="/crawl/{crawl_id}",status="404"}'
+        created = name + '{method="POST",route="/crawls",status="200"}'
+
+        lines = self.metrics()
+        before = [self.sample(lines, key) for key in (found, not_found, created)]
+
+        params = {'seed_urls': ['https://example.com/1', 'https://example.com/2']}
+        TestMetrics.crawl_id = self.client.post('/crawls', json=params).json()['id']
+        self.client.get(f'/crawl/{self.crawl_id}')
+        self.client.get(f'/crawl/{self.crawl_id}')
+        self.client.get('/crawl/not-a-crawl')
+
+        lines = self.metrics()
+        after = [self.sample(lines, key) for key in (found, not_found, created)]
+        assert [b - a for a, b in zip(before, after)] == [2, 1, 1]
+
+    def test_redis_and_shepherd_latency(self):
+        lines = self.metrics()
+        assert any(
+            line.startswith(
+                'browsertrix_redis_command_duration_seconds_count{command="PIPELINE"}'
+            )
+            for line in lines
+        )
+        assert 'browsertrix_shepherd_circuit_state{state="closed"} 1' in lines
+
+    def test_sampled_crawl_gauges(self):
+        from browsertrix.api import crawl_man
+
+        # not computed on scrape, last sampled before the crawl was created
+        lines = self.metrics()
+        assert not any(
+            line.startswith('browsertrix_crawl_queue_urls{') for line in lines
+        )
+
+        run(crawl_man.sample_metrics())
+        lines = self.metrics()
+        assert 'browsertrix_crawls{status="running"} 1' in lines
+        assert 'browsertrix_crawls{status="new"} 0' in lines
+        assert f'browsertrix_crawl_queue_urls{{crawl_id="{self.crawl_id}"}} 2' in lines
+        assert (
+            f'browsertrix_crawl_pending_urls{{crawl_id="{self.crawl_id}"}} 0' in lines
+        )
+        assert f'browsertrix_crawl_seen_urls{{crawl_id="{self.crawl_id}"}} 2' in lines
+
+    def test_stopped_crawl_not_sampled(self):
+        from browsertrix.api import crawl_man
+
+        assert self.client.post(f'/crawl/{self.crawl_id}/stop').json()['success']
+        run(crawl_man.sample_metrics())
+        assert crawl_man.metrics.crawl_sizes == {}
+        assert crawl_man.metrics.crawl_counts['stopped'] == 1
+
+        assert self.client.delete(f'/crawl/{self.crawl_id}').json()['success']
@@ -0,0 +1,217 @@
+import asyncio
+import os
+
+import pytest
+from mock import patch
+
+from browsertrix.frontier import Frontier, PriorityFrontier
+from browsertrix.politeness import HostScheduler
+
+from .utils import fake_shepherd_api, init_fake_redis
+
+os.environ['HOST_SCHEDULER_INTERVAL'] = '0'
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+class InterleavedRedis:
+    """Redis proxy calling after_call once the call-th command or
+    transaction has been sent, to interleave it with the caller
+    """
+
+    def __init__(self, redis, call, after_call):
+        self.redis = redis
+        self.num_calls = 0
+        self.call = call
+        self.after_call = after_call
+
+    async def called(self, result):
+        self.num_calls += 1
+        if self.num_calls == self.call:
+            await self.after_call()
+        return result
+
+    def __getattr__(self, name):
+        async def func(*args, **kwargs):
+            return await self.called(await getattr(self.redis, name)(*args, **kwargs))
+
+        return func
+
+    def multi_exec(self):
+        tr = self.redis.multi_exec()
+        execute = tr.execute
+
+        async def interleaved_execute():
+            return await self.called(await execute())
+
+        tr.execute = interleaved_execute
+        return tr
+
+
+@pytest.mark.parametrize('frontier_class', [Frontier, PriorityFrontier])
+@pytest.mark.parametrize('call', range(1, 12))
+def test_push_during_schedule(call, frontier_class):
+    redis = run(init_fake_redis())
+    frontier = frontier_class('a:x:q')
+    scheduler = HostScheduler('a:x:', frontier, 'a:x:qp', 10, 0.0, 10)
+
+    async def push(url):
+        tr = redis.multi_exec()
+        scheduler.push(tr, [(f'{{"url":"{url}","depth":0}}', 0, 0)])
+        await tr.execute()
+
+    run(push('https://a-example.com/1'))
+
+    # a url of the same host pushed while its sub-queue is being emptied
+    interleaved = InterleavedRedis(redis, call, lambda: push('https://a-example.com/2'))
+    released = run(scheduler.schedule(interleaved))
+    if interleaved.num_calls < call:
+        run(push('https://a-example.com/2'))
+
+    released += run(scheduler.schedule(redis))
+    assert released == 2
+    assert run(frontier.count(redis)) == 2
+    assert run(scheduler.count(redis)) == 0
+
+    # the emptied host is removed
+    assert run(scheduler.schedule(redis)) == 0
+    assert run(redis.zrange('a:x:hosts', 0, -1)) == []
+
+    redis.close()
+
+
+@pytest.mark.parametrize('frontier_class', [Frontier, PriorityFrontier])
+def test_overflow_keeps_score(frontier_class):
+    redis = run(init_fake_redis())
+    frontier = frontier_class('a:x:q')
+    scheduler = HostScheduler('a:x:', frontier, 'a:x:qp', 10, 0.0, 1)
+
+    # urls pushed directly to the frontier, beyond the target
+    urls = [f'{{"url":"https://a-example.com/{i}","depth":1}}' for i in range(3)]
+    tr = redis.multi_exec()
+    frontier.push(tr, [(url, 1, 5) for url in urls])
+    run(tr.execute())
+    overflow = run(frontier.overflow(redis, 1))
+
+    assert run(scheduler.schedule(redis)) == 0
+    assert run(frontier.entries(redis)) == urls[:1]
+    assert run(scheduler.count(redis)) == 2
+
+    host_queue = scheduler.host_queue('a-example.com')
+    assert run(host_queue.entries(redis)) == urls[1:]
+    if frontier_class is PriorityFrontier:
+        assert run(redis.zrange(host_queue.key, 0, -1, withscores=True)) == overflow
+
+    redis.close()
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestHostScheduler:
+    crawl_id = None
+
+    def queued_urls(self):
+        res = self.client.get(f'/crawl/{self.crawl_id}/urls').json()
+        return [entry['url'] for entry in res['queue']]
+
+    def test_create_host_scheduled_crawl(self):
+        params = {
+            'crawl_type': 'all-links',
+            'num_browsers': 2,
+            'num_tabs': 2,
+            'host_concurrency': 1,
+            'seed_urls': [
+                'https://a-example.com/1',
+                'https://a-example.com/2',
+                'https://a-example.com/3',
+                'https://b-example.com/1',
+                'https://b-example.com/2',
+                'https://c-example.com/1',
+            ],
+        }
+        res = self.client.post('/crawls', json=params)
+        assert res.json()['success']
+        TestHostScheduler.crawl_id = res.json()['id']
+
+        res = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert res['num_queue'] == 6
+        assert self.queued_urls() == []
+
+    def test_round_robin_hosts(self):
+        from browsertrix.api import crawl_man
+
+        assert run(crawl_man.schedule_hosts()) == 3
+        assert self.queued_urls() == [
+            'https://a-example.com/1',
+            'https://b-example.com/1',
+            'https://c-example.com/1',
+        ]
+
+        # one url per host already queued
+        assert run(crawl_man.schedule_hosts()) == 0
+
+        res = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert res['num_queue'] == 6
+
+    def test_host_done_frees_slot(self):
+        from browsertrix.api import crawl_man
+
+        # crawl of a-example.com/1 finished
+        run(crawl_man.redis.lpop(f'a:{self.crawl_id}:q'))
+
+        assert run(crawl_man.schedule_hosts()) == 1
+        assert self.queued_urls()[-1] == 'https://a-example.com/2'
+
+    def test_overflow_moved_to_host_queues(self):
+        urls = {'urls': ['https://d-example.com/1', 'https://d-example.com/2']}
+        self.client.put(f'/crawl/{self.crawl_id}/urls', json=urls)
+
+        from browsertrix.api import crawl_man
+
+        # simulate urls pushed directly to the frontier by a browser
+        for url in ['https://e-example.com/1', 'https://e-example.com/2']:
+            run(
+                crawl_man.redis.rpush(
+                    f'a:{self.crawl_id}:q', f'{{"url":"{url}","depth":1}}'
+                )
+            )
+
+        # frontier full: e-example.com/2 moved back to its host queue
+        assert run(crawl_man.schedule_hosts()) == 0
+        assert self.queued_urls() == [
+            'https://b-example.com/1',
+            'https://c-example.com/1',
+            'https://a-example.com/2',
+            'https://e-example.com/1',
+        ]
+
+        res = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert res['num_queue'] == 9
+
+    def test_not_done_with_host_queue(self):
+        from browsertrix.api import crawl_man
+
+        # all tabs done, but urls are still held back by the host scheduler
+        for time in range(4):
+            run(
+                crawl_man.redis.rpush(
+                    f'a:{self.crawl_id}:br:done', f'{{"time": {time}}}'
+                )
+            )
+
+        assert run(crawl_man.watch_completion()) == 0
+        res = self.client.get(f'/crawl/{self.crawl_id}').json()
+        assert res['status'] == 'running'
+
+    def test_delete_host_scheduled_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
+
+        from browsertrix.api import crawl_man
+
+        assert run(crawl_man.redis.keys(f'a:{self.crawl_id}:*')) == []
+        assert run(crawl_man.redis.smembers('crawls:host_scheduled')) == set()
@@ -0,0 +1,223 @@
+import asyncio
+import time
+
+import pytest
+from mock import patch
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class RecordingShepherd:
+    """ shepherd api stand-in recording each request and its body
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.calls = []
+        self.fail_start = False
+
+    async def __call__(self, url_path, post_data=None):
+        self.calls.append((url_path, post_data))
+        if 'flock/request' in url_path:
+            self.count += 1
+            return {'reqid': f'POOL_{self.count}'}
+        if '/flock/start/' in url_path:
+            if self.fail_start:
+                return {'error': 'start_error'}
+            reqid = url_path.rsplit('_', 1)[-1]
+            return {'containers': {'browser': {'ip': f'10.0.0.{reqid}'}}}
+        return {'success': True}
+
+    def paths(self, kind):
+        return [path for path, _ in self.calls if f'/flock/{kind}' in path]
+
+
+shepherd = RecordingShepherd()
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', shepherd)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestFlockPool:
+    crawl_ids = []
+
+    def pool_counts(self):
+        from browsertrix.api import crawl_man
+
+        return {
+            headless: run(pool.count(crawl_man.redis))
+            for headless, pool in crawl_man.flock_pools.items()
+        }
+
+    def test_init_pools(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.flock_pool_size = 2
+        crawl_man.init_flock_pools()
+
+        assert run(crawl_man.refill_flock_pools()) == 4
+        assert self.pool_counts() == {False: 2, True: 2}
+
+        requests = [data for path, data in shepherd.calls if 'request' in path]
+        assert len(requests) == 4
+        assert sum(1 for opts in requests if opts['deferred'].get('xserver')) == 2
+        assert all(opts['deferred']['autobrowser'] for opts in requests)
+        assert all('AUTO_ID' not in opts['environ'] for opts in requests)
+
+        # the pool flocks are started, but for their autobrowser
+        assert sorted(shepherd.paths('start')) == [
+            f'/flock/start/POOL_{i}' for i in range(1, 5)
+        ]
+        assert all(
+            opts['user_params'] == {'coll': 'live', 'mode': 'record', 'cache': 'always'}
+            for opts in requests
+        )
+
+        # already full
+        assert run(crawl_man.refill_flock_pools()) == 0
+
+    def test_claim_on_create(self):
+        shepherd.calls.clear()
+
+        params = {'num_browsers': 3, 'seed_urls': ['https://example.com/']}
+        res = self.client.post('/crawls', json=params).json()
+        assert res['success']
+        TestFlockPool.crawl_ids.append(res['id'])
+
+        # two flocks claimed from the pool, one requested
+        assert len(shepherd.paths('request')) == 1
+        assert sorted(res['browsers']) == ['POOL_1', 'POOL_2', 'POOL_5']
+        assert self.pool_counts() == {False: 0, True: 2}
+
+        # the autobrowser of the claimed flocks is started with the crawl
+        # environ, the requested flock is started as a whole
+        starts = {path: data for path, data in shepherd.calls if 'start' in path}
+        assert sorted(starts) == [
+            '/flock/start/POOL_5',
+            '/flock/start_deferred/POOL_1/autobrowser',
+            '/flock/start_deferred/POOL_2/autobrowser',
+        ]
+        environ = starts['/flock/start_deferred/POOL_1/autobrowser']['environ']
+        assert environ['AUTO_ID'] == res['id']
+        assert environ['REQ_ID'] == 'POOL_1'
+        assert environ['NUM_TABS'] == 1
+        assert starts['/flock/start/POOL_5'] == {'environ': {'REQ_ID': 'POOL_5'}}
+
+        # the flock requested for the crawl has its user params, the
+        # claimed flocks have the crawl auto_id added to theirs
+        from browsertrix.api import crawl_man
+
+        pool = crawl_man.flock_pools[False]
+        opts = [data for path, data in shepherd.calls if 'request' in path][0]
+        assert opts['user_params']['auto_id'] == res['id']
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            assert run(crawl_man.redis.hget(f'up:{ip}', 'auto_id')) == res['id']
+        assert run(crawl_man.redis.hlen(pool.user_params_key)) == 0
+
+    def test_no_claim(self):
+        shepherd.calls.clear()
+
+        # not started on create
+        params = {'start': False, 'headless': True, 'seed_urls': []}
+        res = self.client.post('/crawls', json=params).json()
+        TestFlockPool.crawl_ids.append(res['id'])
+
+        # custom user params
+        params = {'headless': True, 'user_params': {'custom': 1}}
+        res = self.client.post('/crawls', json=params).json()
+        TestFlockPool.crawl_ids.append(res['id'])
+
+        # other browser
+        params = {'headless': True, 'browser': 'firefox:60'}
+        res = self.client.post('/crawls', json=params).json()
+        TestFlockPool.crawl_ids.append(res['id'])
+
+        # other collection, read by pywb from the user params
+        params = {'headless': True, 'coll': 'other'}
+        res = self.client.post('/crawls', json=params).json()
+        TestFlockPool.crawl_ids.append(res['id'])
+
+        assert len(shepherd.paths('request')) == 8
+        assert self.pool_counts() == {False: 0, True: 2}
+
+    def test_refill_and_expire(self):
+        from browsertrix.api import crawl_man
+
+        assert run(crawl_man.refill_flock_pools()) == 2
+        assert self.pool_counts() == {False: 2, True: 2}
+
+        shepherd.calls.clear()
+        pool = crawl_man.flock_pools[True]
+        assert run(pool.expire(crawl_man.redis, crawl_man.remove_flock, 2)) == 0
+
+        later = time.time() + crawl_man.flock_pool_max_idle + 1
+        assert run(pool.expire(crawl_man.redis, crawl_man.remove_flock, 2, later)) == 2
+        assert sorted(shepherd.paths('remove')) == [
+            '/flock/remove/POOL_3',
+            '/flock/remove/POOL_4',
+        ]
+        assert self.pool_counts() == {False: 2, True: 0}
+
+    def test_refill_start_failed(self):
+        from browsertrix.api import crawl_man
+
+        shepherd.calls.clear()
+        shepherd.fail_start = True
+        try:
+            assert run(crawl_man.refill_flock_pools()) == 0
+        finally:
+            shepherd.fail_start = False
+
+        # the flocks that failed to start are removed, not pooled
+        assert self.pool_counts() == {False: 2, True: 0}
+        assert len(shepherd.paths('start')) == 2
+        assert sorted(shepherd.paths('remove')) == [
+            '/flock/remove/POOL_16',
+            '/flock/remove/POOL_17',
+        ]
+
+    def test_refill_locked(self):
+        from browsertrix.api import crawl_man
+
+        run(crawl_man.redis.set(crawl_man.flock_pool_lock_key, 'other'))
+        try:
+            assert run(crawl_man.refill_flock_pools()) == 0
+            assert self.pool_counts() == {False: 2, True: 0}
+            assert run(crawl_man.redis.get(crawl_man.flock_pool_lock_key)) == 'other'
+        finally:
+            run(crawl_man.redis.delete(crawl_man.flock_pool_lock_key))
+
+    def test_refill_within_budget(self):
+        from browsertrix.api import crawl_man
+
+        in_use = run(crawl_man.browsers_in_use())
+
+        crawl_man.browser_budget = in_use + 1
+        try:
+            assert run(crawl_man.refill_flock_pools()) == 1
+            assert self.pool_counts() == {False: 2, True: 1}
+
+            # the pooled flocks are counted
+            assert run(crawl_man.browsers_in_use()) == in_use + 1
+
+            # full budget
+            assert run(crawl_man.refill_flock_pools()) == 0
+        finally:
+            crawl_man.browser_budget = 0
+
+        # the pools give way to the queued crawls
+        shepherd.calls.clear()
+        assert run(crawl_man.shrink_flock_pools(2)) == 2
+        assert len(shepherd.paths('remove')) == 2
+        assert sum(self.pool_counts().values()) == 1
+
+    def test_delete_crawls(self):
+        from browsertrix.api import crawl_man
+
+        for crawl_id in self.crawl_ids:
+            assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+
+        crawl_man.flock_pool_size = 0
+        crawl_man.init_flock_pools()
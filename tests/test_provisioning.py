@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from mock import patch
+
+from browsertrix.utils import gather_limited
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class SlowShepherd:
+    """ shepherd api stand-in tracking the number of concurrent requests
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.count = 0
+        self.fail = set()
+        self.urls = []
+
+    async def __call__(self, url_path, post_data=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.urls.append(url_path)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+
+        if 'flock/request' in url_path:
+            self.count += 1
+            return {'reqid': f'SLOW_{self.count}'}
+
+        if url_path.rsplit('/', 1)[-1] in self.fail:
+            return {'error': 'invalid_reqid'}
+
+        return {'success': True}
+
+
+shepherd = SlowShepherd()
+
+
+def test_gather_limited():
+    in_flight = []
+
+    async def func(item):
+        in_flight.append(item)
+        await asyncio.sleep(0.01)
+        assert len(in_flight) <= 2
+        in_flight.remove(item)
+        if item == 3:
+            raise ValueError('three')
+        return item * 10
+
+    results = run(gather_limited(func, range(5), 2))
+    assert results[:3] == [0, 10, 20]
+    assert isinstance(results[3], ValueError)
+    assert results[4] == 40
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', shepherd)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestConcurrentProvisioning:
+    crawl_id = None
+
+    def test_create_concurrently(self):
+        from browsertrix.api import crawl_man
+
+        crawl_man.shepherd_concurrency = 3
+
+        params = {'num_browsers': 6, 'seed_urls': ['https://example.com/']}
+        res = self.client.post('/crawls', json=params).json()
+        assert res['success']
+        assert res['status'] == 'running'
+        assert res['browsers'] == [f'SLOW_{i}' for i in range(1, 7)]
+        TestConcurrentProvisioning.crawl_id = res['id']
+
+        assert shepherd.max_in_flight == 3
+        assert sorted(url for url in shepherd.urls if 'start' in url) == sorted(
+            f'/flock/start/SLOW_{i}' for i in range(1, 7)
+        )
+
+    def test_stop_partial_failure(self):
+        shepherd.fail = {'SLOW_2', 'SLOW_5'}
+
+        res = self.client.post(f'/crawl/{self.crawl_id}/stop')
+        assert res.status_code == 400
+
+        detail = res.json()['detail']
+        assert sorted(detail['errors'], key=lambda x: x['reqid']) == [
+            {'reqid': 'SLOW_2', 'error': 'invalid_reqid'},
+            {'reqid': 'SLOW_5', 'error': 'invalid_reqid'},
+        ]
+        assert sorted(detail['browsers']) == ['SLOW_1', 'SLOW_3', 'SLOW_4', 'SLOW_6']
+
+        # not stopped
+        res = self.client.get(f'/crawl/{self.crawl_id}')
+        assert res.json()['status'] == 'running'
+
+    def test_stop(self):
+        shepherd.fail = set()
+        shepherd.max_in_flight = 0
+
+        res = self.client.post(f'/crawl/{self.crawl_id}/stop')
+        assert res.json()['success']
+        assert shepherd.max_in_flight == 3
+
+    def test_create_partial_failure(self):
+        shepherd.fail = {'SLOW_8'}
+
+        params = {'num_browsers': 3, 'seed_urls': ['https://example.com/']}
+        res = self.client.post('/crawls', json=params)
+        assert res.status_code == 400
+
+        detail = res.json()['detail']
+        assert detail['errors'] == [{'reqid': 'SLOW_8', 'error': 'invalid_reqid'}]
+        assert detail['browsers'] == ['SLOW_7', 'SLOW_9']
+
+    def test_delete_crawl(self):
+        from browsertrix.api import crawl_man
+
+        shepherd.fail = set()
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
+
+        crawl_man.shepherd_concurrency = 10
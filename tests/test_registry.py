@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestCrawlRegistry:
+    crawl_ids = []
+
+    def list_ids(self, **params):
+        res = self.client.get('/crawls', params=params).json()
+        return [crawl['id'] for crawl in res['crawls']], res['total']
+
+    def test_create_crawls(self):
+        for num in range(3):
+            params = {
+                'name': f'crawl {num}',
+                'start': False,
+                'seed_urls': ['https://example.com/'],
+            }
+            res = self.client.post('/crawls', json=params)
+            assert res.json()['success']
+            TestCrawlRegistry.crawl_ids.append(res.json()['id'])
+
+        ids, total = self.list_ids()
+        assert total == 3
+        assert set(ids) == set(self.crawl_ids)
+
+    def test_status_filter(self):
+        first, second, third = self.crawl_ids
+        assert self.client.post(f'/crawl/{first}/start').json()['success']
+        assert self.client.post(f'/crawl/{second}/start').json()['success']
+        assert self.client.post(f'/crawl/{second}/stop').json()['success']
+
+        assert self.list_ids(status='running') == ([first], 1)
+        assert self.list_ids(status='stopped') == ([second], 1)
+        assert self.list_ids(status='new') == ([third], 1)
+        assert self.list_ids(status='done') == ([], 0)
+
+        res = self.client.get('/crawls', params={'status': 'running'}).json()
+        assert res['crawls'][0]['status'] == 'running'
+        assert res['crawls'][0]['num_queue'] == 1
+
+        assert self.client.get('/crawls', params={'status': 'other'}).status_code == 422
+
+    def test_done_status(self):
+        from browsertrix.api import crawl_man
+
+        first = self.crawl_ids[0]
+        for _ in range(2):
+            run(crawl_man.redis.rpush(f'a:{first}:br:done', '{"time": 100}'))
+
+        res = self.client.get(f'/crawl/{first}').json()
+        assert res['status'] == 'done'
+        assert res['finish_time'] == 100
+
+        assert self.list_ids(status='done') == ([first], 1)
+        assert self.list_ids(status='running') == ([], 0)
+
+    def test_pagination(self):
+        all_ids, total = self.list_ids()
+        assert total == 3
+
+        # most recent first
+        first_page, total = self.list_ids(limit=2)
+        assert total == 3
+        assert first_page == all_ids[:2]
+
+        second_page, _ = self.list_ids(offset=2, limit=2)
+        assert second_page == all_ids[2:]
+
+        assert self.client.get('/crawls', params={'limit': 0}).status_code == 422
+
+    def test_reindex(self):
+        from browsertrix.api import crawl_man
+
+        run(crawl_man.redis.delete('crawls:index'))
+        assert run(crawl_man.index_crawls()) == 3
+        assert run(crawl_man.index_crawls()) == 0
+        assert self.list_ids()[1] == 3
+
+    def test_delete_crawls(self):
+        for crawl_id in self.crawl_ids:
+            assert self.client.delete(f'/crawl/{crawl_id}').json()['success']
+
+        assert self.list_ids() == ([], 0)
+        assert self.list_ids(status='stopped') == ([], 0)
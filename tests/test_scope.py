@@ -0,0 +1,215 @@
+import pytest
+from mock import patch
+
+from browsertrix.scope import DomainTrie, ScopeEngine, compile_scopes, surt
+
+from .utils import fake_shepherd_api
+
+
+# ============================================================================
+def test_surt():
+    assert surt('https://www.example.com/a?b=1') == 'com,example,)/a?b=1'
+    assert surt('http://Sub.Example.com') == 'com,example,sub,)/'
+    assert surt('http://example.com:8080/') == 'com,example,:8080)/'
+    assert surt('https://example.com:443/') == 'com,example,)/'
+
+
+def test_domain_trie():
+    trie = DomainTrie(['example.com', 'iana.org:8080', 'www.example.net'])
+    assert trie.match('example.com')
+    assert trie.match('www.sub.example.com')
+    assert trie.match('iana.org')
+    assert not trie.match('badexample.com')
+    assert not trie.match('com')
+    assert not trie.match('example.net')
+    assert trie.match('www.example.net')
+    assert not DomainTrie()
+
+
+def test_scope_rules():
+    engine = ScopeEngine(
+        [
+            {'domain': 'example.com'},
+            {'surt': 'http://(org,iana,)/domains/'},
+            {'surt': 'org,iana,)/domains/root'},
+            {'regex': r'^https?://archive\.org/details/'},
+            {'exclude': r'/logout'},
+            {'max_depth': 3},
+        ]
+    )
+    assert engine.surts == ['org,iana,)/domains/']
+
+    assert engine.check('https://sub.example.com/') is None
+    assert engine.check('http://iana.org/domains/root/db', 2) is None
+    assert engine.check('http://www.iana.org/domains/') is None
+    assert engine.check('https://archive.org/details/x') is None
+
+    assert engine.check('http://iana.org/about') == 'not-included'
+    assert engine.check('https://example.org/') == 'not-included'
+    assert engine.check('https://example.com/logout') == 'excluded'
+    assert engine.check('https://example.com/', 4) == 'depth'
+
+    entries = [('https://example.com/', 0, 0), ('https://example.org/', 0, 0)]
+    assert engine.filter(entries) == entries[:1]
+
+
+def test_match_rules():
+    engine = ScopeEngine(
+        [
+            {'domain': 'example.com', 'substring': '/blog/'},
+            {'url_match': 'SURT_MATCH', 'value': 'http://(org,iana,'},
+            {'url_match': 'STRING_MATCH', 'value': 'archive'},
+        ]
+    )
+    assert engine.surts == ['org,iana,']
+    assert len(engine.rules) == 2
+
+    assert engine.check('https://example.com/blog/a') is None
+    assert engine.check('https://example.com/about') == 'not-included'
+    assert engine.check('https://www.iana.org/') is None
+    assert engine.check('https://web.archive.org/') is None
+
+    # parent_url_regex can only be checked by the browsers
+    engine = ScopeEngine([{'domain': 'example.com'}, {'parent_url_regex': 'x'}])
+    assert engine.opaque
+    assert engine.check('https://example.org/') is None
+
+
+def test_scope_without_includes():
+    assert ScopeEngine([]).empty
+    assert ScopeEngine([{'exclude': '/logout'}]).check('https://example.org/') is None
+
+    # rules only the browsers understand disable the include check
+    engine = ScopeEngine([{'domain': 'example.com'}, {'type': 'custom'}])
+    assert engine.check('https://example.org/') is None
+
+
+def test_invalid_scope():
+    with pytest.raises(ValueError):
+        ScopeEngine([{'regex': '('}])
+
+    with pytest.raises(ValueError):
+        ScopeEngine([{'max_depth': 'deep'}])
+
+
+def test_compile_scopes_cached():
+    scopes = frozenset(['{"domain": "example.com"}', 'not json'])
+    engine = compile_scopes(scopes)
+    assert engine is compile_scopes(frozenset(scopes))
+    assert engine.opaque
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestScopeAPI:
+    crawl_id = None
+
+    def test_create_custom_scope_crawl(self):
+        params = {
+            'crawl_type': 'custom',
+            'crawl_depth': 2,
+            'start': False,
+            'seed_urls': ['https://example.com/', 'https://iana.org/'],
+            'scopes': [
+                {'domain': 'example.com'},
+                {'exclude': '/private/'},
+                {'max_depth': 2},
+            ],
+        }
+        res = self.client.post('/crawls', json=params)
+        assert res.json()['success']
+        TestScopeAPI.crawl_id = res.json()['id']
+
+        res = self.client.get(f'/crawl/{self.crawl_id}/urls').json()
+        assert res['queue'] == [{'url': 'https://example.com/', 'depth': 0}]
+
+    def test_queue_out_of_scope(self):
+        urls = {
+            'urls': [
+                'https://www.example.com/a',
+                'https://example.org/',
+                {'url': 'https://example.com/private/a', 'depth': 1},
+                {'url': 'https://example.com/deep', 'depth': 3},
+            ]
+        }
+        res = self.client.put(f'/crawl/{self.crawl_id}/urls', json=urls)
+        assert res.json() == {
+            'success': True,
+            'num_added': 1,
+            'num_dupes': 0,
+            'num_rejected': 3,
+        }
+
+    def test_scope_test(self):
+        urls = {
+            'urls': [
+                'https://example.com/',
+                'https://example.org/',
+                {'url': 'https://example.com/private/a', 'depth': 1},
+                {'url': 'https://example.com/deep', 'depth': 3},
+            ]
+        }
+        res = self.client.post(f'/crawl/{self.crawl_id}/scope/test', json=urls)
+        assert res.json()['results'] == [
+            {
+                'url': 'https://example.com/',
+                'depth': 0,
+                'in_scope': True,
+                'reason': None,
+            },
+            {
+                'url': 'https://example.org/',
+                'depth': 0,
+                'in_scope': False,
+                'reason': 'not-included',
+            },
+            {
+                'url': 'https://example.com/private/a',
+                'depth': 1,
+                'in_scope': False,
+                'reason': 'excluded',
+            },
+            {
+                'url': 'https://example.com/deep',
+                'depth': 3,
+                'in_scope': False,
+                'reason': 'depth',
+            },
+        ]
+
+        res = self.client.post('/crawl/x/scope/test', json=urls)
+        assert res.status_code == 404
+
+    def test_same_domain_seeds_define_scope(self):
+        params = {'crawl_type': 'same-domain', 'start': False}
+        res = self.client.post('/crawls', json=params)
+        crawl_id = res.json()['id']
+
+        urls = {
+            'urls': [
+                'https://example.com/',
+                {'url': 'https://iana.org/', 'depth': 1},
+                {'url': 'https://sub.example.com/', 'depth': 1},
+            ]
+        }
+        res = self.client.put(f'/crawl/{crawl_id}/urls', json=urls)
+        assert res.json()['num_added'] == 2
+        assert res.json()['num_rejected'] == 1
+
+        res = self.client.delete(f'/crawl/{crawl_id}')
+        assert res.json()['success']
+
+    def test_invalid_scope(self):
+        params = {
+            'crawl_type': 'custom',
+            'crawl_depth': 1,
+            'start': False,
+            'scopes': [{'regex': '('}],
+        }
+        res = self.client.post('/crawls', json=params)
+        assert res.status_code == 400
+
+    def test_delete_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
@@ -0,0 +1,89 @@
+import pytest
+from mock import patch
+
+from browsertrix.seen import BloomSeenSet, url_fingerprint
+
+from .utils import fake_shepherd_api
+
+
+# ============================================================================
+def test_url_fingerprint():
+    fp = url_fingerprint('https://example.com/')
+    assert fp == url_fingerprint('https://example.com/')
+    assert fp != url_fingerprint('https://example.com/a')
+    assert -(2 ** 63) <= fp < 2 ** 63
+
+
+def test_bloom_sizing():
+    bloom = BloomSeenSet('a:x:seen', 1000000, 0.01)
+    assert bloom.num_bits == 9585059
+    assert bloom.num_hashes == 7
+
+    offsets = bloom.offsets('https://example.com/')
+    assert len(offsets) == 7
+    assert all(0 <= offset < bloom.num_bits for offset in offsets)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestSeenModes:
+    urls = ['https://example.com/', 'https://example.com/a', 'http://iana.org/']
+
+    def create_crawl(self, **kwargs):
+        params = {'crawl_type': 'all-links', 'start': False, 'seed_urls': self.urls}
+        params.update(kwargs)
+        res = self.client.post('/crawls', json=params)
+        assert res.json()['success']
+        return res.json()['id']
+
+    @pytest.mark.parametrize('seen_mode', ['url', 'fingerprint', 'bloom'])
+    def test_seen_mode(self, seen_mode):
+        crawl_id = self.create_crawl(seen_mode=seen_mode, seen_capacity=1000)
+
+        urls = {'urls': self.urls + ['https://example.com/b']}
+        res = self.client.put(f'/crawl/{crawl_id}/urls', json=urls)
+        assert res.json() == {
+            'success': True,
+            'num_added': 1,
+            'num_dupes': 3,
+            'num_rejected': 0,
+        }
+
+        res = self.client.get(f'/crawl/{crawl_id}').json()
+        assert res['seen_mode'] == seen_mode
+        assert res['num_seen'] == 4
+        assert res['num_queue'] == 4
+
+        res = self.client.get(f'/crawl/{crawl_id}/urls').json()
+        assert res['num_seen'] == 4
+        if seen_mode == 'url':
+            assert len(res['seen']) == 4
+        else:
+            assert res['seen'] is None
+
+        res = self.client.delete(f'/crawl/{crawl_id}')
+        assert res.json()['success']
+        assert self.client.get(f'/crawl/{crawl_id}').status_code == 404
+
+    @pytest.mark.parametrize('seen_mode', ['url', 'fingerprint', 'bloom'])
+    @pytest.mark.parametrize(
+        'queue_params',
+        [{}, {'frontier_mode': 'priority'}, {'host_concurrency': 1}],
+    )
+    def test_dupes_in_one_chunk(self, seen_mode, queue_params):
+        crawl_id = self.create_crawl(
+            seen_mode=seen_mode, seen_capacity=1000, **queue_params
+        )
+
+        urls = {'urls': ['https://example.com/b'] * 3 + ['https://example.com/c']}
+        res = self.client.put(f'/crawl/{crawl_id}/urls', json=urls)
+        assert res.json()['num_added'] == 2
+        assert res.json()['num_dupes'] == 2
+
+        res = self.client.get(f'/crawl/{crawl_id}').json()
+        assert res['num_seen'] == 5
+        assert res['num_queue'] == 5
+
+        res = self.client.delete(f'/crawl/{crawl_id}')
+        assert res.json()['success']
@@ -0,0 +1,220 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from starlette.exceptions import HTTPException
+
+from browsertrix.shepherd import (
+    CircuitBreaker,
+    LatencyHistogram,
+    ShepherdClient,
+    endpoint_name,
+)
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class FakeShepherd:
+    """ local shepherd api stand-in, served over http
+    """
+
+    def __init__(self):
+        self.hits = []
+        self.start_failures = 0
+        self.runner = None
+        self.url = None
+
+        self.app = web.Application()
+        self.app.router.add_post('/api/flock/request/{pool}', self.request_flock)
+        self.app.router.add_post('/api/flock/start/{reqid}', self.start_flock)
+        self.app.router.add_post('/api/flock/stop/{reqid}', self.stop_flock)
+
+    async def request_flock(self, request):
+        self.hits.append(request.path)
+        if request.match_info['pool'] == 'broken':
+            return web.Response(status=502)
+        return web.json_response({'reqid': 'ID_1'})
+
+    async def start_flock(self, request):
+        self.hits.append(request.path)
+        if self.start_failures > 0:
+            self.start_failures -= 1
+            return web.Response(status=503)
+        return web.json_response({'success': True})
+
+    async def stop_flock(self, request):
+        self.hits.append(request.path)
+        await asyncio.sleep(0.5)
+        return web.json_response({'success': True})
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}/api'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+@pytest.fixture
+def shepherd():
+    fake = FakeShepherd()
+    run(fake.start())
+    yield fake
+    run(fake.stop())
+
+
+@pytest.fixture
+def client(shepherd):
+    async def make_client():
+        return ShepherdClient(
+            shepherd.url,
+            asyncio.get_event_loop(),
+            timeout=0.2,
+            retries=2,
+            retry_backoff=0.01,
+            failure_threshold=3,
+            reset_timeout=0.2,
+        )
+
+    client = run(make_client())
+    yield client
+    run(client.close())
+
+
+def test_endpoint_name():
+    assert endpoint_name('/flock/start/ABC') == '/flock/start'
+    assert endpoint_name('/flock/request/browsers?pool=p') == '/flock/request'
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram((0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(seconds)
+
+    assert histogram.snapshot() == {
+        'count': 4,
+        'sum': 2.65,
+        'buckets': {'0.1': 2, '1.0': 3, 'inf': 4},
+    }
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(2, 0.05)
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == 'closed'
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == 'half-open'
+    # only one trial request
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # failed trial opens again
+    breaker.failure()
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+
+def test_post(shepherd, client):
+    res = run(client.post('/flock/request/browsers?pool=p', {'user_params': {}}))
+    assert res == {'reqid': 'ID_1'}
+    assert client.stats()['latency']['/flock/request']['count'] == 1
+    assert client.stats()['circuit'] == 'closed'
+
+
+def test_retry_idempotent(shepherd, client):
+    shepherd.start_failures = 2
+    assert run(client.post('/flock/start/ID_1')) == {'success': True}
+    assert shepherd.hits == ['/api/flock/start/ID_1'] * 3
+    assert client.stats()['latency']['/flock/start']['count'] == 3
+
+
+def test_no_retry_not_idempotent(shepherd, client):
+    with pytest.raises(HTTPException) as exc:
+        run(client.post('/flock/request/broken'))
+
+    assert exc.value.status_code == 400
+    assert shepherd.hits == ['/api/flock/request/broken']
+
+
+def test_timeout(shepherd, client):
+    client.retries = 0
+    with pytest.raises(HTTPException) as exc:
+        run(client.post('/flock/stop/ID_1'))
+
+    assert exc.value.status_code == 400
+    assert exc.value.detail == 'TimeoutError'
+
+
+def test_circuit_open(shepherd, client):
+    shepherd.start_failures = 3
+    with pytest.raises(HTTPException):
+        run(client.post('/flock/start/ID_1'))
+
+    assert len(shepherd.hits) == 3
+    assert client.stats()['circuit'] == 'open'
+
+    # fails fast, without calling shepherd
+    with pytest.raises(HTTPException) as exc:
+        run(client.post('/flock/request/browsers'))
+
+    assert exc.value.status_code == 503
+    assert len(shepherd.hits) == 3
+
+    # after the reset timeout, a successful trial closes the circuit
+    run(asyncio.sleep(0.25))
+    assert run(client.post('/flock/request/browsers')) == {'reqid': 'ID_1'}
+    assert client.stats()['circuit'] == 'closed'
+
+
+def test_circuit_breaker_trial_timeout():
+    breaker = CircuitBreaker(1, 0.05, trial_timeout=0.1)
+    breaker.failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # a trial that never completes is replaced after trial_timeout
+    time.sleep(0.1)
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+
+
+def test_cancelled_trial(shepherd, client):
+    shepherd.start_failures = 3
+    with pytest.raises(HTTPException):
+        run(client.post('/flock/start/ID_1'))
+
+    assert client.stats()['circuit'] == 'open'
+    run(asyncio.sleep(0.25))
+
+    # the trial request is cancelled
+    async def cancel_trial():
+        task = asyncio.ensure_future(client.post('/flock/stop/ID_1'))
+        await asyncio.sleep(0.05)
+        assert not client.breaker.allow()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run(cancel_trial())
+
+    # another trial is let through and closes the circuit
+    assert run(client.post('/flock/request/browsers')) == {'reqid': 'ID_1'}
+    assert client.stats()['circuit'] == 'closed'
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from mock import patch
+
+from .utils import fake_shepherd_api
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+# ============================================================================
+@patch('browsertrix.crawl.CrawlManager.do_request', fake_shepherd_api)
+@pytest.mark.usefixtures('browsertrix_use_fake_redis', 'api_test_client')
+class TestUrlsPagination:
+    crawl_id = None
+    seeds = [f'https://example.com/{i}' for i in range(20)] + [
+        f'https://iana.org/{i}' for i in range(5)
+    ]
+
+    def get_urls(self, **params):
+        res = self.client.get(f'/crawl/{self.crawl_id}/urls', params=params)
+        return res.json()
+
+    def test_create_crawl(self):
+        params = {'crawl_type': 'all-links', 'start': False, 'seed_urls': self.seeds}
+        res = self.client.post('/crawls', json=params)
+        assert res.json()['success']
+        TestUrlsPagination.crawl_id = res.json()['id']
+
+    def test_page_queue(self):
+        res = self.get_urls(url_set='queue', limit=10)
+        assert [entry['url'] for entry in res['queue']] == self.seeds[:10]
+        assert res['cursor'] == '10'
+        assert res['url_set'] == 'queue'
+        assert res['num_seen'] == 25
+        assert res['pending'] == []
+        assert res['seen'] is None
+
+        res = self.get_urls(url_set='queue', limit=10, cursor=res['cursor'])
+        assert [entry['url'] for entry in res['queue']] == self.seeds[10:20]
+
+        res = self.get_urls(url_set='queue', limit=10, cursor=res['cursor'])
+        assert [entry['url'] for entry in res['queue']] == self.seeds[20:]
+        assert res['cursor'] is None
+
+    def test_page_queue_filtered(self):
+        res = self.get_urls(url_set='queue', limit=3, prefix='https://iana.org/')
+        assert [entry['url'] for entry in res['queue']] == self.seeds[20:23]
+        assert res['cursor'] == '23'
+
+        res = self.get_urls(url_set='queue', limit=3, regex=r'/1\d$')
+        assert [entry['url'] for entry in res['queue']] == self.seeds[10:13]
+
+    def test_page_seen(self):
+        seen = []
+        cursor = '0'
+        while cursor is not None:
+            res = self.get_urls(url_set='seen', limit=10, cursor=cursor)
+            assert res['queue'] == []
+            seen.extend(res['seen'])
+            cursor = res['cursor']
+
+        assert sorted(seen) == sorted(self.seeds)
+
+        res = self.get_urls(url_set='seen', prefix='https://iana.org/')
+        assert sorted(res['seen']) == self.seeds[20:]
+        assert res['cursor'] is None
+
+    def test_page_pending(self):
+        from browsertrix.api import crawl_man
+
+        pending_key = f'a:{self.crawl_id}:qp'
+        pending = ['{"url":"https://example.com/0","depth":0}', 'https://iana.org/0']
+        run(crawl_man.redis.sadd(pending_key, *pending))
+
+        res = self.get_urls(url_set='pending', regex='iana')
+        assert res['pending'] == ['https://iana.org/0']
+
+    def test_full_info_page(self):
+        res = self.client.get(
+            f'/crawl/{self.crawl_id}/info', params={'url_set': 'queue', 'limit': 1}
+        ).json()
+        assert res['success']
+        assert res['id'] == self.crawl_id
+        assert res['queue'] == [{'url': self.seeds[0], 'depth': 0}]
+        assert res['cursor'] == '1'
+
+    def test_invalid_params(self):
+        res = self.client.get(
+            f'/crawl/{self.crawl_id}/urls', params={'url_set': 'queue', 'regex': '('}
+        )
+        assert res.status_code == 400
+
+        res = self.client.get(
+            f'/crawl/{self.crawl_id}/urls', params={'url_set': 'seen', 'cursor': 'x'}
+        )
+        assert res.status_code == 400
+
+        res = self.client.get(
+            f'/crawl/{self.crawl_id}/urls', params={'url_set': 'other'}
+        )
+        assert res.status_code == 422
+
+    def test_delete_crawl(self):
+        res = self.client.delete(f'/crawl/{self.crawl_id}')
+        assert res.json()['success']
@@ -1,30 +1,133 @@
+from asyncio import Future, sleep
 from typing import Any, Callable, Dict, List, Optional, Set
 import json
 
 import fakeredis
 
 __all__ = [
+    'AwaitFakeChannel',
+    'AwaitFakePipeline',
     'AwaitFakeRedis',
+    'fake_shepherd_api',
+    'fake_shepherd_urls',
     'init_fake_redis',
 ]
 
 
+def zadd_kwargs(score, member, *pairs, exist=None):
+    """ convert aioredis zadd() args to redis-py zadd() kwargs
+    """
+    pairs = (score, member) + pairs
+    return dict(
+        mapping=dict(zip(pairs[1::2], pairs[::2])),
+        nx=exist == 'ZSET_IF_NOT_EXIST',
+        xx=exist == 'ZSET_IF_EXIST',
+    )
+
+
+def zrangebyscore_kwargs(
+    min=float('-inf'), max=float('inf'), withscores=False, offset=None, count=None
+):
+    """ convert aioredis zrangebyscore() args to redis-py zrangebyscore() kwargs
+    """
+    return dict(min=min, max=max, withscores=withscores, start=offset, num=count)
+
+
+class AwaitFakePipeline:
+    """ async adapter for fakeredis pipelines, mimicking aioredis
+    pipeline() and multi_exec(): each command returns a future
+    that is resolved by execute()
+    """
+
+    def __init__(self, redis, transaction):
+        self.pipe = redis.pipeline(transaction=transaction)
+        self.futures = []
+
+    def __getattr__(self, name):
+        def func(*args, **kwargs):
+            getattr(self.pipe, name)(*args, **kwargs)
+            future = Future()
+            self.futures.append(future)
+            return future
+
+        return func
+
+    def hmset_dict(self, key, kwargs):
+        return self.hmset(key, kwargs)
+
+    def zadd(self, key, *args, **kwargs):
+        return self.__getattr__('zadd')(key, **zadd_kwargs(*args, **kwargs))
+
+    def zrangebyscore(self, key, *args, **kwargs):
+        return self.__getattr__('zrangebyscore')(
+            key, **zrangebyscore_kwargs(*args, **kwargs)
+        )
+
+    async def execute(self):
+        results = self.pipe.execute()
+        for future, result in zip(self.futures, results):
+            future.set_result(result)
+        return results
+
+
+class AwaitFakeChannel:
+    """ async adapter for a fakeredis pubsub, mimicking an aioredis channel
+    """
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+        self.message = None
+
+    async def wait_message(self):
+        while True:
+            message = self.pubsub.get_message(ignore_subscribe_messages=True)
+            if message:
+                self.message = message['data']
+                return True
+            await sleep(0.01)
+
+    async def get(self, encoding=None):
+        return self.message
+
+
 class AwaitFakeRedis:
-    """ async adapter for fakeredis
+    """ async adapter for fakeredis, connections opened at the same time
+    share the same fake server
     """
 
-    def __init__(self):
-        self.redis = fakeredis.FakeStrictRedis(decode_responses=True)
+    def __init__(self, server):
+        self.redis = fakeredis.FakeStrictRedis(server=server, decode_responses=True)
+        # for commands called with encoding=None, returning bytes
+        self.raw_redis = fakeredis.FakeStrictRedis(server=server)
 
     def close(self):
+        global open_fake_redis
+        open_fake_redis -= 1
         self.redis.close()
 
+    async def wait_closed(self):
+        pass
+
     def __getattr__(self, name):
         async def func(*args, **kwargs):
-            return getattr(self.redis, name)(*args, **kwargs)
+            redis = self.redis
+            if 'encoding' in kwargs and kwargs.pop('encoding') is None:
+                redis = self.raw_redis
+            return getattr(redis, name)(*args, **kwargs)
 
         return func
 
+    async def subscribe(self, channel):
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe(channel)
+        return [AwaitFakeChannel(pubsub)]
+
+    def pipeline(self):
+        return AwaitFakePipeline(self.redis, transaction=False)
+
+    def multi_exec(self):
+        return AwaitFakePipeline(self.redis, transaction=True)
+
     async def iscan(self, match=None, count=None):
         for key in self.redis.scan_iter(match=match, count=count):
             yield key
@@ -32,6 +135,55 @@ class AwaitFakeRedis:
     async def hmset_dict(self, key, kwargs):
         return self.redis.hmset(key, kwargs)
 
+    async def set(self, key, value, *, expire=0, pexpire=0, exist=None):
+        return self.redis.set(
+            key,
+            value,
+            ex=expire or None,
+            px=pexpire or None,
+            nx=exist == 'SET_IF_NOT_EXIST',
+            xx=exist == 'SET_IF_EXIST',
+        )
+
+    async def zadd(self, key, *args, **kwargs):
+        return self.redis.zadd(key, **zadd_kwargs(*args, **kwargs))
+
+    async def eval(self, script, keys=None, args=None):
+        keys = keys or []
+        return self.redis.eval(script, len(keys), *keys, *(args or []))
+
+    async def zrangebyscore(self, key, *args, **kwargs):
+        return self.redis.zrangebyscore(key, **zrangebyscore_kwargs(*args, **kwargs))
+
+
+fake_server = None
+
+open_fake_redis = 0
+
 
 async def init_fake_redis(*args, **kwargs) -> AwaitFakeRedis:
-    return AwaitFakeRedis()
+    global fake_server, open_fake_redis
+    if not open_fake_redis:
+        fake_server = fakeredis.FakeServer()
+    open_fake_redis += 1
+    return AwaitFakeRedis(fake_server)
+
+
+fake_reqid_counter = 0
+
+
+fake_shepherd_urls = []
+
+
+async def fake_shepherd_api(self, url_path, post_data=None):
+    """ minimal shepherd api stand-in for CrawlManager.do_request
+    """
+    global fake_reqid_counter
+
+    fake_shepherd_urls.append(url_path)
+
+    if 'flock/request' in url_path:
+        fake_reqid_counter += 1
+        return {'reqid': 'FAKE_' + str(fake_reqid_counter)}
+
+    return {'success': True}